@@ -0,0 +1,254 @@
+import itertools
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque, namedtuple
+
+# Per-session limits keep one client from filling the index
+MAX_ALERTS_PER_SESSION = int(os.getenv("ALERTS_PER_SESSION", "50"))
+MAX_PENDING_NOTIFICATIONS = 20
+# ...and these bound the whole engine, since a client without cookies gets a new session per request
+MAX_ALERTS = int(os.getenv("ALERTS_MAX_TOTAL", "100000"))
+# A session not seen for this long loses its alerts
+ALERT_SESSION_IDLE_SECONDS = int(os.getenv("ALERT_SESSION_IDLE_SECONDS", str(7 * 24 * 3600)))
+# Unread notifications are dropped this long after the last one fired
+ALERT_NOTIFICATION_TTL = int(os.getenv("ALERT_NOTIFICATION_TTL", str(24 * 3600)))
+
+Alert = namedtuple("Alert", "id session_id coin_id direction threshold created_at")
+
+# "drops below 50k", "goes above $3,000", "hits 100k", "under 0.5"
+ALERT_PATTERN = re.compile(
+    r"\b(?P<direction>below|under|beneath|less than|above|over|more than|exceeds?|"
+    r"hits?|reach(es)?|touch(es)?|to)\s+\$?(?P<amount>\d[\d,]*(\.\d+)?)\s*(?P<suffix>k|m|b|thousand|million)?\b"
+)
+ALERT_WORDS = re.compile(
+    r"\b(alert|notify|remind|ping|warn)\b|\b(tell|let) me (know )?(when|if)\b"
+)
+DIRECTIONS = {
+    "below": "below", "under": "below", "beneath": "below", "less than": "below",
+    "above": "above", "over": "above", "more than": "above", "exceed": "above", "exceeds": "above",
+}
+SUFFIXES = {"k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6, "b": 1e9}
+
+
+def parse_alert(text):
+    """
+    "tell me when BTC drops below 50k" → ("below", 50000.0).
+    Direction is None for "hits"/"reaches", where it depends on the current price.
+    Returns None when no threshold is found.
+    """
+    match = ALERT_PATTERN.search(text.lower())
+    if not match:
+        return None
+    amount = float(match.group("amount").replace(",", ""))
+    amount *= SUFFIXES.get(match.group("suffix") or "", 1)
+    return DIRECTIONS.get(match.group("direction")), amount
+
+
+class _Thresholds:
+    """One coin/direction: thresholds kept sorted, alert ids in a parallel list."""
+
+    __slots__ = ("values", "ids")
+
+    def __init__(self):
+        self.values = []
+        self.ids = []
+
+    def add(self, threshold, alert_id):
+        i = bisect_right(self.values, threshold)
+        self.values.insert(i, threshold)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, threshold, alert_id):
+        i = bisect_left(self.values, threshold)
+        while i < len(self.values) and self.values[i] == threshold:
+            if self.ids[i] == alert_id:
+                del self.values[i], self.ids[i]
+                return
+            i += 1
+
+    def pop_at_most(self, price):
+        # "above" alerts fire once the price reaches the threshold: every value <= price
+        i = bisect_right(self.values, price)
+        fired = self.ids[:i]
+        del self.values[:i], self.ids[:i]
+        return fired
+
+    def pop_at_least(self, price):
+        # "below" alerts fire once the price falls to the threshold: every value >= price
+        i = bisect_left(self.values, price)
+        fired = self.ids[i:]
+        del self.values[i:], self.ids[i:]
+        return fired
+
+
+class AlertEngine:
+    """
+    Price alerts indexed per coin and direction by threshold.
+
+    evaluate() takes a batch of prices and, per coin that has alerts, finds every
+    triggered alert with one binary search, so a tick costs O(coins · log n)
+    plus the alerts that actually fire, whatever the total number registered.
+    Fired alerts become notifications for their session. Sessions holding
+    alerts that go unseen for ALERT_SESSION_IDLE_SECONDS lose them, unread
+    notifications expire after ALERT_NOTIFICATION_TTL, and at most MAX_ALERTS
+    alerts (and as many sessions' notifications) are kept at once.
+    """
+
+    def __init__(self):
+        self._alerts = {}                    # alert id → Alert
+        self._index = {}                     # coin id → {"above": _Thresholds, "below": _Thresholds}
+        self._by_session = {}                # session id → set of alert ids
+        self._notifications = OrderedDict()  # session id → deque of fired alerts, least recently fired first
+        self._last_seen = OrderedDict()      # session id with alerts → monotonic time, least recently seen first
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stats = {
+            "ticks": 0, "triggered": 0, "prices_checked": 0,
+            "last_eval_ms": 0.0, "max_eval_ms": 0.0, "total_eval_ms": 0.0,
+            "expired_sessions": 0, "rejected_full": 0,
+        }
+
+    def _touch(self, session_id):
+        # Called with the lock held; only sessions that hold alerts are tracked
+        if session_id in self._by_session:
+            self._last_seen[session_id] = time.monotonic()
+            self._last_seen.move_to_end(session_id)
+
+    def _expire(self):
+        # Called with the lock held: idle sessions' alerts, then stale or surplus notifications
+        cutoff = time.monotonic() - ALERT_SESSION_IDLE_SECONDS
+        while self._last_seen:
+            session_id, last_seen = next(iter(self._last_seen.items()))
+            if last_seen >= cutoff:
+                break
+            for alert_id in list(self._by_session[session_id]):
+                alert = self._alerts[alert_id]
+                self._unindex(alert)
+                self._drop(alert)
+            self._stats["expired_sessions"] += 1
+
+        cutoff = time.time() - ALERT_NOTIFICATION_TTL
+        while self._notifications:
+            session_id, pending = next(iter(self._notifications.items()))
+            if pending[-1]["triggered_at"] >= cutoff and len(self._notifications) <= MAX_ALERTS:
+                break
+            del self._notifications[session_id]
+
+    def add(self, session_id, coin_id, direction, threshold):
+        if direction not in ("above", "below"):
+            raise ValueError(f"Unknown alert direction: {direction!r}")
+        if not threshold > 0:
+            raise ValueError("Alert threshold must be a positive price.")
+
+        with self._lock:
+            self._expire()
+            if len(self._alerts) >= MAX_ALERTS:
+                self._stats["rejected_full"] += 1
+                raise ValueError("Too many price alerts are active right now, please try again later.")
+            owned = self._by_session.setdefault(session_id, set())
+            if len(owned) >= MAX_ALERTS_PER_SESSION:
+                raise ValueError(f"You already have {MAX_ALERTS_PER_SESSION} active alerts.")
+
+            alert = Alert(next(self._ids), session_id, coin_id, direction, float(threshold), time.time())
+            self._alerts[alert.id] = alert
+            owned.add(alert.id)
+            self._touch(session_id)
+            sides = self._index.setdefault(coin_id, {"above": _Thresholds(), "below": _Thresholds()})
+            sides[direction].add(alert.threshold, alert.id)
+            return alert
+
+    def _drop(self, alert):
+        del self._alerts[alert.id]
+        owned = self._by_session.get(alert.session_id)
+        if owned is not None:
+            owned.discard(alert.id)
+            if not owned:
+                del self._by_session[alert.session_id]
+                self._last_seen.pop(alert.session_id, None)
+
+    def _unindex(self, alert):
+        sides = self._index[alert.coin_id]
+        sides[alert.direction].remove(alert.threshold, alert.id)
+        if not sides["above"].values and not sides["below"].values:
+            del self._index[alert.coin_id]
+
+    def cancel(self, session_id, alert_id):
+        with self._lock:
+            self._touch(session_id)
+            alert = self._alerts.get(alert_id)
+            if alert is None or alert.session_id != session_id:
+                return False
+            self._unindex(alert)
+            self._drop(alert)
+            return True
+
+    def evaluate(self, prices):
+        """Checks a {coin id: price} batch; returns the alerts that fired."""
+        started = time.perf_counter()
+        fired = []
+
+        with self._lock:
+            # Only coins that actually have alerts are looked at
+            for coin_id in [coin for coin in prices if coin in self._index]:
+                price = prices[coin_id]
+                if price is None:
+                    continue
+                sides = self._index[coin_id]
+                for alert_id in sides["above"].pop_at_most(price) + sides["below"].pop_at_least(price):
+                    alert = self._alerts[alert_id]
+                    self._drop(alert)
+                    fired.append((alert, price))
+
+                if not sides["above"].values and not sides["below"].values:
+                    del self._index[coin_id]
+
+            self._expire()
+            now = time.time()
+            for alert, price in fired:
+                pending = self._notifications.pop(alert.session_id, None) or deque(maxlen=MAX_PENDING_NOTIFICATIONS)
+                self._notifications[alert.session_id] = pending
+                pending.append({
+                    "id": alert.id, "coin_id": alert.coin_id, "direction": alert.direction,
+                    "threshold": alert.threshold, "price": price, "triggered_at": now,
+                })
+
+            elapsed = (time.perf_counter() - started) * 1000
+            stats = self._stats
+            stats["ticks"] += 1
+            stats["triggered"] += len(fired)
+            stats["prices_checked"] += len(prices)
+            stats["last_eval_ms"] = round(elapsed, 3)
+            stats["max_eval_ms"] = round(max(stats["max_eval_ms"], elapsed), 3)
+            stats["total_eval_ms"] += elapsed
+        return fired
+
+    def active(self, session_id):
+        with self._lock:
+            self._touch(session_id)
+            ids = self._by_session.get(session_id, ())
+            return sorted((self._alerts[alert_id] for alert_id in ids), key=lambda alert: alert.id)
+
+    def take_notifications(self, session_id):
+        with self._lock:
+            pending = self._notifications.pop(session_id, None)
+            self._touch(session_id)
+        cutoff = time.time() - ALERT_NOTIFICATION_TTL
+        return [notice for notice in pending if notice["triggered_at"] >= cutoff] if pending else []
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["total_eval_ms"] = round(stats["total_eval_ms"], 3)
+            stats["avg_eval_ms"] = round(stats["total_eval_ms"] / stats["ticks"], 3) if stats["ticks"] else 0.0
+            stats["active_alerts"] = len(self._alerts)
+            stats["coins_watched"] = len(self._index)
+            stats["sessions"] = len(self._by_session)
+            stats["tracked_sessions"] = len(self._last_seen)
+            stats["pending_notifications"] = sum(len(pending) for pending in self._notifications.values())
+        return stats
+
+
+alert_engine = AlertEngine()
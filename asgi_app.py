@@ -0,0 +1,294 @@
+"""
+ASGI entry point: `uvicorn asgi_app:app`.
+
+/get-response and /stream-response run on the asyncio pipeline in async_core,
+with a per-request deadline and cancellation when the client disconnects.
+Every other route is served by the Flask app on its own thread from the I/O
+pool (see ThreadedWsgiToAsgi).
+"""
+import asyncio
+import io
+import json
+import sys
+import types
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from async_core import process_with_deadline, run_blocking, REQUEST_DEADLINE_SECONDS
+from gemini_core import detect_intent_and_crypto, answer_query
+from metrics import trace, span, should_sample
+from flask_app import (
+    app as flask_app, format_reply_html, format_error_html, sse_event,
+    SESSION_COOKIE, SESSION_COOKIE_MAX_AGE, SESSION_ID_PATTERN,
+)
+
+
+def build_environ(scope, body):
+    # PEP 3333 environ for an ASGI http scope; paths and headers are latin-1 strings
+    script_name = scope.get("root_path", "").encode("utf-8").decode("latin-1")
+    path_info = scope["path"].encode("utf-8").decode("latin-1")
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if name not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            name = "HTTP_" + name
+        # Repeated headers are joined, as a WSGI server would
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_application, environ, send):
+    # Runs on a pool thread; send() blocks until the event loop has passed the message on
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response.get("sent"):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response["start"] = {
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        }
+
+    def send_start():
+        if not response.get("sent"):
+            send(response["start"])
+            response["sent"] = True
+
+    body = wsgi_application(environ, start_response)
+    try:
+        for chunk in body:
+            if chunk:
+                send_start()
+                send({"type": "http.response.body", "body": chunk, "more_body": True})
+        send_start()
+        send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+class ThreadedWsgiToAsgi:
+    # asgiref's WsgiToAsgi runs every WSGI call on one shared thread, which would serve
+    # the Flask routes one at a time; they are thread-safe, so each request gets its own
+    # thread from the I/O pool instead
+
+    def __init__(self, wsgi_application):
+        self.wsgi_application = wsgi_application
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def blocking_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        await run_blocking(run_wsgi, self.wsgi_application, build_environ(scope, body), blocking_send)
+
+
+wsgi_app = ThreadedWsgiToAsgi(flask_app)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def get_session_id(scope):
+    # Same cookie as flask_app.get_session_id; returns (session_id, is_new)
+    cookies = SimpleCookie()
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+    morsel = cookies.get(SESSION_COOKIE)
+    if morsel and SESSION_ID_PATTERN.match(morsel.value):
+        return morsel.value, False
+    return uuid.uuid4().hex, True
+
+
+def session_cookie_header(session_id):
+    cookie = f"{SESSION_COOKIE}={session_id}; Max-Age={SESSION_COOKIE_MAX_AGE}; Path=/; HttpOnly; SameSite=Lax"
+    return (b"set-cookie", cookie.encode("latin-1"))
+
+
+async def send_json(send, payload, status=200, session_id=None):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    if session_id:
+        headers.append(session_cookie_header(session_id))
+
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers,
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def get_response(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return
+
+    try:
+        data = json.loads(body or b"{}")
+        user_message = (data.get("message") or "").strip()
+    except (ValueError, AttributeError):
+        data, user_message = {}, ""
+    if not user_message:
+        await send_json(send, {"response": "⚠️ No message received."})
+        return
+
+    session_id, new_session = get_session_id(scope)
+    with trace("get-response") as request_trace:
+        work = asyncio.ensure_future(process_with_deadline(user_message, session_id=session_id))
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        done, _ = await asyncio.wait({work, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+
+        # ✅ Client went away: send nothing and start no further stages
+        # (the stage already running on the pool still finishes, see process_with_deadline)
+        if disconnect in done:
+            work.cancel()
+            return
+        disconnect.cancel()
+
+        try:
+            reply = work.result()
+            with span("format_html"):
+                formatted_reply = format_reply_html(reply)
+        except asyncio.TimeoutError:
+            formatted_reply = format_error_html("That took too long to answer. Please try again.")
+        except Exception as e:
+            formatted_reply = format_error_html(str(e))
+
+    payload = {"response": formatted_reply}
+    if should_sample(data.get("timing")):
+        payload["timing"] = request_trace.breakdown()
+    await send_json(send, payload, session_id=session_id if new_session else None)
+
+
+_END = object()
+
+
+async def stream_response(scope, receive, send):
+    # Same events as flask_app.stream_response, without holding a thread between pieces
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    user_message = (query.get("message") or [""])[0].strip()
+    session_id, new_session = get_session_id(scope)
+
+    headers = [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]
+    if new_session:
+        headers.append(session_cookie_header(session_id))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+
+    async def emit(event, data):
+        await send({"type": "http.response.body", "body": sse_event(event, data).encode("utf-8"), "more_body": True})
+
+    reply = None
+    try:
+        if not user_message:
+            await emit("message", "⚠️ No message received.")
+        else:
+            with trace("stream-response"):
+                try:
+                    reply = await asyncio.wait_for(run_blocking(classify_and_answer, user_message, session_id),
+                                                   timeout=REQUEST_DEADLINE_SECONDS)
+                    # General questions stream piece by piece; everything else arrives whole
+                    if isinstance(reply, types.GeneratorType):
+                        with span("llm_stream"):
+                            while not disconnect.done():
+                                piece = await run_blocking(next, reply, _END)
+                                if piece is _END:
+                                    break
+                                await emit("token", piece.replace("\n", "<br>"))
+                    else:
+                        with span("format_html"):
+                            formatted_reply = format_reply_html(reply)
+                        await emit("message", formatted_reply)
+                except asyncio.TimeoutError:
+                    await emit("message", format_error_html("That took too long to answer. Please try again."))
+                except Exception as e:
+                    await emit("message", format_error_html(str(e)))
+
+        if not disconnect.done():
+            await emit("done", "")
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnect.cancel()
+        # ✅ A client that left mid-answer closes the upstream model stream too
+        if isinstance(reply, types.GeneratorType):
+            try:
+                await run_blocking(reply.close)
+            except ValueError:
+                pass    # still inside next() on the pool; it ends at the upstream's read timeout
+
+
+def classify_and_answer(user_message, session_id):
+    return answer_query(user_message, detect_intent_and_crypto(user_message), stream=True, session_id=session_id)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/get-response" and scope["method"] == "POST":
+        await get_response(scope, receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/stream-response" and scope["method"] == "GET":
+        await stream_response(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from gemini_core import detect_intent_and_crypto, answer_query
+
+# The Gemini SDK and requests are blocking, so each awaitable stage runs on this
+# pool. Threads only wait on sockets here, so it can be much larger than the CPU count.
+ASYNC_WORKER_THREADS = int(os.getenv("ASYNC_WORKER_THREADS", "256"))
+
+# Hard ceiling on one chat request, end to end
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+
+io_executor = ThreadPoolExecutor(max_workers=ASYNC_WORKER_THREADS, thread_name_prefix="cryptora-io")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Awaits a blocking call on the shared I/O pool."""
+    loop = asyncio.get_running_loop()
+    # The caller's context goes along, so spans on the pool join its request trace
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(io_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def process_user_input_async(user_input, session_id="default"):
+    fields = await run_blocking(detect_intent_and_crypto, user_input)
+    return await run_blocking(answer_query, user_input, fields, session_id=session_id)
+
+
+async def process_with_deadline(user_input, deadline=None, session_id="default"):
+    """
+    Runs the chat pipeline under a deadline.
+    Raises asyncio.TimeoutError when it expires. Cancelling (deadline or client
+    disconnect) only stops the stages that haven't started: a blocking stage
+    already on the pool can't be interrupted and runs to completion in the
+    background, bounded by its own upstream timeouts and circuit breakers.
+    """
+    return await asyncio.wait_for(
+        process_user_input_async(user_input, session_id),
+        timeout=deadline or REQUEST_DEADLINE_SECONDS,
+    )
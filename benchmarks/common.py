@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus.jsonl")
+
+# The app's modules are flat files at the repo root
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies_ms):
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def print_table(title, rows, columns):
+    # rows: [(name, {column: value})]
+    print(f"\n{title}")
+    width = max([len(name) for name, _ in rows] + [4])
+    print(f"{'':<{width}}  " + "  ".join(f"{column:>10}" for column in columns))
+    for name, values in rows:
+        print(f"{name:<{width}}  " + "  ".join(f"{values.get(column, ''):>10}" for column in columns))
+
+
+def check_regressions(results, baseline_path, max_regression, keys=("p50_ms", "p95_ms", "p99_ms")):
+    """
+    Compares {name: summary} with a baseline written by --json. Returns the
+    regressions, as messages, where a latency grew by more than max_regression.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for key in keys:
+            old, new = before.get(key), summary.get(key)
+            if old and new is not None and new > old * (1 + max_regression):
+                regressions.append(f"{name} {key}: {old} → {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def write_json(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,75 @@
+"""
+Stand-in for the Gemini model handle used by gemini_core.
+
+It answers the three prompts the app sends: the structured intent extraction
+(from the corpus entry's expected fields), the news sub-intent classification
+and the general answer used while the HF space is down. install() puts it where
+get_gemini_model() looks, so the google.generativeai SDK is never imported and
+no API key is needed.
+"""
+import random
+import re
+import time
+
+from benchmarks.stub_servers import hf_answer
+
+USER_QUERY = re.compile(r'User Query:\**\s*"(.*)"', re.DOTALL)
+QUESTION = re.compile(r"\nQuestion: (.*)", re.DOTALL)
+
+DEFAULT_FIELDS = {"intent": "general", "asset": "unknown", "date": "unknown", "number": "unknown",
+                  "news_intent": "none", "keyword": "none", "weekday": "none"}
+
+
+class FakeResponse:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    def __init__(self, corpus, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0):
+        self.fields = {entry["query"].strip().lower(): dict(DEFAULT_FIELDS, **entry.get("expect", {}))
+                       for entry in corpus}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError("429 Resource has been exhausted (injected)")
+
+        # gemini_core.fallback_answer
+        question = QUESTION.search(prompt)
+        if question:
+            return FakeResponse(hf_answer(question.group(1).strip()))
+
+        matches = USER_QUERY.findall(prompt)
+        query = matches[-1].strip().lower() if matches else ""
+        fields = self.fields.get(query, DEFAULT_FIELDS)
+
+        # classify_news_intent: "<intent>,<keyword>"
+        if "sub-intent of their request" in prompt:
+            return FakeResponse(f"{fields['news_intent']},{fields['keyword']}")
+
+        return FakeResponse("\n".join([
+            f"Intent: {fields['intent']}",
+            f"Asset: {fields['asset']}",
+            f"Date: {fields['date']}",
+            f"Number: {fields['number']}",
+            f"NewsIntent: {fields['news_intent']}",
+            f"Keyword: {fields['keyword']}",
+            f"Weekday: {fields['weekday']}",
+        ]))
+
+
+def install(model):
+    """Makes gemini_core use `model` instead of building a real Gemini handle."""
+    import gemini_core
+    gemini_core._gemini_model = model
+    return model
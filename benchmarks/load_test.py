@@ -0,0 +1,216 @@
+"""
+Concurrent load test of the chat pipeline against local stub upstreams.
+
+    python -m benchmarks.load_test [--app flask|asgi|core] [--concurrency 16] [--requests 1000]
+
+Starts the stub CoinGecko / CryptoPanic / HF servers, points the app at them,
+swaps in the fake Gemini model, then replays the query corpus from
+`concurrency` clients. "flask" and "asgi" go through /get-response over HTTP
+(werkzeug's threaded server or uvicorn); "core" calls process_user_input
+directly. Reports p50/p95/p99 latency and requests per second, overall and
+per intent. With --baseline, exits non-zero when latency or throughput
+regressed by more than --max-regression.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import load_corpus, summarize, print_table, check_regressions, write_json
+from benchmarks.stub_servers import StubServer, UpstreamConfig
+from benchmarks.fake_genai import FakeGeminiModel, install
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def prepare_app(args, corpus):
+    """Starts the stubs and imports the app against them; returns (stubs, fake model, flask_app)."""
+    upstream = lambda latency: UpstreamConfig(latency, latency / 4, args.error_rate)
+    stubs = StubServer(
+        coingecko=upstream(args.upstream_latency_ms),
+        cryptopanic=upstream(args.upstream_latency_ms),
+        hf=UpstreamConfig(args.llm_latency_ms, args.llm_latency_ms / 4, args.error_rate, token_ms=2),
+    ).start()
+
+    # Scratch stores so a run neither reads nor pollutes data/
+    workdir = tempfile.mkdtemp(prefix="cryptora-bench-")
+    os.environ.update(stubs.env())
+    for name, value in {
+        "GEMINI_API_KEY": "bench",
+        "CRYPTO_PANIC_API_KEY": "bench",
+        "PRICE_STORE_PATH": os.path.join(workdir, "prices.sqlite3"),
+        "NEWS_STORE_PATH": os.path.join(workdir, "news.sqlite3"),
+        "SEMANTIC_CACHE_PATH": os.path.join(workdir, "semantic_cache.sqlite3"),
+        "SHARED_CACHE_PATH": os.path.join(workdir, "shared_cache.sqlite3"),
+        "COIN_LIST_CACHE": os.path.join(workdir, "coin_list.full.json"),
+        # Stubs don't throttle; keep the budgets so the scheduler is on the measured path
+        "COINGECKO_RATE_PER_MINUTE": "60000",
+        "CRYPTOPANIC_RATE_PER_MINUTE": "60000",
+    }.items():
+        os.environ.setdefault(name, value)
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["SEMANTIC_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["SHARED_CACHE_BACKEND"] = "none"
+
+    # Imported only now: upstream URLs and store paths are read at import time
+    import flask_app
+    from market_snapshot import market_snapshot
+    from news_store import news_store
+
+    model = install(FakeGeminiModel(corpus, args.llm_latency_ms / 4, args.llm_latency_ms / 16, args.error_rate))
+    if not wait_for(market_snapshot.is_fresh) or not wait_for(lambda: news_store.ingested_at is not None):
+        print("warning: market snapshot / news store not ready, first requests take the live path")
+    return stubs, model, flask_app
+
+
+def start_http_server(kind, flask_app):
+    port = free_port()
+    if kind == "flask":
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server("127.0.0.1", port, flask_app.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, name="bench-flask", daemon=True).start()
+    else:
+        import uvicorn
+        import asgi_app
+        server = uvicorn.Server(uvicorn.Config(asgi_app.app, host="127.0.0.1", port=port, log_level="warning",
+                                               lifespan="on"))
+        threading.Thread(target=server.run, name="bench-uvicorn", daemon=True).start()
+        wait_for(lambda: server.started)
+    return f"http://127.0.0.1:{port}"
+
+
+def make_sender(args, flask_app):
+    if args.app == "core":
+        from gemini_core import process_user_input
+
+        def send(client, query):
+            reply = process_user_input(query, session_id=client)
+            return bool(reply)
+        return lambda worker: f"bench-{worker}", send
+
+    import requests
+    url = start_http_server(args.app, flask_app) + "/get-response"
+
+    def send(client, query):
+        response = client.post(url, json={"message": query}, timeout=args.timeout)
+        # Failures still come back as 200 with an error box
+        return response.status_code == 200 and "❌ Error" not in response.text
+    return lambda worker: requests.Session(), send
+
+
+def run_load(corpus, new_client, send, concurrency, total, duration):
+    order = itertools.count()
+    order_lock = threading.Lock()
+    deadline = time.monotonic() + duration if duration else None
+    samples = []      # (intent, ms, ok)
+
+    def worker(index):
+        client = new_client(index)
+        while True:
+            with order_lock:
+                i = next(order)
+            if (total and i >= total) or (deadline and time.monotonic() >= deadline):
+                return
+            entry = corpus[i % len(corpus)]
+            started = time.perf_counter()
+            try:
+                ok = send(client, entry["query"])
+            except Exception as e:
+                ok = False
+                print(f"request failed ({entry['query']!r}): {e}")
+            samples.append((entry["intent"], (time.perf_counter() - started) * 1000, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def report(samples, elapsed):
+    results = {"overall": summarize([ms for _, ms, _ in samples])}
+    results["overall"]["errors"] = sum(1 for _, _, ok in samples if not ok)
+    results["overall"]["rps"] = round(len(samples) / elapsed, 2) if elapsed else 0.0
+    for intent in sorted({intent for intent, _, _ in samples}):
+        results[f"intent:{intent}"] = summarize([ms for name, ms, _ in samples if name == intent])
+        results[f"intent:{intent}"]["errors"] = sum(1 for name, _, ok in samples if name == intent and not ok)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=("flask", "asgi", "core"), default="flask")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="total requests (0: run for --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds, instead of a request count")
+    parser.add_argument("--upstream-latency-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=400, help="HF /infer; Gemini gets a quarter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream calls that fail")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=7, help="corpus shuffle")
+    parser.add_argument("--no-warmup", action="store_true", help="skip the unmeasured pass over the corpus")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response and semantic caches")
+    parser.add_argument("--json", help="write results here (usable as a --baseline later)")
+    parser.add_argument("--baseline", help="compare with an earlier --json result")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    random.Random(args.seed).shuffle(corpus)
+    stubs, model, flask_app = prepare_app(args, corpus)
+    new_client, send = make_sender(args, flask_app)
+
+    if not args.no_warmup:
+        run_load(corpus, new_client, send, 1, len(corpus), 0)
+
+    samples, elapsed = run_load(corpus, new_client, send, args.concurrency, args.requests, args.duration)
+    results = report(samples, elapsed)
+
+    columns = ("count", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    print_table(f"{args.app}: {len(samples)} requests, concurrency {args.concurrency}, "
+                f"{elapsed:.1f}s, {results['overall']['rps']} req/s",
+                sorted(results.items()), columns)
+    print(f"\nupstream calls: {json.dumps(stubs.requests)}, fake Gemini calls: {model.calls}")
+    print(f"prefetch: {json.dumps(flask_app.prefetcher.stats())}")
+
+    if args.json:
+        write_json(args.json, results)
+    if args.baseline:
+        regressions = check_regressions(results, args.baseline, args.max_regression)
+        with open(args.baseline, encoding="utf-8") as f:
+            old_rps = json.load(f).get("overall", {}).get("rps")
+        if old_rps and results["overall"]["rps"] < old_rps * (1 - args.max_regression):
+            regressions.append(f"overall rps: {old_rps} → {results['overall']['rps']}")
+        for message in regressions:
+            print("REGRESSION", message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Microbenchmarks for the pure parsing / formatting helpers on the request path.
+
+    python -m benchmarks.micro [--filter name] [--json out.json] [--baseline old.json]
+
+Each case is timed in `repeat` batches of `number` calls; p50/p95/p99 are
+per-call times across batches, in microseconds. Before timing, a few behaviour
+checks run (local intent classification, questions that must or must never
+share a semantic-cache answer, breaker bookkeeping of an abandoned stream), and the run fails if any of them does.
+"""
+import argparse
+import sys
+import timeit
+
+from benchmarks.common import load_corpus, summarize, print_table, check_regressions, write_json
+from benchmarks.stub_servers import coingecko as stub_coingecko, cryptopanic as stub_cryptopanic, hf_answer
+
+import circuit_breaker
+import gemini_core
+from intent_classifier import LOCAL_INTENT_CONFIDENCE, classify_intent_locally
+from alert_engine import parse_alert
+from portfolio import parse_holdings
+from market_analytics import analyze_market_chart, analyze_ohlc
+from semantic_cache import SEMANTIC_CACHE_THRESHOLD, normalize, minhash, band_keys, jaccard, shared_key
+from stream_filters import StreamCleaner
+from summarizer import normalize_url
+
+
+def stream_clean(text):
+    cleaner = StreamCleaner()
+    for token in text.split(" "):
+        cleaner.feed(token + " ")
+    return cleaner.finish()
+
+
+def semantic_signature(query):
+    words = normalize(query)
+    return band_keys(minhash(words)) if words else None
+
+
+# Advice and how-to questions mention list / price words but need the LLM
+LLM_ONLY_QUESTIONS = [
+    "best coins to buy",
+    "How do I cost average into bitcoin?",
+    "Is it worth buying bitcoin now?",
+    "How to invest in solana",
+    "Should I sell my ETH?",
+    "When should I take profit on bitcoin?",
+]
+
+
+def check_local_classifier():
+    # Corpus queries the fast path answers must get their expected intent; advice must be deferred
+    failures = []
+    for entry in load_corpus():
+        intent, _, _, _, confidence = classify_intent_locally(entry["query"])
+        if confidence >= LOCAL_INTENT_CONFIDENCE and intent != entry["expect"]["intent"]:
+            failures.append(f"{entry['query']!r} classified locally as {intent}, expected {entry['expect']['intent']}")
+    for query in LLM_ONLY_QUESTIONS:
+        intent, _, _, _, confidence = classify_intent_locally(query)
+        if confidence >= LOCAL_INTENT_CONFIDENCE:
+            failures.append(f"{query!r} classified locally as {intent} instead of going to the LLM")
+    return failures
+
+
+# Different questions that differ only in a question word, modal or negation
+DISTINCT_QUESTIONS = [
+    ("Who created Bitcoin?", "Why was Bitcoin created?"),
+    ("Who created Bitcoin?", "When was Bitcoin created?"),
+    ("Why was Bitcoin created?", "When was Bitcoin created?"),
+    ("How do I buy bitcoin?", "Where do I buy bitcoin?"),
+    ("How do I buy bitcoin?", "Why buy bitcoin?"),
+    ("Where can I buy bitcoin?", "Should I buy bitcoin?"),
+    ("Should I buy bitcoin?", "Can I buy bitcoin?"),
+    ("Is Binance safe?", "Isn't Binance safe?"),
+    ("Is bitcoin better than ethereum?", "Is ethereum better than bitcoin?"),
+    ("Is Solana safer than Cardano?", "Is Cardano safer than Solana?"),
+]
+
+# Rewordings of one question that must share its answer
+SIMILAR_QUESTIONS = [
+    ("Is Binance safe?", "How safe is Binance?"),
+    ("Is Binance safe?", "Binance, is it safe?"),
+    ("What is proof of stake?", "Explain proof of stake"),
+    ("What's a bitcoin wallet?", "What is a bitcoin wallet?"),
+    ("Is bitcoin better than ethereum?", "Is Bitcoin better than Ethereum"),
+]
+
+
+def check_semantic_collisions():
+    # Each pair must get different shared-cache keys and stay below the hit threshold
+    failures = []
+    for first, second in DISTINCT_QUESTIONS:
+        a, b = normalize(first), normalize(second)
+        if shared_key(a) == shared_key(b) or jaccard(a, b) >= SEMANTIC_CACHE_THRESHOLD:
+            failures.append(f"{first!r} and {second!r} share a semantic-cache answer")
+    return failures
+
+
+def check_semantic_hits():
+    failures = []
+    for first, second in SIMILAR_QUESTIONS:
+        score = jaccard(normalize(first), normalize(second))
+        if score < SEMANTIC_CACHE_THRESHOLD:
+            failures.append(f"{first!r} and {second!r} don't share an answer (similarity {score:.2f})")
+    return failures
+
+
+class _FakeStream:
+    # Just enough of a streamed requests.Response for stream_gemini
+    status_code = 200
+    headers = {"Content-Type": "text/plain"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        for word in hf_answer("what moves crypto now").split(" "):
+            yield word + " "
+
+
+class _FakeSpace:
+    def post(self, path, **kwargs):
+        return _FakeStream()
+
+
+def check_stream_close_releases_breaker():
+    # A client dropping a streamed answer during the half-open trial must not leave
+    # the breaker waiting on that trial forever
+    breaker = circuit_breaker.CircuitBreaker("micro_check", timeout=5, open_seconds=0)
+    breaker.state, breaker._opened_at = circuit_breaker.OPEN, 0.0
+    saved = gemini_core.hf_breaker, gemini_core.hf_space
+    gemini_core.hf_breaker, gemini_core.hf_space = breaker, _FakeSpace()
+    try:
+        # "now": time-sensitive, so the semantic cache stays out of it
+        reply = gemini_core.stream_gemini("what moves crypto now")
+        next(reply)
+        reply.close()
+    finally:
+        gemini_core.hf_breaker, gemini_core.hf_space = saved
+        del circuit_breaker.BREAKERS["micro_check"]
+
+    if breaker.state != circuit_breaker.CLOSED or not breaker.allow():
+        return [f"stream closed during the half-open trial left the breaker {breaker.state}"]
+    return []
+
+
+CHECKS = [check_local_classifier, check_semantic_collisions, check_semantic_hits, check_stream_close_releases_breaker]
+
+
+def build_cases():
+    queries = [entry["query"] for entry in load_corpus()]
+    chart_30d = stub_coingecko(["coins", "bitcoin", "market_chart"], {"days": ["30"]})[1]
+    chart_365d = stub_coingecko(["coins", "bitcoin", "market_chart"], {"days": ["365"]})[1]
+    candles = stub_coingecko(["coins", "bitcoin", "ohlc"], {"days": ["30"]})[1]
+    posts = stub_cryptopanic(["posts"], {})[1]["results"][:5]
+    answer = hf_answer("is binance safe") + " **Stay safe.** Want to know more?"
+    intent_reply = "Intent: history\nAsset: ethereum\nDate: 01-03-2025 to 31-03-2025\nNumber: unknown\n" \
+                   "NewsIntent: none\nKeyword: none\nWeekday: monday"
+
+    def each_query(fn):
+        return lambda: [fn(query) for query in queries]
+
+    # (name, fn, calls per fn() invocation)
+    return [
+        ("classify_intent_locally", each_query(classify_intent_locally), len(queries)),
+        ("parse_intent_response", lambda: gemini_core.parse_intent_response(intent_reply), 1),
+        ("parse_alert", each_query(parse_alert), len(queries)),
+        ("parse_holdings", lambda: parse_holdings("value of my portfolio: 2k ADA, 100 SOL, 0.25 BTC"), 1),
+        ("semantic_signature", each_query(semantic_signature), len(queries)),
+        ("clean_llm_answer", lambda: gemini_core.clean_llm_answer(answer), 1),
+        ("stream_cleaner", lambda: stream_clean(answer), 1),
+        ("format_news_response", lambda: gemini_core.format_news_response(posts), 1),
+        ("analyze_market_chart_30d", lambda: analyze_market_chart(chart_30d), 1),
+        ("analyze_market_chart_365d", lambda: analyze_market_chart(chart_365d), 1),
+        ("analyze_ohlc_30d", lambda: analyze_ohlc(candles), 1),
+        ("normalize_url", lambda: normalize_url("https://Example.com/news/a/?utm_source=x&b=2&a=1#top"), 1),
+    ]
+
+
+def run(cases, repeat, target_seconds):
+    results = {}
+    for name, fn, calls in cases:
+        timer = timeit.Timer(fn)
+        # Enough calls per batch that one batch takes about target_seconds / repeat
+        number, elapsed = timer.autorange()
+        number = max(1, int(number * (target_seconds / repeat) / max(elapsed, 1e-9)))
+        batches = timer.repeat(repeat=repeat, number=number)
+        per_call_us = [batch / number / calls * 1e6 for batch in batches]
+        summary = summarize(per_call_us)
+        # summarize() labels in ms; here the unit is µs
+        results[name] = {key.replace("_ms", "_us"): value for key, value in summary.items()}
+        results[name]["count"] = number * repeat * calls
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per case")
+    parser.add_argument("--json", help="write results here (usable as a --baseline later)")
+    parser.add_argument("--baseline", help="fail if a case is slower than in this results file")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    args = parser.parse_args(argv)
+
+    failures = [message for check in CHECKS for message in check()]
+    for message in failures:
+        print("CHECK FAILED", message)
+    if failures:
+        return 1
+
+    cases = [case for case in build_cases() if args.filter in case[0]]
+    results = run(cases, args.repeat, args.seconds)
+    print_table("Microbenchmarks (µs per call)", sorted(results.items()),
+                ("count", "p50_us", "p95_us", "p99_us", "max_us"))
+
+    if args.json:
+        write_json(args.json, results)
+    if args.baseline:
+        regressions = check_regressions(results, args.baseline, args.max_regression,
+                                        keys=("p50_us", "p95_us"))
+        for message in regressions:
+            print("REGRESSION", message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Local stand-ins for the upstream APIs, so benchmarks need no network or keys.
+
+One threaded HTTP server answers, with the response shapes the app reads:
+  /coingecko/...    the CoinGecko v3 routes the app calls
+  /cryptopanic/...  CryptoPanic /posts/
+  /hf/infer         the HF space (JSON, or SSE tokens with "stream": true)
+
+Every upstream has its own latency (mean ± jitter, in ms) and error rate;
+injected errors are 429s and 500s with "Retry-After: 0".
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAY_MS = 86_400_000
+HOUR_MS = 3_600_000
+
+with open(os.path.join(REPO_ROOT, "data", "coin_list.json"), encoding="utf-8") as f:
+    KNOWN_COINS = json.load(f)
+
+# Filler coins so /coins/markets has as many pages as the real thing
+COINS = KNOWN_COINS + [
+    {"id": f"stub-coin-{i}", "symbol": f"stb{i}", "name": f"Stub Coin {i}"}
+    for i in range(len(KNOWN_COINS), 1000)
+]
+COINS_BY_ID = {coin["id"]: coin for coin in COINS}
+RANKS = {coin["id"]: rank for rank, coin in enumerate(COINS, 1)}
+
+EXCHANGES = ["binance", "coinbase", "kraken", "okx", "bybit", "kucoin", "bitstamp", "gemini", "htx", "gate"]
+NFTS = ["bored-ape-yacht-club", "cryptopunks", "azuki", "pudgy-penguins", "doodles-official"]
+CATEGORIES = ["Layer 1 (L1)", "Smart Contract Platform", "Decentralized Finance (DeFi)", "Meme", "Stablecoins",
+              "Layer 2 (L2)", "Gaming (GameFi)", "Real World Assets (RWA)", "Artificial Intelligence (AI)",
+              "Exchange-based Tokens", "Liquid Staking"]
+HEADLINES = ["{name} rallies as ETF inflows climb", "{name} network upgrade goes live",
+             "Exchange hack drains {name} hot wallet", "Analysts split on {name} after weekly close",
+             "{name} whales accumulate ahead of halving", "Regulators open probe into {name} lending desk"]
+ANSWER = ("{topic} depends on how you use it. Large exchanges hold most funds in cold storage and publish "
+          "proof of reserves. Enable two-factor authentication and withdraw long-term holdings to a wallet "
+          "you control. No platform is risk free, so only keep what you trade on an exchange.")
+
+
+def seed_of(*parts):
+    return int.from_bytes(hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).digest(), "little")
+
+
+def base_price(coin_id):
+    # Deterministic per coin: a rank-ish price between $0.01 and ~$60k
+    rank = RANKS.get(coin_id, len(COINS))
+    if rank > len(KNOWN_COINS):
+        return round(0.01 + (seed_of(coin_id) % 10_000) / 1000, 4)
+    return round(60_000 / rank ** 1.6, 4)
+
+
+def supply_of(coin_id):
+    # Market cap falls with rank, from ~$2T down; the biggest few dozen are above $1B
+    return 2e12 / RANKS.get(coin_id, len(COINS)) ** 2 / base_price(coin_id)
+
+
+def walk(coin_id, start_ms, end_ms, step_ms):
+    # Seeded random walk around the coin's base price, one point per step
+    rng = random.Random(seed_of(coin_id, start_ms // DAY_MS, step_ms))
+    price = base_price(coin_id)
+    points = []
+    for ms in range(start_ms - start_ms % step_ms, end_ms, step_ms):
+        price *= math.exp(rng.gauss(0, 0.02 if step_ms >= DAY_MS else 0.004))
+        points.append((ms, round(price, 6)))
+    return points
+
+
+class UpstreamConfig:
+    __slots__ = ("latency_ms", "jitter_ms", "error_rate", "token_ms")
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, token_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.token_ms = token_ms      # HF streaming: delay between tokens
+
+    def delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+
+# -------- Route handlers: (path parts, query) → (status, JSON body) --------
+
+def coingecko(parts, query):
+    first = lambda name, default=None: query.get(name, [default])[0]
+
+    if parts == ["coins", "list"]:
+        return 200, COINS
+
+    if parts == ["simple", "price"]:
+        ids = [coin_id for coin_id in (first("ids") or "").split(",") if coin_id in COINS_BY_ID]
+        return 200, {coin_id: {"usd": base_price(coin_id)} for coin_id in ids}
+
+    if parts == ["coins", "markets"]:
+        per_page = int(first("per_page", 100))
+        page = int(first("page", 1))
+        if first("ids"):
+            coins = [COINS_BY_ID[coin_id] for coin_id in first("ids").split(",") if coin_id in COINS_BY_ID]
+        else:
+            coins = COINS[(page - 1) * per_page:page * per_page]
+        return 200, [market_row(coin) for coin in coins[:per_page]]
+
+    if parts == ["coins", "categories"]:
+        return 200, [{"id": name.lower().replace(" ", "-"), "name": name} for name in CATEGORIES]
+
+    if parts == ["exchanges"]:
+        return 200, [{"id": name, "name": name.capitalize(), "trust_score_rank": i + 1}
+                     for i, name in enumerate(EXCHANGES)]
+
+    if len(parts) == 2 and parts[0] == "exchanges":
+        if parts[1] not in EXCHANGES:
+            return 404, {"error": "exchange not found"}
+        return 200, {"name": parts[1].capitalize(), "year_established": 2012 + seed_of(parts[1]) % 10,
+                     "country": "Cayman Islands", "trade_volume_24h_btc": 10_000 + seed_of(parts[1]) % 90_000}
+
+    if len(parts) == 2 and parts[0] == "nfts":
+        if parts[1] not in NFTS:
+            return 404, {"error": "nft not found"}
+        floor = 1 + seed_of(parts[1]) % 50
+        return 200, {"id": parts[1], "name": parts[1].replace("-", " ").title(),
+                     "floor_price": {"usd": floor * 3000}, "market_cap": {"usd": floor * 3000 * 10_000}}
+
+    if len(parts) >= 2 and parts[0] == "coins":
+        coin = COINS_BY_ID.get(parts[1])
+        if coin is None:
+            return 404, {"error": "coin not found"}
+        coin_id = coin["id"]
+        now = int(time.time() * 1000)
+
+        if len(parts) == 2:
+            row = market_row(coin)
+            return 200, {"id": coin_id, "symbol": coin["symbol"], "name": coin["name"], "market_data": {
+                "current_price": {"usd": row["current_price"]},
+                "market_cap": {"usd": row["market_cap"]},
+                "total_volume": {"usd": row["total_volume"]},
+                "circulating_supply": row["circulating_supply"],
+            }}
+
+        if parts[2] == "history":
+            return 200, {"id": coin_id, "market_data": {"current_price": {"usd": base_price(coin_id)}}}
+
+        if parts[2] == "market_chart":
+            days = first("days", "30")
+            days = 3650 if days == "max" else float(days)
+            step = DAY_MS if first("interval") == "daily" or days > 90 else HOUR_MS
+            prices = walk(coin_id, now - int(days * DAY_MS), now, step)
+            supply = supply_of(coin_id)
+            return 200, {
+                "prices": [[ms, price] for ms, price in prices],
+                "market_caps": [[ms, price * supply] for ms, price in prices],
+                "total_volumes": [[ms, price * supply * 0.03] for ms, price in prices],
+            }
+
+        if parts[2] == "ohlc":
+            days = int(first("days", "1"))
+            step = 30 * 60_000 if days <= 2 else 4 * HOUR_MS if days <= 30 else 4 * DAY_MS
+            candles = []
+            for ms, close in walk(coin_id, now - days * DAY_MS, now, step):
+                spread = close * 0.01
+                candles.append([ms, round(close - spread / 2, 6), round(close + spread, 6),
+                                round(close - spread, 6), close])
+            return 200, candles
+
+    return 404, {"error": "Not found"}
+
+
+def market_row(coin):
+    price = base_price(coin["id"])
+    supply = supply_of(coin["id"])
+    return {
+        "id": coin["id"], "symbol": coin["symbol"], "name": coin["name"],
+        "current_price": price, "market_cap": round(price * supply), "market_cap_rank": RANKS[coin["id"]],
+        "circulating_supply": round(supply), "total_volume": round(price * supply * 0.03),
+        "price_change_percentage_24h": round((seed_of(coin["id"], "24h") % 2000) / 100 - 10, 2),
+    }
+
+
+def cryptopanic(parts, query):
+    if parts != ["posts"]:
+        return 404, {"error": "Not found"}
+
+    page = int(query.get("page", ["1"])[0])
+    currencies = (query.get("currencies", [""])[0] or "BTC,ETH,SOL").upper().split(",")
+    hour = int(time.time()) // 3600
+    posts = []
+    for i in range(20):
+        n = (page - 1) * 20 + i
+        code = currencies[n % len(currencies)]
+        name = next((coin["name"] for coin in KNOWN_COINS if coin["symbol"].upper() == code), code)
+        published = time.gmtime((hour - n) * 3600)
+        posts.append({
+            "kind": "news",
+            "slug": f"stub-{hour - n}-{code.lower()}-{n}",
+            "title": HEADLINES[n % len(HEADLINES)].format(name=name),
+            "description": f"Stub coverage of {name}: market reaction, on-chain flows and analyst takes.",
+            "published_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", published),
+            "domain": "stubnews.example",
+            "currencies": [{"code": code, "title": name}],
+        })
+    return 200, {"results": posts, "next": None if page >= 3 else f"?page={page + 1}"}
+
+
+def hf_answer(prompt):
+    topic = (prompt or "That").strip().rstrip("?").capitalize()
+    return ANSWER.format(topic=topic)
+
+
+# -------- Server --------
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive, like the real APIs
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def dispatch(self, body=None):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if not parts or parts[0] not in self.server.upstreams:
+            return self.send_json(404, {"error": "Unknown upstream"})
+
+        upstream = parts[0]
+        config = self.server.upstreams[upstream]
+        self.server.count(upstream)
+        config.delay()
+        if config.error_rate and random.random() < config.error_rate:
+            status = random.choice((429, 500))
+            return self.send_json(status, {"error": "injected"}, [("Retry-After", "0")])
+
+        if upstream == "hf":
+            return self.infer(body or {}, config)
+        handler = coingecko if upstream == "coingecko" else cryptopanic
+        status, payload = handler(parts[1:], parse_qs(url.query))
+        self.send_json(status, payload)
+
+    def infer(self, body, config):
+        answer = hf_answer(body.get("prompt"))
+        if not body.get("stream"):
+            return self.send_json(200, {"response": answer})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for token in answer.split(" "):
+            if config.token_ms:
+                time.sleep(config.token_ms / 1000)
+            self.wfile.write(f"data: {json.dumps({'token': token + ' '})}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = {}
+        self.dispatch(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, coingecko=None, cryptopanic=None, hf=None):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.upstreams = {
+            "coingecko": coingecko or UpstreamConfig(),
+            "cryptopanic": cryptopanic or UpstreamConfig(),
+            "hf": hf or UpstreamConfig(),
+        }
+        self.requests = dict.fromkeys(self.upstreams, 0)
+        self._lock = threading.Lock()
+
+    def count(self, upstream):
+        with self._lock:
+            self.requests[upstream] += 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def env(self):
+        """Environment that points the app's upstream clients at this server."""
+        return {
+            "COINGECKO_BASE_URL": f"{self.base_url}/coingecko",
+            "CRYPTOPANIC_BASE_URL": f"{self.base_url}/cryptopanic",
+            "HF_SPACE_URL": f"{self.base_url}/hf",
+        }
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="stub-upstreams", daemon=True)
+        thread.start()
+        return self
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve stub CoinGecko / CryptoPanic / HF space APIs.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50, help="CoinGecko and CryptoPanic latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="HF /infer latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.port,
+        coingecko=UpstreamConfig(args.latency_ms, args.latency_ms / 4, args.error_rate),
+        cryptopanic=UpstreamConfig(args.latency_ms, args.latency_ms / 4, args.error_rate),
+        hf=UpstreamConfig(args.llm_latency_ms, args.llm_latency_ms / 4, args.error_rate, token_ms=10),
+    )
+    for name, value in server.env().items():
+        print(f"{name}={value}")
+    server.serve_forever()
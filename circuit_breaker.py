@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import carry_context
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# The breaker opens when, over the last BREAKER_WINDOW calls (at least
+# BREAKER_MIN_CALLS), this share failed or was slower than the slow-call threshold
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATIO = float(os.getenv("BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_SLOW_RATIO = float(os.getenv("BREAKER_SLOW_RATIO", "0.8"))
+# Seconds an open breaker rejects calls before letting one trial call through
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+# A second, hedged request goes out once the first has taken longer than this
+# percentile of recent successful calls; at most HEDGE_MAX_RATIO of calls are hedged
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 200
+
+# Threads that run guarded calls, so a hung backend costs a worker here rather than a request thread
+BREAKER_WORKERS = int(os.getenv("BREAKER_WORKERS", "64"))
+
+call_pool = ThreadPoolExecutor(max_workers=BREAKER_WORKERS, thread_name_prefix="breaker")
+
+BREAKERS = {}
+
+
+class CircuitOpen(RuntimeError):
+    """The backend's breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Guards one backend. Calls run on the shared pool under a hard timeout,
+    get a hedged duplicate when they run past the recent latency percentile,
+    and feed a sliding window of outcomes. Too many failures or slow calls in
+    that window open the breaker: calls fail fast with CircuitOpen until
+    `open_seconds` have passed, then a single trial call decides between
+    closing it again and another open period.
+    """
+
+    def __init__(self, name, timeout, slow_seconds=None, hedge=True, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, failure_ratio=BREAKER_FAILURE_RATIO,
+                 slow_ratio=BREAKER_SLOW_RATIO, open_seconds=BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.timeout = timeout
+        self.slow_seconds = slow_seconds
+        self.hedge = hedge
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_ratio = slow_ratio
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._outcomes = deque(maxlen=window)           # (ok, slow) per call
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)  # seconds, successful calls only
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "failures": 0, "timeouts": 0, "slow_calls": 0, "short_circuited": 0,
+            "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "opened": 0,
+        }
+        BREAKERS[name] = self
+
+    def allow(self):
+        """True if a call may go to the backend now (and, when half-open, claims the trial)."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._stats["short_circuited"] += 1
+                    return False
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    self._stats["short_circuited"] += 1
+                    return False
+                self._trial_running = True
+            return True
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_running = False
+        self._stats["opened"] += 1
+        print(f"Circuit breaker {self.name} opened")
+
+    def record(self, ok, seconds):
+        slow = self.slow_seconds is not None and seconds >= self.slow_seconds
+        with self._lock:
+            stats = self._stats
+            stats["calls"] += 1
+            stats["failures"] += not ok
+            stats["slow_calls"] += slow
+            if ok:
+                self._latencies.append(seconds)
+
+            if self.state == HALF_OPEN:
+                self._trial_running = False
+                if ok and not slow:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    print(f"Circuit breaker {self.name} closed")
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append((ok, slow))
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for ok, _ in self._outcomes if not ok)
+                slow_calls = sum(1 for _, slow in self._outcomes if slow)
+                if (failures / len(self._outcomes) >= self.failure_ratio
+                        or slow_calls / len(self._outcomes) >= self.slow_ratio):
+                    self._open()
+
+    def release(self):
+        """Gives back a call allow() let through that ended with no outcome (e.g. the caller went away)."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_running = False
+
+    def record_fallback(self):
+        with self._lock:
+            self._stats["fallbacks"] += 1
+
+    def latency_percentile(self, pct):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))]
+
+    def _hedge_delay(self):
+        if not self.hedge or self.state != CLOSED:
+            return None
+        with self._lock:
+            if self._stats["hedges"] >= HEDGE_MAX_RATIO * max(self._stats["calls"], 1):
+                return None
+        delay = self.latency_percentile(HEDGE_PERCENTILE)
+        return delay if delay is not None and delay < self.timeout else None
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) under the breaker. Raises CircuitOpen without
+        calling it while open, TimeoutError past `timeout`, else fn's own error.
+        """
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+
+        started = time.perf_counter()
+        try:
+            result = self._run(fn, args, kwargs, started + self.timeout)
+        except Exception:
+            self.record(False, time.perf_counter() - started)
+            raise
+        self.record(True, time.perf_counter() - started)
+        return result
+
+    def _run(self, fn, args, kwargs, deadline):
+        first = call_pool.submit(carry_context(fn), *args, **kwargs)
+        pending = {first}
+
+        delay = self._hedge_delay()
+        if delay is not None:
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                with self._lock:
+                    self._stats["hedges"] += 1
+                pending.add(call_pool.submit(carry_context(fn), *args, **kwargs))
+
+        error = None
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        with self._lock:
+                            self._stats["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+
+        if pending or error is None:
+            # The stragglers keep their pool threads until their own I/O timeouts expire
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise TimeoutError(f"{self.name} didn't answer within {self.timeout:g}s")
+        raise error
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self.state
+            recent = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+        stats["recent_error_ratio"] = round(failures / recent, 3) if recent else 0.0
+        p50, p95 = self.latency_percentile(50), self.latency_percentile(95)
+        stats["p50_seconds"] = round(p50, 3) if p50 is not None else None
+        stats["p95_seconds"] = round(p95, 3) if p95 is not None else None
+        stats["timeout_seconds"] = self.timeout
+        return stats
+
+
+def get_breaker_stats():
+    return {name: breaker.stats() for name, breaker in BREAKERS.items()}
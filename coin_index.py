@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+from http_client import coingecko
+from rate_limiter import background
+from response_cache import shared_get
+
+# Bundled snapshot of well-known coins, ordered by market cap rank.
+# Earlier entries win when several coins share a symbol or name.
+BUNDLED_COIN_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "coin_list.json")
+
+# Full /coins/list snapshot written by the background refresher
+COIN_LIST_CACHE = os.getenv("COIN_LIST_CACHE", os.path.join(os.path.dirname(BUNDLED_COIN_LIST), "coin_list.full.json"))
+
+# Nicknames and legacy tickers that are neither an id, symbol nor name
+ALIASES = {
+    "xbt": "bitcoin",
+    "btc.b": "bitcoin",
+    "ether": "ethereum",
+    "binance coin": "binancecoin",
+    "bnb coin": "binancecoin",
+    "toncoin": "the-open-network",
+    "polygon": "matic-network",
+    "pol": "matic-network",
+    "shiba": "shiba-inu",
+    "avalanche": "avalanche-2",
+    "lido": "lido-dao",
+    "cosmos": "cosmos",
+    "hedera": "hedera-hashgraph",
+    "cronos": "crypto-com-chain",
+    "render": "render-token",
+    "injective": "injective-protocol",
+    "multiversx": "elrond-erd-2",
+    "elrond": "elrond-erd-2",
+    "worldcoin": "worldcoin-wld",
+    "stacks": "blockstack",
+    "dogwifhat": "dogwifcoin",
+    "usd coin": "usd-coin",
+}
+
+
+class CoinIndex:
+    """
+    In-memory id ↔ symbol ↔ name lookup built from a CoinGecko coin list.
+    Every lookup is a dict hit; nothing here touches the network.
+    """
+
+    def __init__(self, coins=(), aliases=None):
+        self._by_id = {}
+        self._by_symbol = {}
+        self._by_name = {}
+        self._known = set()
+        self._aliases = dict(aliases or {})
+        self.loaded_at = None
+        self.load(coins, known=True)
+
+    def load(self, coins, known=False):
+        # Build new tables off to the side and swap them in, so readers never see a half-built index
+        by_id, by_symbol, by_name = dict(self._by_id), dict(self._by_symbol), dict(self._by_name)
+        known_ids = set(self._known)
+
+        for coin in coins:
+            coin_id = (coin.get("id") or "").strip().lower()
+            if not coin_id:
+                continue
+            symbol = (coin.get("symbol") or "").strip().lower()
+            name = (coin.get("name") or "").strip().lower()
+
+            by_id.setdefault(coin_id, (symbol, coin.get("name") or coin_id))
+            if symbol:
+                by_symbol.setdefault(symbol, coin_id)
+            if name:
+                by_name.setdefault(name, coin_id)
+            if known:
+                known_ids.add(coin_id)
+
+        self._by_id, self._by_symbol, self._by_name, self._known = by_id, by_symbol, by_name, known_ids
+        self.loaded_at = time.time()
+
+    def resolve(self, text, known_only=False):
+        """
+        Maps an id, ticker, name or alias ("BTC", "xbt", "Bitcoin") to a CoinGecko id.
+        With known_only=True only the bundled well-known coins match, which keeps
+        free-text scanning from picking up obscure coins named after common words.
+        """
+        key = (text or "").strip().lower()
+        if not key:
+            return None
+
+        coin_id = (
+            (key if key in self._by_id else None)
+            or self._aliases.get(key)
+            or self._by_symbol.get(key)
+            or self._by_name.get(key)
+        )
+        if coin_id and known_only and coin_id not in self._known:
+            return None
+        return coin_id
+
+    def symbol_for(self, coin_id):
+        entry = self._by_id.get(coin_id)
+        return entry[0].upper() if entry and entry[0] else None
+
+    def name_for(self, coin_id):
+        entry = self._by_id.get(coin_id)
+        return entry[1] if entry else None
+
+    def __contains__(self, coin_id):
+        return coin_id in self._by_id
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+def read_coin_list(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def build_coin_index():
+    index = CoinIndex(read_coin_list(BUNDLED_COIN_LIST), ALIASES)
+    index.load(read_coin_list(COIN_LIST_CACHE))
+    return index
+
+
+coin_index = build_coin_index()
+
+
+def refresh_coin_index():
+    """Downloads the full /coins/list, persists it and merges it behind the bundled coins."""
+    try:
+        response = shared_get(coingecko, "/coins/list", endpoint="coins_list")
+        if response.status_code != 200:
+            return False
+        coins = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print("Coin list refresh failed:", e)
+        return False
+
+    tmp_path = COIN_LIST_CACHE + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(coins, f, separators=(",", ":"))
+        os.replace(tmp_path, COIN_LIST_CACHE)
+    except OSError as e:
+        print("Could not persist coin list:", e)
+
+    coin_index.load(coins)
+    return True
+
+
+def start_coin_index_refresher(interval=None):
+    # Periodically refreshes the coin list in a daemon thread (interval in seconds, 0 disables)
+    if interval is None:
+        interval = int(os.getenv("COIN_INDEX_REFRESH_SECONDS", "86400"))
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            with background():
+                refresh_coin_index()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="coin-index-refresher", daemon=True)
+    thread.start()
+    return thread
@@ -1,9 +1,84 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from gemini_core import process_user_input
+from startup import STARTED_AT, record, timed, mark_ready, start_warm_up, startup_report, format_startup_report
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for, stream_with_context
+from gemini_core import process_user_input, detect_intent_and_crypto, answer_query, prefetcher
+from session_memory import session_memory
+from price_store import price_store, start_price_store_updater
+import json
+import re
+import time
+import types
+import uuid
+from intent_classifier import get_intent_path_stats
+from coin_index import coin_index, start_coin_index_refresher
+from http_client import get_pool_stats, get_rate_limit_stats
+from response_cache import response_cache
+from market_snapshot import market_snapshot
+from alert_engine import alert_engine
+from portfolio import price_batcher, value_portfolio
+from news_store import news_store, start_news_ingester
+from summarizer import summarizer
+from metrics import registry, render_metrics, trace, span, should_sample
+from semantic_cache import semantic_cache
+from circuit_breaker import get_breaker_stats
+from shared_cache import shared_cache
 import os
 
+# Gemini and newspaper are not imported here; they load on first use or via warm_up()
+record("imports", STARTED_AT)
+
 app = Flask(__name__)
 
+# ✅ The summarizer's forkserver re-imports the script behind `python flask_app.py` as
+# __mp_main__; only the server process runs background jobs and reports startup
+SERVER_PROCESS = __name__ != "__mp_main__"
+
+if SERVER_PROCESS:
+    # Keep the local CoinGecko id/symbol index fresh in the background
+    with timed("coin index refresher"):
+        start_coin_index_refresher()
+
+    # Top coins' price / market cap / supply / volume served from memory;
+    # every refresh is also one price-alert evaluation tick
+    with timed("market snapshot"):
+        market_snapshot.add_listener(lambda rows: alert_engine.evaluate({coin_id: row.price for coin_id, row in rows.items()}))
+        market_snapshot.start()
+
+    # Daily price history for history questions, topped up as new days close
+    with timed("price store updater"):
+        start_price_store_updater()
+
+    # CryptoPanic posts pulled into a local full-text index for news questions
+    with timed("news ingester"):
+        start_news_ingester(os.getenv("CRYPTO_PANIC_API_KEY"))
+
+    # Optional background preload of the lazy dependencies (WARM_UP_ON_START=1)
+    start_warm_up()
+
+# -------------------------------
+# SESSIONS
+# -------------------------------
+
+# Conversation memory is keyed on this cookie, one id per browser
+SESSION_COOKIE = "cryptora_sid"
+SESSION_COOKIE_MAX_AGE = 30 * 24 * 3600
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def get_session_id():
+    session_id = request.cookies.get(SESSION_COOKIE, "")
+    if not SESSION_ID_PATTERN.match(session_id):
+        session_id = uuid.uuid4().hex
+        g.new_session_id = session_id
+    return session_id
+
+@app.after_request
+def set_session_cookie(response):
+    session_id = g.pop("new_session_id", None)
+    if session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_COOKIE_MAX_AGE,
+                            httponly=True, samesite="Lax")
+    return response
+
+
 # -------------------------------
 # ROUTES
 # -------------------------------
@@ -25,58 +100,343 @@ def chat():
 # MAIN CHAT RESPONSE
 # -------------------------------
 
+def format_reply_html(reply):
+    # ------------------------------------------
+    # CASE 1: NEWS RESULT (dict type)
+    # Your original formatting style preserved
+    # ------------------------------------------
+    if isinstance(reply, dict):
+        title = reply.get("title", "")
+        date = reply.get("date", "")
+        sentiment = reply.get("sentiment", "")
+        source = reply.get("source", "")
+        description = reply.get("description", "")
+        link = reply.get("link", "#")
+
+        return f"""
+            <div class='response-box'>
+                <p>📰 <strong>{title}</strong></p>
+                <p>📅 <strong>Date:</strong> {date}</p>
+                <p>😐 <strong>Sentiment:</strong> {sentiment}</p>
+                <p>🌐 <strong>Source:</strong> {source}</p>
+                <p>📝 {description}</p>
+                <p>🔗 <a href='{link}' target='_blank'>{link}</a></p>
+            </div>
+        """
+
+    # ------------------------------------------
+    # CASE 2: TEXT RESULT (ALL PRICE, OHLC, TREND, LIST OUTPUTS)
+    # EXACT line breaks preserved without altering formatting
+    # ------------------------------------------
+    safe_text = reply.replace("\n", "<br>")
+    return f"""
+        <div class='response-box'>
+            <p style='margin:0; line-height:1.5;'>{safe_text}</p>
+        </div>
+    """
+
+def format_error_html(message):
+    return f"""
+        <div class='response-box' style='border-left:4px solid red;'>
+            <p>❌ Error: {message}</p>
+        </div>
+    """
+
 @app.route("/get-response", methods=["POST"])
 def get_response():
     user_message = request.json.get("message", "").strip()
     if not user_message:
         return jsonify({"response": "⚠️ No message received."})
 
+    with trace("get-response") as request_trace:
+        try:
+            reply = process_user_input(user_message, get_session_id())
+            with span("format_html"):
+                formatted_reply = format_reply_html(reply)
+        except Exception as e:
+            formatted_reply = format_error_html(str(e))
+
+    payload = {"response": formatted_reply}
+    # ✅ Sampled (TIMING_SAMPLE_RATE) or requested with "timing": true
+    if should_sample(request.json.get("timing")):
+        payload["timing"] = request_trace.breakdown()
+    return jsonify(payload)
+
+
+# -------------------------------
+# STREAMING CHAT RESPONSE (SSE)
+# -------------------------------
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/stream-response")
+def stream_response():
+    user_message = request.args.get("message", "").strip()
+    session_id = get_session_id()
+
+    def generate():
+        if not user_message:
+            yield sse_event("message", "⚠️ No message received.")
+            yield sse_event("done", "")
+            return
+
+        with trace("stream-response"):
+            try:
+                reply = answer_query(user_message, detect_intent_and_crypto(user_message),
+                                     stream=True, session_id=session_id)
+
+                # General questions stream piece by piece; everything else arrives whole
+                if isinstance(reply, types.GeneratorType):
+                    with span("llm_stream"):
+                        for piece in reply:
+                            yield sse_event("token", piece.replace("\n", "<br>"))
+                else:
+                    with span("format_html"):
+                        formatted_reply = format_reply_html(reply)
+                    yield sse_event("message", formatted_reply)
+            except Exception as e:
+                yield sse_event("message", format_error_html(str(e)))
+
+        yield sse_event("done", "")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+# -------------------------------
+# PRICE ALERTS
+# -------------------------------
+
+def alert_to_dict(alert):
+    return {"id": alert.id, "coin_id": alert.coin_id, "direction": alert.direction,
+            "threshold": alert.threshold, "created_at": alert.created_at}
+
+@app.route("/alerts", methods=["GET"])
+def list_alerts():
+    session_id = get_session_id()
+    return jsonify({
+        "alerts": [alert_to_dict(alert) for alert in alert_engine.active(session_id)],
+        "triggered": alert_engine.take_notifications(session_id),
+    })
+
+@app.route("/alerts", methods=["POST"])
+def create_alert():
+    data = request.get_json(silent=True) or {}
+    coin_id = coin_index.resolve(str(data.get("coin", "")))
     try:
-        reply = process_user_input(user_message)
-
-        # ------------------------------------------
-        # CASE 1: NEWS RESULT (dict type)
-        # Your original formatting style preserved
-        # ------------------------------------------
-        if isinstance(reply, dict):
-            title = reply.get("title", "")
-            date = reply.get("date", "")
-            sentiment = reply.get("sentiment", "")
-            source = reply.get("source", "")
-            description = reply.get("description", "")
-            link = reply.get("link", "#")
-
-            formatted_reply = f"""
-                <div class='response-box'>
-                    <p>📰 <strong>{title}</strong></p>
-                    <p>📅 <strong>Date:</strong> {date}</p>
-                    <p>😐 <strong>Sentiment:</strong> {sentiment}</p>
-                    <p>🌐 <strong>Source:</strong> {source}</p>
-                    <p>📝 {description}</p>
-                    <p>🔗 <a href='{link}' target='_blank'>{link}</a></p>
-                </div>
-            """
-
-        # ------------------------------------------
-        # CASE 2: TEXT RESULT (ALL PRICE, OHLC, TREND, LIST OUTPUTS)
-        # EXACT line breaks preserved without altering formatting
-        # ------------------------------------------
-        else:
-            safe_text = reply.replace("\n", "<br>")
-            formatted_reply = f"""
-                <div class='response-box'>
-                    <p style='margin:0; line-height:1.5;'>{safe_text}</p>
-                </div>
-            """
-
-    except Exception as e:
-        formatted_reply = f"""
-            <div class='response-box' style='border-left:4px solid red;'>
-                <p>❌ Error: {str(e)}</p>
-            </div>
-        """
+        threshold = float(data.get("threshold"))
+        if not coin_id:
+            raise ValueError("Unknown coin.")
+        alert = alert_engine.add(get_session_id(), coin_id, data.get("direction"), threshold)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(alert_to_dict(alert)), 201
+
+@app.route("/alerts/<int:alert_id>", methods=["DELETE"])
+def delete_alert(alert_id):
+    if not alert_engine.cancel(get_session_id(), alert_id):
+        return jsonify({"error": "Alert not found."}), 404
+    return jsonify({"deleted": alert_id})
+
+
+# -------------------------------
+# PORTFOLIO VALUATION
+# -------------------------------
+
+@app.route("/portfolio", methods=["POST"])
+def portfolio():
+    # {"holdings": [{"coin": "btc", "amount": 1.5}, ...]}
+    data = request.get_json(silent=True) or {}
+    holdings, unknown = [], []
+    try:
+        for position in data.get("holdings") or []:
+            coin = str(position.get("coin", ""))
+            coin_id = coin_index.resolve(coin)
+            if coin_id:
+                holdings.append((coin_id, float(position.get("amount"))))
+            else:
+                unknown.append(coin)
+        result = value_portfolio(holdings)
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid holdings: {e}"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 502
+
+    result["unknown"] = unknown
+    return jsonify(result)
+
+
+# -------------------------------
+# ARTICLE SUMMARIES
+# -------------------------------
+
+# Longest a summary stream stays open, in seconds
+SUMMARY_STREAM_TIMEOUT = 120
+
+def summary_links(job):
+    return {"poll": url_for("summary_status", job_id=job.id),
+            "stream": url_for("summary_stream", job_id=job.id)}
+
+@app.route("/summarize", methods=["POST"])
+def summarize():
+    # {"url": "https://..."} → the finished summary, or 202 with a job handle
+    data = request.get_json(silent=True) or {}
+    try:
+        job = summarizer.submit(str(data.get("url") or request.args.get("url", "")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if job.done.is_set():
+        return jsonify(job.to_dict())
+    return jsonify(dict(job.to_dict(), **summary_links(job))), 202
+
+@app.route("/summarize/<job_id>")
+def summary_status(job_id):
+    job = summarizer.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/summarize/<job_id>/stream")
+def summary_stream(job_id):
+    job = summarizer.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+
+    def generate():
+        # Comment lines keep proxies from closing the idle connection
+        deadline = time.monotonic() + SUMMARY_STREAM_TIMEOUT
+        while not job.wait(15):
+            if time.monotonic() > deadline:
+                break
+            yield ": waiting\n\n"
+        yield sse_event("summary", job.to_dict())
+        yield sse_event("done", "")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+# -------------------------------
+# RUNTIME STATS
+# -------------------------------
+
+@app.route("/stats")
+def stats():
+    return jsonify({
+        "intent_paths": get_intent_path_stats(),
+        "coin_index": {"coins": len(coin_index), "loaded_at": coin_index.loaded_at},
+        "upstream_pools": get_pool_stats(),
+        "rate_limits": get_rate_limit_stats(),
+        "breakers": get_breaker_stats(),
+        "response_cache": response_cache.stats(),
+        "market_snapshot": market_snapshot.stats(),
+        "session_memory": session_memory.stats(),
+        "price_store": price_store.stats(),
+        "alerts": alert_engine.stats(),
+        "portfolio_batches": price_batcher.stats(),
+        "news_store": news_store.stats(),
+        "summarizer": summarizer.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "shared_cache": shared_cache.stats(),
+        "prefetch": prefetcher.stats(),
+        "startup": startup_report(),
+    })
+
+
+# -------------------------------
+# PROMETHEUS METRICS
+# -------------------------------
+
+@registry.add_collector
+def cache_metrics():
+    caches = {
+        "response": response_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "summary": summarizer.stats()["cache"],
+    }
+    if shared_cache.enabled:
+        caches["shared"] = shared_cache.stats()
+    yield ("cryptora_cache_hits_total", "counter", "Cache lookups answered from the cache.",
+           [({"cache": name}, stats["hits"]) for name, stats in caches.items()])
+    yield ("cryptora_cache_misses_total", "counter", "Cache lookups that missed.",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    yield ("cryptora_cache_hit_ratio", "gauge", "Hits over lookups since startup.",
+           [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()])
+    yield ("cryptora_cache_entries", "gauge", "Entries currently cached.",
+           [({"cache": name}, stats["entries"]) for name, stats in caches.items()])
+    if shared_cache.enabled:
+        yield ("cryptora_shared_cache_errors_total", "counter", "Shared cache reads and writes that failed.",
+               [({}, caches["shared"]["errors"])])
+    yield ("cryptora_semantic_cache_saved_seconds_total", "counter", "Model time saved by semantic cache hits.",
+           [({}, caches["semantic"]["saved_seconds"])])
+
+@registry.add_collector
+def upstream_metrics():
+    pools = get_pool_stats()
+    yield ("cryptora_upstream_in_flight", "gauge", "Upstream requests currently open.",
+           [({"upstream": name}, stats["in_flight"]) for name, stats in pools.items()])
+    yield ("cryptora_upstream_retries_total", "counter", "Upstream attempts that were retried.",
+           [({"upstream": name}, stats["retries"]) for name, stats in pools.items()])
+    limits = get_rate_limit_stats()
+    yield ("cryptora_rate_limit_queue_depth", "gauge", "Requests waiting for an upstream budget slot.",
+           [({"upstream": name}, stats["queue_depth"]) for name, stats in limits.items()])
+    yield ("cryptora_rate_limit_utilisation", "gauge", "Share of the per-minute upstream budget used in the last minute.",
+           [({"upstream": name}, stats["utilisation"]) for name, stats in limits.items()])
+    yield ("cryptora_rate_limit_tokens", "gauge", "Upstream budget tokens available now.",
+           [({"upstream": name}, stats["tokens"]) for name, stats in limits.items()])
+    yield ("cryptora_rate_limit_throttled_total", "counter", "429 responses that held an upstream's queue.",
+           [({"upstream": name}, stats["throttled"]) for name, stats in limits.items()])
+    yield ("cryptora_rate_limit_timeouts_total", "counter", "Requests that gave up waiting for a budget slot.",
+           [({"upstream": name}, stats["timeouts"] + stats["rejected"]) for name, stats in limits.items()])
+
+@registry.add_collector
+def breaker_metrics():
+    breakers = get_breaker_stats()
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    yield ("cryptora_breaker_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+           [({"backend": name}, states[stats["state"]]) for name, stats in breakers.items()])
+    for key, help_text in (
+        ("calls", "Calls that reached the backend."),
+        ("failures", "Backend calls that failed or timed out."),
+        ("timeouts", "Backend calls cut off at the breaker's deadline."),
+        ("short_circuited", "Calls rejected while the breaker was open."),
+        ("hedges", "Hedged duplicate requests sent."),
+        ("hedge_wins", "Hedged requests that answered first."),
+        ("fallbacks", "Requests answered by the fallback instead of the backend."),
+    ):
+        yield (f"cryptora_breaker_{key}_total", "counter", help_text,
+               [({"backend": name}, stats[key]) for name, stats in breakers.items()])
+
+@registry.add_collector
+def pipeline_metrics():
+    paths = get_intent_path_stats()
+    yield ("cryptora_intent_classifications_total", "counter",
+           "Intent detections by path (local classifier, LLM, or local fallback while the LLM is down).",
+           [({"path": path}, paths[path]) for path in ("local", "llm", "fallback")])
+    prefetch = prefetcher.stats()
+    yield ("cryptora_prefetches_total", "counter", "Speculative CoinGecko fetches by outcome once the intent was known.",
+           [({"outcome": outcome}, prefetch[outcome]) for outcome in ("used", "wasted", "failed")])
+    yield ("cryptora_prefetch_saved_seconds_total", "counter", "Request latency saved by prefetches that were used.",
+           [({}, prefetch["saved_seconds"])])
+    yield ("cryptora_summary_jobs_running", "gauge", "Article summaries in progress.",
+           [({}, summarizer.stats()["jobs_running"])])
+    yield ("cryptora_market_snapshot_age_seconds", "gauge", "Age of the in-memory market snapshot.",
+           [({}, market_snapshot.stats()["age_seconds"])])
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 
-    return jsonify({"response": formatted_reply})
+if SERVER_PROCESS:
+    mark_ready()
+    print(format_startup_report())
 
 
 # -------------------------------
@@ -1,11 +1,34 @@
-import google.generativeai as genai
-import requests
-from datetime import datetime, timedelta
-from langchain_community.chat_message_histories import ChatMessageHistory
-from newspaper import Article
+from datetime import datetime, timedelta, timezone
 import re
+import sqlite3
+import json
+import time
 from dotenv import load_dotenv
 import os
+from concurrent.futures import ThreadPoolExecutor
+from coin_index import coin_index
+from http_client import coingecko, cryptopanic, hf_space
+from response_cache import cached_get, CACHE_FOREVER
+from market_snapshot import market_snapshot
+from stream_filters import StreamCleaner
+from session_memory import session_memory
+from price_store import price_store
+from market_analytics import analyze_market_chart, analyze_ohlc, series, compare
+from alert_engine import alert_engine, parse_alert
+from portfolio import parse_holdings, value_portfolio
+from news_store import news_store, INGEST_FILTERS
+from summarizer import summarizer, extract_url
+from semantic_cache import semantic_cache
+from intent_classifier import (
+    classify_intent_locally, classify_news_locally, fallback_intent, guess_intents, record_intent_path,
+    LOCAL_INTENT_CONFIDENCE,
+)
+from startup import lazy_import, on_warm_up
+from metrics import traced, set_intent, carry_context
+from rate_limiter import RateLimited
+from circuit_breaker import CircuitBreaker
+from prefetch import Prefetcher
+from shared_cache import shared_cache
 
 load_dotenv()
 
@@ -13,59 +36,213 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 CRYPTO_PANIC_API_KEY = os.getenv("CRYPTO_PANIC_API_KEY")
 
-# Configure APIs
-genai.configure(api_key=GEMINI_API_KEY)
+# Hard deadlines for the model backends, in seconds
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "15"))
+LLM_ANSWER_TIMEOUT = float(os.getenv("LLM_ANSWER_TIMEOUT", "60"))
+# What takes over while a backend's breaker is open: "local" / "gemini", or "none" to fail
+INTENT_FALLBACK = os.getenv("INTENT_FALLBACK", "local")
+GENERAL_FALLBACK = os.getenv("GENERAL_FALLBACK", "gemini")
+# Seconds Gemini's reading of a message is reused by every worker (within the same day)
+INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", str(6 * 3600)))
+
+gemini_breaker = CircuitBreaker("gemini", GEMINI_TIMEOUT,
+                                slow_seconds=float(os.getenv("GEMINI_SLOW_SECONDS", "8")))
+# Likely CoinGecko lookups start while the LLM classifies a message
+prefetcher = Prefetcher(coingecko)
+
+# Streamed answers count their time to first token against the slow threshold
+hf_breaker = CircuitBreaker("hf_space", LLM_ANSWER_TIMEOUT,
+                            slow_seconds=float(os.getenv("LLM_ANSWER_SLOW_SECONDS", "30")))
+
+def coingecko_get(path, params=None, endpoint="default", ttl=None):
+    # Every CoinGecko call goes through the shared response cache and pooled client
+    return cached_get(coingecko, path, params, endpoint=endpoint, ttl=ttl)
+
+def upstream_error(response, what):
+    # ✅ A short explanation for the user instead of the upstream's raw error body
+    status = response.status_code
+    if status == 429:
+        return f"⚠️ Our data provider is rate-limiting us right now. Please ask for {what} again in a minute."
+    if status == 404:
+        return f"⚠️ Couldn't find {what}. Please check the name and try again."
+    if status >= 500:
+        return f"⚠️ Our data provider is having trouble, so {what} isn't available right now. Please try again shortly."
+    return f"⚠️ Couldn't fetch {what} right now (error {status})."
+
+
+# Function to extract intent and cryptocurrency from user input
+@traced("detect_intent")
+def detect_intent_and_crypto(user_input):
+    # ✅ "summarize https://…" needs no classification at all
+    if extract_url(user_input) and SUMMARIZE_WORDS.search(user_input.lower()):
+        record_intent_path("local")
+        return {
+            "intent": "news",
+            "asset": "unknown",
+            "assets": [],
+            "date": "unknown",
+            "number": "unknown",
+            "news_intent": "summarize_article",
+            "keyword": "none",
+            "weekday": "none",
+        }
+
+    # ✅ Fast path: common queries are resolved locally without an LLM round trip
+    intent, assets, date, number, confidence = classify_intent_locally(user_input)
+    if confidence >= LOCAL_INTENT_CONFIDENCE:
+        record_intent_path("local")
+        return {
+            "intent": intent,
+            "asset": assets[0] if assets else "unknown",
+            "assets": assets,
+            "date": date,
+            "number": number,
+            "news_intent": "none",
+            "keyword": "none",
+            "weekday": "none",
+        }
+
+    # ✅ The fetches the message most likely needs run while the LLM works out its intent
+    intents, assets, number = guess_intents(user_input)
+    speculation = prefetcher.start([call for intent in intents for call in coingecko_requests(intent, assets, number)])
+    fields = None
+    try:
+        fields = detect_intent_remotely(user_input)
+    finally:
+        prefetcher.settle(speculation, coingecko_requests(fields["intent"], fields["assets"], fields["number"])
+                          if fields else [])
+    return fields
+
+def detect_intent_remotely(user_input):
+    # Gemini's reading of the message, or the local fallback while Gemini is unavailable
+    # ✅ Keyed by day too: Gemini resolves relative dates against today
+    key = f"intent:{utc_today():%Y-%m-%d}:{' '.join(user_input.lower().split())}"
+    try:
+        fields = shared_cache.get_json(key)
+        if fields is None:
+            fields = detect_intent_with_gemini(user_input)
+            if fields is not None:
+                shared_cache.set_json(key, fields, INTENT_CACHE_TTL)
+            else:
+                # ✅ Not cached: one malformed reply mustn't pin the default on every worker
+                fields = default_intent_fields()
+        record_intent_path("llm")
+    except Exception as e:
+        if INTENT_FALLBACK != "local":
+            raise
+        # ✅ Gemini is down or its breaker is open: go with the local classifier's best guess
+        print("Intent detection fell back to the local classifier:", e)
+        gemini_breaker.record_fallback()
+        record_intent_path("fallback")
+        intent, assets, date, number = fallback_intent(user_input)
+        fields = {
+            "intent": intent,
+            "asset": assets[0] if assets else "unknown",
+            "assets": assets,
+            "date": date,
+            "number": number,
+            "news_intent": "none",
+            "keyword": "none",
+            "weekday": "none",
+        }
 
-BASE_URL = "https://cryptopanic.com/api/developer/v2/posts/"
+    # ✅ Normalise "btc" / "Bitcoin" / "xbt" to the CoinGecko id (NFT and exchange names are left alone)
+    if fields["intent"] not in ("nft", "exchange", "list_exchanges", "general"):
+        fields["assets"] = [coin_index.resolve(asset) or asset for asset in fields["assets"]]
+        fields["asset"] = fields["assets"][0] if fields["assets"] else "unknown"
+    return fields
 
-headers = {
-    "User-Agent": "Mozilla/5.0",
-    "Accept": "application/json"
+INTENTS = {
+    "price", "market_cap", "supply", "volume", "history", "market_chart", "ohlc",
+    "list_coins", "categories", "nft", "exchange", "list_exchanges", "news",
+    "compare", "alert", "portfolio", "previous", "general",
 }
 
-class MemoryAdapter:
-    def __init__(self):
-        self._hist = ChatMessageHistory()
+NEWS_INTENTS = {
+    "general_news", "news_by_sentiment", "event_related_news", "summarize_article",
+    "breaking_news", "news_by_date", "news_by_asset", "previous", "unknown",
+}
 
-    def save_context(self, inputs, outputs):
-        user_text = inputs.get("input", "") if isinstance(inputs, dict) else inputs
-        if isinstance(outputs, dict):
-            ai_text = outputs.get("output", "")
-        else:
-            ai_text = outputs or ""
+# "Intent: price" / "**Asset:** bitcoin" / "- NewsIntent: none"
+FIELD_LINE = re.compile(r"^[\s*\-`]*(intent|asset|crypto|date|number|newsintent|keyword|weekday)[\s*`]*:[\s*`]*(.*?)[\s*`]*$", re.IGNORECASE)
+DATE_VALUE = re.compile(r"^(\d{2}-\d{2}-\d{4}( to \d{2}-\d{2}-\d{4})?|\d+ (day|month|year)s? ago)$")
 
-        if user_text:
-            try:
-                self._hist.add_user_message(user_text)
-            except:
-                self._hist.add_message({"type": "human", "content": user_text})
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
 
-        if ai_text:
-            try:
-                self._hist.add_ai_message(ai_text)
-            except:
-                self._hist.add_message({"type": "ai", "content": ai_text})
-
-    @property
-    def chat_memory(self):
-        class ChatMemoryWrapper:
-            def __init__(self, hist):
-                self.hist = hist
-
-            @property
-            def messages(self):
-                try:
-                    return self.hist.messages
-                except:
-                    return []
-        return ChatMemoryWrapper(self._hist)
-
-memory = MemoryAdapter()
+_gemini_model = None
 
-# Function to extract intent and cryptocurrency from user input using Gemini
-def detect_intent_and_crypto(user_input):
-    model = genai.GenerativeModel("gemini-2.5-flash")
+@on_warm_up
+def get_gemini_model():
+    # One shared model handle instead of a new GenerativeModel per call.
+    # The SDK is the slowest import in the app, so it is loaded and configured here on first use.
+    global _gemini_model
+    if _gemini_model is None:
+        genai = lazy_import("google.generativeai")
+        genai.configure(api_key=GEMINI_API_KEY)
+        _gemini_model = genai.GenerativeModel("gemini-2.5-flash")
+    return _gemini_model
+
+def gemini_generate(prompt):
+    # ✅ Every Gemini call goes through its circuit breaker, with a hard deadline and hedging
+    def generate():
+        return get_gemini_model().generate_content(prompt, request_options={"timeout": GEMINI_TIMEOUT}).text
+    return gemini_breaker.call(generate)
 
+def parse_intent_response(text):
+    """
+    Strictly parses the structured extraction reply.
+    Raises ValueError if the intent is missing or not one we route on.
+    """
+    fields = {}
+    for line in text.splitlines():
+        match = FIELD_LINE.match(line)
+        if match:
+            key = match.group(1).lower()
+            key = "asset" if key == "crypto" else key
+            fields.setdefault(key, match.group(2).strip().strip('"').lower())
+
+    intent = fields.get("intent", "")
+    if intent not in INTENTS:
+        raise ValueError(f"Unrecognised intent in Gemini reply: {intent!r}")
+
+    # "Asset: bitcoin, ethereum, solana" → every asset, first one as the primary
+    assets = []
+    for name in (fields.get("asset") or "").split(","):
+        name = name.strip()
+        if name and name != "unknown" and name not in assets:
+            assets.append(name)
+    date = fields.get("date", "unknown")
+    if not DATE_VALUE.match(date):
+        date = "unknown"
+    number = fields.get("number", "unknown")
+    if not number.isdigit():
+        number = "unknown"
+
+    weekday = fields.get("weekday", "none")
+    if weekday not in WEEKDAYS:
+        weekday = "none"
+
+    news_intent = fields.get("newsintent", "none")
+    keyword = fields.get("keyword") or "none"
+    if intent == "news":
+        if news_intent not in NEWS_INTENTS:
+            news_intent = "general_news"
+    else:
+        news_intent, keyword = "none", "none"
+
+    return {
+        "intent": intent,
+        "asset": assets[0] if assets else "unknown",
+        "assets": assets,
+        "date": date,
+        "number": number,
+        "news_intent": news_intent,
+        "keyword": keyword,
+        "weekday": weekday,
+    }
+
+# Function to extract intent and cryptocurrency from user input using Gemini
+def detect_intent_with_gemini(user_input):
     prompt = f"""
     You are an AI that extracts structured data from cryptocurrency, NFT, and exchange-related queries.
     Your job is to identify:
@@ -73,6 +250,7 @@ def detect_intent_and_crypto(user_input):
     - The **cryptocurrency / NFT / Exchange name** in the correct CoinGecko API format.
     - The **date** (if the query involves historical data, including relative terms like "6 months ago").
     - The **number of results/days** (if applicable, e.g., "top 10 gainers" or "market chart for 7 days").
+    - For news queries, the **news sub-intent** and the **event keyword**.
 
     **Possible intents:**  
     - "price" (if asking about price)  
@@ -88,65 +266,89 @@ def detect_intent_and_crypto(user_input):
     - "exchange" (specific exchange details)
     - "list_exchanges" (list of exchanges)
     - "news" (if asking for crypto, NFT, or exchange-related news)
+    - "compare" (if comparing how two or more cryptocurrencies moved, or whether they move together)
+    - "portfolio" (if asking what a set of holdings is worth, e.g. "1.5 BTC and 10 ETH")
+    - "alert" (if asking to be notified when a cryptocurrency's price goes above or below a level; put the price level in Number)
     - "previous" (if the query references a previous response (e.g., "What about ETH?"))
     - "general" (if asking a general crypto questions, exchanges, security, best platforms, or recommendations)  
 
+    **Possible news sub-intents (only when intent is "news"):**  
+    - "general_news", "news_by_sentiment", "event_related_news", "summarize_article",
+      "breaking_news", "news_by_date", "news_by_asset", "previous", "unknown"
+
     **Rules:**  
     - Convert any cryptocurrency symbol (e.g., BTC, ETH, SOL) into its full CoinGecko-compatible name.  
+    - If several assets are mentioned, list all of them in Asset, comma-separated.  
     - Identify NFT names if the user asks about NFTs.
     - Identify exchange names if the user asks about crypto exchanges.
     - Ensure the cryptocurrency name is **lowercase** and correctly formatted for API use.
     - If the user provides a relative time frame (e.g., "6 months ago"), calculate the exact **DD-MM-YYYY** date.
+    - If the user asks about a date range, return it as "DD-MM-YYYY to DD-MM-YYYY" with intent "history".
+    - If the range is limited to one day of the week (e.g., "every Monday"), add a line "Weekday: [monday..sunday]".
     - If no valid crypto is found, return "unknown".  
     - If the user does not specify a date, return "unknown".  
     - If a **number** is mentioned (like "top 10 coins" or "chart for 7 days"), extract it.  
+    - If the news sub-intent is "event_related_news", set Keyword to the event (one or two words, e.g. crash, hack, ETF, lawsuit, rug pull, scam, ban). Otherwise return "none".
+    - If the intent is not "news", return "none" for NewsIntent and Keyword.
 
-    **Response format:**  
+    **Response format (exactly these lines, nothing else):**  
     Intent: [intent]  
-    Asset: [crypto/NFT/exchange name]  
+    Asset: [crypto/NFT/exchange name, or comma-separated names]  
     Date: [exact DD-MM-YYYY date or 'unknown']  
     Number: [number of results/days]  
+    NewsIntent: [news sub-intent or 'none']  
+    Keyword: [event keyword or 'none']  
 
     **Example Queries & Responses:**  
     ---
     **Query:** "What was the price of BTC 6 months ago?"  
     **Response:**  
     Intent: history  
-    Crypto: bitcoin  
-    Date: { (datetime.today() - timedelta(days=30*6)).strftime('%d-%m-%Y') }  
+    Asset: bitcoin  
+    Date: { (utc_today() - timedelta(days=30*6)).strftime('%d-%m-%Y') }  
     Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
     **Query:** "What was the price of BTC 10 days ago?"  
     **Response:**  
     Intent: history  
-    Crypto: bitcoin  
-    Date: { (datetime.today() - timedelta(days=10)).strftime('%d-%m-%Y') }  
+    Asset: bitcoin  
+    Date: { (utc_today() - timedelta(days=10)).strftime('%d-%m-%Y') }  
     Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
     ---
 
     **Query:** "List the top 10 cryptocurrencies."  
     **Response:**  
     Intent: list_coins  
-    Crypto: unknown  
+    Asset: unknown  
     Date: unknown  
     Number: 10  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
     **Query:** "Show me BTC market chart for 7 days."  
     **Response:**  
     Intent: market_chart  
-    Crypto: bitcoin  
+    Asset: bitcoin  
     Date: unknown  
     Number: 7  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
     **Query:** "What was the price of SOL on 15-08-2024?"  
     **Response:**  
     Intent: history  
-    Crypto: solana  
+    Asset: solana  
     Date: 15-08-2024  
     Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
     **Query:** "Tell me about OpenSea NFT collection."  
@@ -155,6 +357,8 @@ def detect_intent_and_crypto(user_input):
     Asset: opensea  
     Date: unknown  
     Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
     **Query:** "How secure is Kraken exchange?"  
@@ -162,7 +366,9 @@ def detect_intent_and_crypto(user_input):
     Intent: general  
     Asset: kraken  
     Date: unknown  
-    Number: unknown
+    Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
     **Query:** "List top 5 crypto exchanges."  
@@ -171,29 +377,89 @@ def detect_intent_and_crypto(user_input):
     Asset: unknown  
     Date: unknown  
     Number: 5  
+    NewsIntent: none  
+    Keyword: none  
 
     ---
-    Now, extract the intent, asset, date (converted if relative), and number of results from this query:
+    **Query:** "Price of BTC, ETH and SOL"  
+    **Response:**  
+    Intent: price  
+    Asset: bitcoin, ethereum, solana  
+    Date: unknown  
+    Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
 
-    **User Query:** "{user_input}"
-    """
+    ---
+    **Query:** "Compare ETH and BNB over 90 days"  
+    **Response:**  
+    Intent: compare  
+    Asset: ethereum, binancecoin  
+    Date: unknown  
+    Number: 90  
+    NewsIntent: none  
+    Keyword: none  
 
-    response = model.generate_content(prompt).text
+    ---
+    **Query:** "Tell me when BTC drops below 50k"  
+    **Response:**  
+    Intent: alert  
+    Asset: bitcoin  
+    Date: unknown  
+    Number: 50000  
+    NewsIntent: none  
+    Keyword: none  
 
-    intent, asset, date, number = "unknown", "unknown", "unknown", "unknown"
+    ---
+    **Query:** "Price of ETH every Monday in March 2025"  
+    **Response:**  
+    Intent: history  
+    Asset: ethereum  
+    Date: 01-03-2025 to 31-03-2025  
+    Number: unknown  
+    NewsIntent: none  
+    Keyword: none  
+    Weekday: monday  
 
-    for line in response.split("\n"):
-        if "Intent:" in line:
-            intent = line.split(":")[1].strip().lower()
-        if "Asset:" in line:
-            asset = line.split(":")[1].strip().lower()
-        if "Date:" in line:
-            date = line.split(":")[1].strip().lower()
-        if "Number:" in line:
-            number = line.split(":")[1].strip().lower()
+    ---
+    **Query:** "Any news about the latest Ethereum hack?"  
+    **Response:**  
+    Intent: news  
+    Asset: ethereum  
+    Date: unknown  
+    Number: unknown  
+    NewsIntent: event_related_news  
+    Keyword: hack  
 
-    return intent, asset, date, number
+    ---
+    Now, extract the intent, asset, date (converted if relative), number of results, news sub-intent and keyword from this query:
 
+    **User Query:** "{user_input}"
+    """
+
+    # ✅ One bounded retry on a malformed reply; None tells the caller to use a safe default
+    for attempt in range(2):
+        try:
+            return parse_intent_response(gemini_generate(prompt))
+        except ValueError as e:
+            print("Intent parse error:", e)
+            prompt += "\n    Reply with ONLY the lines of the response format."
+    return None
+
+def default_intent_fields():
+    # Safe default when Gemini's reply couldn't be parsed: answer it as a general question
+    return {
+        "intent": "general",
+        "asset": "unknown",
+        "assets": [],
+        "date": "unknown",
+        "number": "unknown",
+        "news_intent": "none",
+        "keyword": "none",
+        "weekday": "none",
+    }
+
+@traced("classify_news_intent")
 def classify_news_intent(user_input):
     """
     Classifies the user's intent within the news category and extracts event keywords if applicable.
@@ -221,9 +487,19 @@ Respond in this format ONLY: "<intent>,<keyword>"
 
 User Query: "{user_input}"
 """
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(prompt)
-    return response.text.strip().lower()
+    try:
+        response = gemini_generate(prompt)
+    except Exception as e:
+        if INTENT_FALLBACK != "local":
+            raise
+        print("News intent fell back to keywords:", e)
+        gemini_breaker.record_fallback()
+        return classify_news_locally(user_input)
+    return response.strip().strip('"').lower()
+
+def utc_today():
+    # Daily prices close at 00:00 UTC, so "today" and "N days ago" are UTC dates whatever the host's zone
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 def parse_flexible_date(date_str):
     # Convert relative dates like "6 months ago" to DD-MM-YYYY
@@ -233,11 +509,11 @@ def parse_flexible_date(date_str):
             num = int(num)
 
             if "day" in unit:
-                target_date = datetime.today() - timedelta(days=num)
+                target_date = utc_today() - timedelta(days=num)
             elif "month" in unit:
-                target_date = datetime.today() - timedelta(days=num * 30)
+                target_date = utc_today() - timedelta(days=num * 30)
             elif "year" in unit:
-                target_date = datetime.today() - timedelta(days=num * 365)
+                target_date = utc_today() - timedelta(days=num * 365)
             else:
                 return None, "Invalid time format. Please use days, months, or years."
 
@@ -252,55 +528,49 @@ def parse_flexible_date(date_str):
     except ValueError:
         return None, "Invalid date format. Please use DD-MM-YYYY."
 
-def summarize_article(url):
-    try:
-        article = Article(url)
-        article.download()
-        article.parse()
-        article.nlp()  # Enables natural language processing to generate a summary
+# How long a chat reply waits for a summary before handing back the job to poll;
+# cached summaries are instant, a fresh one takes seconds the request thread shouldn't spend
+SUMMARY_CHAT_WAIT = float(os.getenv("SUMMARY_CHAT_WAIT", "1"))
 
-        return {
-            "title": article.title,
-            "summary": article.summary
-        }
-    except Exception as e:
-        return f"An error occurred: {e}"
+SUMMARIZE_WORDS = re.compile(r"\bsummar(y|ise|ize|ising|izing)\b|\btl;?dr\b")
 
-def coingecko_to_ticker(asset_name):
+def summarize_article(url):
     try:
-        url = f"https://api.coingecko.com/api/v3/coins/{asset_name}"
-        r = requests.get(url)
-
-        if r.status_code != 200:
-            return None   # Not "UNKNOWN" → None means fallback allowed
+        job = summarizer.submit(url)
+    except ValueError as e:
+        return f"⚠️ {e}"
 
-        data = r.json()
-        ticker = data.get("symbol", "").upper()
+    if not job.wait(SUMMARY_CHAT_WAIT):
+        return (f"⏳ Summarizing that article (job {job.id}). Ask me again in a moment, "
+                f"or follow it at /summarize/{job.id}.")
+    if job.error:
+        return f"An error occurred: {job.error}"
+    return job.result
 
-        return ticker if ticker else None
-    except:
-        return None
+def coingecko_to_ticker(asset_name):
+    # Local index lookup; None means no currency filter is applied
+    coin_id = coin_index.resolve(asset_name)
+    return coin_index.symbol_for(coin_id) if coin_id else None
 
-def news_related_query(user_input, asset, date, number):
-    intent_keyword = classify_news_intent(user_input)
-    sub_intent, keyword = intent_keyword.split(",")
+def news_related_query(user_input, asset, date, number, sub_intent=None, keyword="none", session_id="default"):
+    # The sub-intent normally arrives with the main extraction; classify only if it didn't
+    if sub_intent in (None, "none"):
+        sub_intent, _, keyword = classify_news_intent(user_input).partition(",")
+        keyword = keyword.strip() or "none"
 
     if sub_intent == "previous":
-        if memory.chat_memory.messages:
-            last_output = memory.chat_memory.messages[-1].content
-            last_values = last_output.split(",")
-            sub_intent = last_values[0]
-            if asset == "unknown": asset = last_values[1]
-            if date == "unknown": date = last_values[2]
-            if number == "unknown": number = last_values[3]
-            if keyword == "none": keyword = last_values[4]
-        else:
+        last = session_memory.last(session_id, intent="news")
+        if last is None:
             return "⚠️ No previous data found in memory."
+        sub_intent = last["news_intent"]
+        if asset == "unknown": asset = last["asset"]
+        if date == "unknown": date = last["date"]
+        if number == "unknown": number = last["number"]
+        if keyword == "none": keyword = last["keyword"]
 
-    # Save to memory
-    memory.save_context({"input": user_input}, {
-        "output": f"{sub_intent},{asset},{date},{number},{keyword}"
-    })
+    # Save to this session's memory
+    session_memory.save(session_id, intent="news", asset=asset, date=date, number=number,
+                        news_intent=sub_intent, keyword=keyword)
 
     if asset != "unknown":
         asset = coingecko_to_ticker(asset)
@@ -312,11 +582,17 @@ def news_related_query(user_input, asset, date, number):
 
     filter_by_date = False
     sentiment = "neutral"
+    currency = asset if asset not in ("unknown", None) else None
+
+    # Same question as a local news store query; None when it can't be answered locally
+    local_query = None
+    date_obj = None
 
     if sub_intent == "general_news":
         if asset != "unknown":
             params["currencies"] = asset
         params["kind"] = "news"
+        local_query = {"currency": currency, "kind": "news"}
 
     elif sub_intent == "news_by_sentiment":
         if "bullish" in user_input.lower():
@@ -330,6 +606,8 @@ def news_related_query(user_input, asset, date, number):
         params["filter"] = sentiment
         if asset != "unknown":
             params["currencies"] = asset
+        if sentiment in INGEST_FILTERS:
+            local_query = {"currency": currency, "filter_name": sentiment}
 
     elif sub_intent == "event_related_news":
         if keyword == "none":
@@ -337,6 +615,7 @@ def news_related_query(user_input, asset, date, number):
         params["q"] = keyword
         if asset != "unknown":
             params["currencies"] = asset
+        local_query = {"currency": currency, "keyword": keyword}
 
     elif sub_intent == "news_by_asset":
         if asset == "unknown":
@@ -347,6 +626,8 @@ def news_related_query(user_input, asset, date, number):
 
         # If API returns nothing, fallback to keyword search
         params["q"] = asset
+        if currency:
+            local_query = {"currency": currency}
 
     elif sub_intent == "news_by_date":
         if date == "unknown":
@@ -360,10 +641,13 @@ def news_related_query(user_input, asset, date, number):
             params["currencies"] = asset
 
         filter_by_date = True
+        local_query = {"currency": currency, "day": date_obj}
 
     elif sub_intent == "summarize_article":
-        url = input("Please provide the article URL you'd like summarized: ")
-        
+        url = extract_url(user_input)
+        if not url:
+            return "🔗 Please include the article URL you'd like summarized."
+
         summary = summarize_article(url)
         
         # Checking if the result is a summary or an error
@@ -374,17 +658,31 @@ def news_related_query(user_input, asset, date, number):
 
     elif sub_intent == "breaking_news":
         params["filter"] = "hot"
+        local_query = {"filter_name": "hot"}
 
     else:
         return "❓ I couldn't understand the specific type of news you're looking for."
 
+    limit = int(number) if number != "unknown" else 5
+
+    # ✅ Indexed local query while the ingester is current; the live API is the fallback
+    if local_query is not None and news_store.covers(date_obj):
+        try:
+            articles = news_store.search(limit=limit, **local_query)
+        except sqlite3.Error as e:
+            print("News store error:", e)
+            articles = []
+        if articles:
+            return format_news_response(articles)
+        # Nothing indexed (a feed the ingester doesn't page, a post it hasn't reached yet): ask the API
+
     if number != "unknown":
         params["page_size"] = int(number)
 
-    response = requests.get(BASE_URL, params=params)
+    response = cached_get(cryptopanic, "/posts/", params, endpoint="posts")
     
     if response.status_code != 200:
-        return f"🚨 API error: {response.status_code}"
+        return upstream_error(response, "the latest news")
 
     articles = response.json().get("results", [])
 
@@ -433,16 +731,25 @@ def format_news_response(articles):
     return result.strip()
 
 def get_supported_coins(limit=20):
-    url = "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=50&page=1"
-    response = requests.get(url, headers=headers)
+    # ✅ Served from the in-memory market snapshot when it is fresh
+    ranked = market_snapshot.top(50)
+    if ranked:
+        data = [{"name": row.name, "market_cap": row.market_cap} for row in ranked]
+    else:
+        response = coingecko_get("/coins/markets", {
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": 50,
+            "page": 1,
+        }, endpoint="coins_markets")
 
-    if response.status_code != 200:
-        return response.text
+        if response.status_code != 200:
+            return upstream_error(response, "the top coins list")
 
-    data = response.json()
+        data = response.json()
 
     # ✅ Extract well-known cryptos (market cap > $1B)
-    well_known_coins = [coin['name'] for coin in data if coin.get('market_cap', 0) > 1_000_000_000]
+    well_known_coins = [coin['name'] for coin in data if (coin.get('market_cap') or 0) > 1_000_000_000]
 
     # ✅ Limit based on user request
     well_known_coins = well_known_coins[:limit]
@@ -460,11 +767,11 @@ def get_historical_data(crypto, date_str):
             num = int(num)
 
             if "day" in unit:
-                target_date = datetime.today() - timedelta(days=num)
+                target_date = utc_today() - timedelta(days=num)
             elif "month" in unit:
-                target_date = datetime.today() - timedelta(days=num * 30)
+                target_date = utc_today() - timedelta(days=num * 30)
             elif "year" in unit:
-                target_date = datetime.today() - timedelta(days=num * 365)
+                target_date = utc_today() - timedelta(days=num * 365)
             else:
                 return "Invalid time format. Please use days, months, or years."
 
@@ -479,19 +786,30 @@ def get_historical_data(crypto, date_str):
     except ValueError:
         return "Invalid date format. Please use DD-MM-YYYY."
 
-    # ✅ Ensure the date is within the past 365 days (CoinGecko Limitation)
-    today = datetime.today()
+    # ✅ Past the store, CoinGecko's public API only serves the last 365 days
+    today = utc_today()
     one_year_ago = today - timedelta(days=365)
 
     if requested_date > today:
-        return "❌ Future prices are not available. Please enter a past date within the last year."
+        return "❌ Future prices are not available. Please enter today's date or an earlier one."
+
+    # ✅ Local daily price store first: an indexed read, with no 365-day limit for stored coins
+    price = price_store.lookup(crypto, requested_date.date())
+    if price is not None:
+        return f"On {date_str}, {crypto.capitalize()} was priced at **${price}**."
 
     if requested_date < one_year_ago:
-        return "❌ CoinGecko API provides historical data only for the last 365 days. Please enter a more recent date."
+        if price_store.backfilling(crypto):
+            return f"⏳ Still loading the full price history for {crypto.capitalize()}, ask me again in a moment."
+        return (f"❌ No stored price for {crypto.capitalize()} on {date_str}, and CoinGecko's public API "
+                "only serves the last 365 days. Please enter a more recent date.")
 
     # ✅ Fetch historical price from CoinGecko
-    url = f"https://api.coingecko.com/api/v3/coins/{crypto}/history?date={requested_date.strftime('%d-%m-%Y')}&localization=false"
-    response = requests.get(url, headers=headers)
+    # A closed day's price never changes, so past dates are cached for good
+    response = coingecko_get(f"/coins/{crypto}/history", {
+        "date": requested_date.strftime('%d-%m-%Y'),
+        "localization": "false",
+    }, endpoint="history", ttl=CACHE_FOREVER if requested_date.date() < today.date() else None)
 
     if response.status_code != 200:
         return f"Couldn't fetch historical data for {crypto} on {date_str}."
@@ -505,58 +823,164 @@ def get_historical_data(crypto, date_str):
 
     return f"On {date_str}, {crypto.capitalize()} was priced at **${price}**."
 
+# Longest list of days shown for a date-range question
+MAX_RANGE_ROWS = 62
+
+def get_historical_range(crypto, date_str, weekday="none"):
+    start_str, _, end_str = date_str.partition(" to ")
+    start, error = parse_flexible_date(start_str.strip())
+    if not error:
+        end, error = parse_flexible_date(end_str.strip())
+    if error:
+        return f"⚠️ {error}"
+
+    start, end = min(start, end), min(max(start, end), utc_today().date())
+    rows = price_store.lookup_range(crypto, start, end, WEEKDAYS.index(weekday) if weekday in WEEKDAYS else None)
+
+    if not rows and price_store.backfilling(crypto):
+        return f"⏳ Still loading the full price history for {crypto.capitalize()}, ask me again in a moment."
+    if not rows:
+        return f"No stored price history for {crypto.capitalize()} between {start.strftime('%d-%m-%Y')} and {end.strftime('%d-%m-%Y')}."
+
+    prices = [price for _, price in rows]
+    lines = [f"📅 {day.strftime('%d-%m-%Y (%a)')}: **${price:,.2f}**" for day, price in rows[:MAX_RANGE_ROWS]]
+    if len(rows) > MAX_RANGE_ROWS:
+        lines.append(f"… and {len(rows) - MAX_RANGE_ROWS} more days")
+
+    return (f"{crypto.capitalize()} prices from {start.strftime('%d-%m-%Y')} to {end.strftime('%d-%m-%Y')}:\n"
+            + "\n".join(lines)
+            + f"\n📉 Low: **${min(prices):,.2f}**  📈 High: **${max(prices):,.2f}**  ➗ Average: **${sum(prices) / len(prices):,.2f}**")
+
 
 def get_market_chart(crypto, days=30):
-    url = f"https://api.coingecko.com/api/v3/coins/{crypto}/market_chart?vs_currency=usd&days={days}"
-    response = requests.get(url, headers=headers)
+    response = coingecko_get(f"/coins/{crypto}/market_chart",
+                             {"vs_currency": "usd", "days": days}, endpoint="market_chart")
 
     if response.status_code != 200:
-        return response.text
+        return upstream_error(response, f"the {crypto} market chart")
 
-    data = response.json()
-    prices = data.get("prices", [])
+    stats = response.derive("market_chart", analyze_market_chart)
 
-    if len(prices) < 2:  # Not enough data to determine trend
+    if stats is None:  # Not enough data to determine trend
         return f"No market trend data available for {crypto}."
 
-    # Extract first & last price
-    first_price = prices[0][1]   # Price X days ago
-    latest_price = prices[-1][1]  # Most recent price
-
     # Determine trend
-    if latest_price > first_price:
+    if stats["last"] > stats["first"]:
         trend = "📈 Uptrend (bullish)"
-    elif latest_price < first_price:
+    elif stats["last"] < stats["first"]:
         trend = "📉 Downtrend (bearish)"
     else:
         trend = "➡️ No major trend (stable)"
 
-    return (f"Market trend for {crypto.capitalize()} over {days} days:\n"
-            f"💰 Price {days} days ago: **${first_price:.2f}**\n"
-            f"💰 Latest price: **${latest_price:.2f}**\n"
-            f"📊 Trend: {trend}")
+    lines = [
+        f"Market trend for {crypto.capitalize()} over {days} days:",
+        f"💰 Price {days} days ago: **${stats['first']:.2f}**",
+        f"💰 Latest price: **${stats['last']:.2f}** ({stats['change_pct']:+.2f}%)",
+        f"📊 Trend: {trend}",
+        f"↕️ Range: **${stats['low']:.2f}** – **${stats['high']:.2f}**",
+        f"🌪️ Volatility (annualised): **{stats['volatility_pct']:.1f}%**, max drawdown **{stats['max_drawdown_pct']:.1f}%**",
+        f"📐 SMA(20): **${stats['sma']:.2f}**, EMA(20): **${stats['ema']:.2f}**",
+    ]
+    if stats["rsi"] is not None:
+        lines.append(f"⚖️ RSI(14): **{stats['rsi']:.1f}**")
+    if stats["vwap"] is not None:
+        lines.append(f"🔊 Volume-weighted average price: **${stats['vwap']:.2f}**")
+    return "\n".join(lines)
+
+# Chart downloads for a comparison run side by side instead of one after another
+COMPARE_MAX_ASSETS = 6
+COMPARE_DEFAULT_DAYS = 30
+fetch_pool = ThreadPoolExecutor(max_workers=COMPARE_MAX_ASSETS, thread_name_prefix="cryptora-fetch")
+
+def get_chart_series(crypto, days):
+    response = coingecko_get(f"/coins/{crypto}/market_chart",
+                             {"vs_currency": "usd", "days": days}, endpoint="market_chart")
+    if response.status_code != 200:
+        return None
+    timestamps, prices = response.derive("series", series)
+    return (timestamps, prices) if len(prices) >= 2 else None
+
+def describe_correlation(value):
+    if value is None:
+        return "have no measurable correlation, since one price didn't move at all"
+    if value >= 0.7:
+        return "strongly move together"
+    if value >= 0.3:
+        return "loosely move together"
+    if value > -0.3:
+        return "move mostly independently"
+    return "tend to move in opposite directions"
+
+def get_comparison(cryptos, days=COMPARE_DEFAULT_DAYS):
+    cryptos = cryptos[:COMPARE_MAX_ASSETS]
+    charts = list(fetch_pool.map(carry_context(lambda crypto: get_chart_series(crypto, days)), cryptos))
+
+    missing = [crypto for crypto, chart in zip(cryptos, charts) if chart is None]
+    if missing:
+        return f"No market chart data available for {', '.join(c.capitalize() for c in missing)}."
+
+    stats = compare(charts)
+    if stats is None:
+        return "Not enough overlapping data to compare these coins."
+
+    names = [crypto.capitalize() for crypto in cryptos]
+    changes, correlation = stats["change_pct"], stats["correlation"]
+
+    # Single-line HTML tables, like format_crypto_table
+    performance = "".join(
+        f"<tr><td>{name}</td><td>{change:+.2f}%</td><td>{volatility:.1f}%</td></tr>"
+        for name, change, volatility in zip(names, changes, stats["volatility_pct"])
+    )
+    lines = [
+        f"Comparison over {days} days:",
+        "<table class='crypto-table'><tr><th>Coin</th><th>Change</th><th>Volatility</th></tr>"
+        f"{performance}</table>",
+    ]
+
+    best = max(range(len(names)), key=changes.__getitem__)
+    worst = min(range(len(names)), key=changes.__getitem__)
+    if best != worst:
+        lines.append(f"🏆 {names[best]} outperformed {names[worst]} by **{changes[best] - changes[worst]:.2f}** percentage points.")
+
+    if len(names) == 2:
+        value = correlation[0][1]
+        shown = "undefined" if value is None else f"{value:.2f}"
+        lines.append(f"🔗 Correlation of returns: **{shown}** — they {describe_correlation(value)}.")
+    else:
+        header = "".join(f"<th>{name}</th>" for name in names)
+        body = "".join(
+            f"<tr><th>{name}</th>" + "".join(f"<td>{'n/a' if value is None else f'{value:.2f}'}</td>" for value in row) + "</tr>"
+            for name, row in zip(names, correlation)
+        )
+        lines.append("🔗 Correlation of returns:")
+        lines.append(f"<table class='crypto-table'><tr><th></th>{header}</tr>{body}</table>")
+
+    return "\n".join(lines)
 
 def get_ohlc(crypto, days=7):
-    url = f"https://api.coingecko.com/api/v3/coins/{crypto}/ohlc?vs_currency=usd&days={days}"
-    response = requests.get(url, headers=headers)
+    response = coingecko_get(f"/coins/{crypto}/ohlc",
+                             {"vs_currency": "usd", "days": days}, endpoint="ohlc")
 
     if response.status_code != 200:
-        return response.text
+        return upstream_error(response, f"OHLC data for {crypto}")
 
-    data = response.json()
-    if not data:
+    stats = response.derive("ohlc", analyze_ohlc)
+    if stats is None:
         return f"No OHLC data available for {crypto}."
 
-    last_entry = data[-1]  # [timestamp, open, high, low, close]
+    last_open, last_high, last_low, last_close = stats["last"]
     return (f"{crypto.capitalize()} OHLC Data (Last Entry):\n"
-            f"Open: ${last_entry[1]}, High: ${last_entry[2]}, Low: ${last_entry[3]}, Close: ${last_entry[4]}")
+            f"Open: ${last_open}, High: ${last_high}, Low: ${last_low}, Close: ${last_close}\n"
+            f"Over {days} days ({stats['candles']} candles): open **${stats['open']}**, close **${stats['close']}** "
+            f"({stats['change_pct']:+.2f}%), high **${stats['high']}**, low **${stats['low']}**\n"
+            f"Average true range: **${stats['atr']:.2f}**, volatility **{stats['volatility_pct']:.1f}%**, "
+            f"max drawdown **{stats['max_drawdown_pct']:.1f}%**, {stats['up_candles']} up candles")
 
 def get_crypto_categories():
-    url = "https://api.coingecko.com/api/v3/coins/categories"
-    response = requests.get(url, headers=headers)
+    response = coingecko_get("/coins/categories", endpoint="categories")
 
     if response.status_code != 200:
-        return response.text
+        return upstream_error(response, "crypto categories")
 
     data = response.json()
     categories = ", ".join([category["name"] for category in data[:10]])  # Limit to 10 categories
@@ -565,11 +989,10 @@ def get_crypto_categories():
 
 # ✅ Fetch NFT Data
 def get_nft_data(nft_name):
-    url = f"https://api.coingecko.com/api/v3/nfts/{nft_name}"
-    response = requests.get(url, headers=headers)
+    response = coingecko_get(f"/nfts/{nft_name}", endpoint="nfts")
 
     if response.status_code != 200:
-        return response.text
+        return upstream_error(response, f"NFT data for {nft_name}")
 
     data = response.json()
     floor_price = data.get("floor_price", {}).get("usd", "N/A")
@@ -579,11 +1002,10 @@ def get_nft_data(nft_name):
 
 # ✅ Fetch List of Exchanges
 def get_exchanges(limit=10):
-    url = "https://api.coingecko.com/api/v3/exchanges"
-    response = requests.get(url, headers=headers)
+    response = coingecko_get("/exchanges", endpoint="exchanges")
 
     if response.status_code != 200:
-        return response.text
+        return upstream_error(response, "the exchange list")
 
     data = response.json()
     exchange_list = "\n".join([f"{i+1}. {exchange['name']}" for i, exchange in enumerate(data[:limit])])
@@ -592,11 +1014,10 @@ def get_exchanges(limit=10):
 
 # ✅ Fetch Specific Exchange Details
 def get_exchange_details(exchange):
-    url = f"https://api.coingecko.com/api/v3/exchanges/{exchange}"
-    response = requests.get(url, headers=headers)
+    response = coingecko_get(f"/exchanges/{exchange}", endpoint="exchange")
 
     if response.status_code != 200:
-        return response.text
+        return upstream_error(response, f"details for {exchange}")
 
     data = response.json()
     year_established = data.get("year_established", "N/A")
@@ -605,46 +1026,159 @@ def get_exchange_details(exchange):
 
     return f"Exchange: {exchange.capitalize()}\n🌍 Country: **{country}**\n📅 Established: **{year_established}**\n📊 24h BTC Trade Volume: **{trade_volume} BTC**"
 
+SNAPSHOT_FIELDS = {
+    "price": "price",
+    "market_cap": "market_cap",
+    "supply": "circulating_supply",
+    "volume": "total_volume",
+}
+
+def format_crypto_answer(crypto, intent, value):
+    if intent == "price":
+        return f"The current price of {crypto.capitalize()} is ${value}"
+
+    if intent == "market_cap":
+        return f"The market cap of {crypto.capitalize()} is ${value}"
+
+    if intent == "supply":
+        return f"The circulating supply of {crypto.capitalize()} is {value} coins"
+
+    if intent == "volume":
+        return f"The 24h trading volume of {crypto.capitalize()} is ${value}"
+
+    return "I couldn't process your request."
+
+def format_crypto_table(rows, intent):
+    # Single-line HTML so the newline → <br> conversion in flask_app leaves the table intact
+    header = {"price": "Price", "market_cap": "Market Cap", "supply": "Circulating Supply", "volume": "24h Volume"}[intent]
+    prefix = "" if intent == "supply" else "$"
+    body = "".join(
+        f"<tr><td>{name}</td><td>{'N/A' if value is None else f'{prefix}{value:,}'}</td></tr>"
+        for name, value in rows
+    )
+    return f"<table class='crypto-table'><tr><th>Coin</th><th>{header}</th></tr>{body}</table>"
+
+def get_multi_crypto_data(cryptos, intent):
+    if intent not in SNAPSHOT_FIELDS:
+        return "I couldn't process your request."
+
+    field = SNAPSHOT_FIELDS[intent]
+    rows = {crypto: market_snapshot.get(crypto) for crypto in cryptos}
+    missing = sorted(crypto for crypto, row in rows.items() if row is None)
+
+    # ✅ Everything the snapshot doesn't hold comes from ONE batched call
+    if missing:
+        r = coingecko_get("/coins/markets", {
+            "vs_currency": "usd",
+            "ids": ",".join(missing),
+        }, endpoint="coins_markets")
+
+        if r.status_code != 200:
+            return upstream_error(r, "those coins' data")
+
+        keys = {"price": "current_price", "market_cap": "market_cap",
+                "circulating_supply": "circulating_supply", "total_volume": "total_volume"}
+        coins = r.json()
+        for coin in coins:
+            rows[coin["id"]] = {"name": coin.get("name") or coin["id"], field: coin.get(keys[field])}
+        alert_engine.evaluate({coin["id"]: coin.get("current_price") for coin in coins})
+
+    table = []
+    for crypto in cryptos:
+        row = rows.get(crypto)
+        if row is None:
+            table.append((crypto.capitalize(), None))
+        elif isinstance(row, dict):
+            table.append((row["name"], row[field]))
+        else:
+            table.append((row.name, getattr(row, field)))
+
+    return format_crypto_table(table, intent)
+
+# /coins/{id} without the sections no answer uses
+COIN_DETAIL_PARAMS = {
+    "localization": "false",
+    "tickers": "false",
+    "community_data": "false",
+    "developer_data": "false",
+    "sparkline": "false",
+}
+
+def coingecko_requests(intent, assets, number="unknown"):
+    """
+    The CoinGecko GETs, as (path, params, endpoint), that answering `intent`
+    for `assets` will make, leaving out what the market snapshot already
+    holds. Must match the fetchers below so prefetched responses are reused.
+    """
+    if intent in SNAPSHOT_FIELDS and len(assets) > 1:
+        missing = sorted(crypto for crypto in assets if market_snapshot.get(crypto) is None)
+        if not missing:
+            return []
+        return [("/coins/markets", {"vs_currency": "usd", "ids": ",".join(missing)}, "coins_markets")]
+    if not assets:
+        return []
+
+    crypto = assets[0]
+    if intent in SNAPSHOT_FIELDS and market_snapshot.get(crypto) is not None:
+        return []
+    if intent == "price":
+        return [("/simple/price", {"ids": crypto, "vs_currencies": "usd"}, "simple_price")]
+    if intent in SNAPSHOT_FIELDS:
+        return [(f"/coins/{crypto}", COIN_DETAIL_PARAMS, "coin")]
+    if intent == "market_chart":
+        # Same reading of "number" as route_query
+        days = max(1, min(int(number), 100)) if str(number).isdigit() else 10
+        return [(f"/coins/{crypto}/market_chart", {"vs_currency": "usd", "days": days}, "market_chart")]
+    if intent == "ohlc":
+        return [(f"/coins/{crypto}/ohlc", {"vs_currency": "usd", "days": 7}, "ohlc")]
+    return []
+
 def get_crypto_data(crypto, intent):
+    # Several coins → one batched lookup and a comparison table
+    if isinstance(crypto, (list, tuple)):
+        if len(crypto) > 1:
+            return get_multi_crypto_data(crypto, intent)
+        crypto = crypto[0]
+
+    # -------- SNAPSHOT (in memory, no upstream call) --------
+    row = market_snapshot.get(crypto)
+    if row is not None and intent in SNAPSHOT_FIELDS:
+        value = getattr(row, SNAPSHOT_FIELDS[intent])
+        if value is not None:
+            return format_crypto_answer(crypto, intent, value)
 
     # -------- PRICE (Simple endpoint) --------
     if intent == "price":
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={crypto}&vs_currencies=usd"
-        r = requests.get(url, headers=headers)
+        r = coingecko_get("/simple/price", {"ids": crypto, "vs_currencies": "usd"}, endpoint="simple_price")
 
         if r.status_code != 200:
-            return r.text
+            return upstream_error(r, f"the price of {crypto}")
 
         data = r.json()
 
         if crypto not in data:
             return "Crypto not found."
 
-        price = data[crypto]["usd"]
-        return f"The current price of {crypto.capitalize()} is ${price}"
+        alert_engine.evaluate({crypto: data[crypto]["usd"]})
+        return format_crypto_answer(crypto, intent, data[crypto]["usd"])
 
     # -------- MARKET DATA (Heavy endpoint) --------
-    url = (
-        f"https://api.coingecko.com/api/v3/coins/{crypto}"
-        "?localization=false&tickers=false&community_data=false&developer_data=false&sparkline=false"
-    )
-
-    r = requests.get(url, headers=headers)
+    r = coingecko_get(f"/coins/{crypto}", COIN_DETAIL_PARAMS, endpoint="coin")
 
     if r.status_code != 200:
-        return r.text
+        return upstream_error(r, f"market data for {crypto}")
 
     data = r.json()
     market = data.get("market_data", {})
 
     if intent == "market_cap":
-        return f"The market cap of {crypto.capitalize()} is ${market.get('market_cap', {}).get('usd')}"
+        return format_crypto_answer(crypto, intent, market.get('market_cap', {}).get('usd'))
 
     if intent == "supply":
-        return f"The circulating supply of {crypto.capitalize()} is {market.get('circulating_supply')} coins"
+        return format_crypto_answer(crypto, intent, market.get('circulating_supply'))
 
     if intent == "volume":
-        return f"The 24h trading volume of {crypto.capitalize()} is ${market.get('total_volume', {}).get('usd')}"
+        return format_crypto_answer(crypto, intent, market.get('total_volume', {}).get('usd'))
 
     return "I couldn't process your request."
 
@@ -683,28 +1217,255 @@ def remove_trailing_questions(text):
 
     return "".join(lines).rstrip()
 
-def ask_gemini(query):
+def clean_llm_answer(result):
+    # Trim incomplete last line
+    cleaned = clean_incomplete_sentence(result.strip())
+    cleaned = remove_until_capital(cleaned)
+    cleaned = remove_trailing_questions(cleaned)
+    return format_bold_text(cleaned.strip())
+
+def infer_answer(query):
+    response = hf_space.post("/infer", json={"prompt": query}, endpoint="infer", timeout=(5, LLM_ANSWER_TIMEOUT))
+    if response.status_code != 200:
+        raise RuntimeError(f"/infer returned {response.status_code}")
+    return response.json()["response"]
+
+def fallback_answer(query):
+    # ✅ Gemini answers general questions while the HF space is failing; None when it can't either
+    if GENERAL_FALLBACK != "gemini":
+        return None
     try:
-        url = "https://Vaibhav7625-Crypto-Llama-3B-Instruct.hf.space/infer"
-        payload = {"prompt": query}
-        
-        response = requests.post(url, json=payload, timeout=300)
-        result = response.json()["response"].strip()
+        result = gemini_generate(
+            "You are a helpful cryptocurrency assistant. Answer the question below in a few short, "
+            f"factual paragraphs.\n\nQuestion: {query}"
+        )
+    except Exception as e:
+        print("Fallback answer failed:", e)
+        return None
+    hf_breaker.record_fallback()
+    return clean_llm_answer(result)
 
-        # Trim incomplete last line
-        cleaned = clean_incomplete_sentence(result)
-        cleaned = remove_until_capital(cleaned)
-        cleaned = remove_trailing_questions(cleaned)
+@traced("llm_answer")
+def ask_gemini(query):
+    # ✅ Near-duplicates of an earlier question reuse its answer
+    cached = semantic_cache.get(query)
+    if cached is not None:
+        return cached
 
-        return format_bold_text(cleaned.strip())
+    started = time.perf_counter()
+    try:
+        answer = clean_llm_answer(hf_breaker.call(infer_answer, query))
+    except Exception as e:
+        print("Error:", e)
+        answer = fallback_answer(query)
+        if answer is None:
+            return f"An unexpected error occurred 😔\nTry again later."
+
+    semantic_cache.put(query, answer, time.perf_counter() - started)
+    return answer
+
+def iter_infer_tokens(response):
+    # Token stream from the HF space: SSE "data:" lines, plain chunks, or one JSON body
+    content_type = response.headers.get("Content-Type", "")
+
+    if "application/json" in content_type:
+        yield response.json()["response"]
+        return
+
+    if "text/event-stream" in content_type:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                data = json.loads(data)
+            except ValueError:
+                yield data
+                continue
+            yield (data.get("token") or data.get("response") or "") if isinstance(data, dict) else str(data)
+        return
+
+    for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+        if chunk:
+            yield chunk
+
+def stream_gemini(query):
+    """
+    Streaming counterpart of ask_gemini: yields cleaned, formatted text
+    pieces as the model produces them instead of one final answer.
+    """
+    cached = semantic_cache.get(query)
+    if cached is not None:
+        yield cached
+        return
+
+    # ✅ Skip the HF space entirely while its breaker is open
+    if not hf_breaker.allow():
+        yield fallback_answer(query) or "An unexpected error occurred 😔\nTry again later."
+        return
+
+    started = time.perf_counter()
+    first_token = None
+    recorded = False
+    cleaner = StreamCleaner()
+    pieces = []
+    try:
+        response = hf_space.post("/infer", json={"prompt": query, "stream": True},
+                                 endpoint="infer", stream=True, timeout=(5, LLM_ANSWER_TIMEOUT))
+        with response:
+            if response.status_code != 200:
+                raise RuntimeError(f"/infer returned {response.status_code}")
+            for token in iter_infer_tokens(response):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                piece = cleaner.feed(token)
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+
+        tail = cleaner.finish()
+        if tail:
+            pieces.append(tail)
+            yield tail
+        hf_breaker.record(True, first_token if first_token is not None else time.perf_counter() - started)
+        recorded = True
+        semantic_cache.put(query, "".join(pieces).strip(), time.perf_counter() - started)
 
     except Exception as e:
         print("Error:", e)
-        return f"An unexpected error occurred 😔\nTry again later."
+        if not recorded:
+            hf_breaker.record(False, time.perf_counter() - started)
+            recorded = True
+        # Only a stream that failed before showing anything can be answered another way
+        fallback = None if pieces else fallback_answer(query)
+        yield fallback or "An unexpected error occurred 😔\nTry again later."
+
+    finally:
+        # ✅ Closed early (client gone, GeneratorExit): a backend that was already streaming
+        # counts as a success; otherwise the half-open trial slot is handed back unjudged
+        if not recorded:
+            if first_token is not None:
+                hf_breaker.record(True, first_token)
+            else:
+                hf_breaker.release()
+
+def get_current_price(crypto):
+    row = market_snapshot.get(crypto)
+    if row is not None and row.price is not None:
+        return row.price
+
+    r = coingecko_get("/simple/price", {"ids": crypto, "vs_currencies": "usd"}, endpoint="simple_price")
+    if r.status_code != 200:
+        return None
+    price = r.json().get(crypto, {}).get("usd")
+    if price is not None:
+        alert_engine.evaluate({crypto: price})
+    return price
+
+def format_usd(value):
+    # 50000.0 → "50,000", 0.00012 → "0.00012"
+    return f"{value:,.8f}".rstrip("0").rstrip(".")
+
+def list_price_alerts(session_id):
+    alerts = alert_engine.active(session_id)
+    if not alerts:
+        return "You have no active price alerts. Try: \"Tell me when BTC drops below 50k\"."
+    return "Your active price alerts:\n" + "\n".join(
+        f"🔔 #{alert.id} {alert.coin_id.capitalize()} {alert.direction} **${format_usd(alert.threshold)}**"
+        for alert in alerts
+    )
+
+def create_price_alert(crypto, user_input, number, session_id="default"):
+    parsed = parse_alert(user_input)
+    if parsed is None:
+        if not number.isdigit():
+            return list_price_alerts(session_id)
+        parsed = (None, float(number))
+    direction, threshold = parsed
+
+    current = get_current_price(crypto)
+    if direction is None:
+        # "hits 100k": the side of the current price decides the direction
+        if current is None:
+            return f"Should I alert you when {crypto.capitalize()} goes above or below ${format_usd(threshold)}?"
+        direction = "above" if threshold > current else "below"
+
+    if current is not None and (current >= threshold if direction == "above" else current <= threshold):
+        return f"{crypto.capitalize()} is already {direction} ${format_usd(threshold)} (currently **${format_usd(current)}**)."
+
+    try:
+        alert = alert_engine.add(session_id, crypto, direction, threshold)
+    except ValueError as e:
+        return f"⚠️ {e}"
+
+    return f"🔔 Alert #{alert.id} set: I'll tell you when {crypto.capitalize()} goes {direction} **${format_usd(threshold)}**."
+
+def format_alert_notice(notice):
+    return (f"🔔 Alert #{notice['id']}: {notice['coin_id'].capitalize()} is {notice['direction']} "
+            f"**${format_usd(notice['threshold'])}** (price **${format_usd(notice['price'])}**).")
+
+def get_portfolio_value(user_input):
+    holdings = parse_holdings(user_input)
+    if not holdings:
+        return "Tell me your holdings with amounts, e.g. \"What is 1.5 BTC, 10 ETH and 2000 ADA worth?\""
+
+    try:
+        result = value_portfolio(holdings)
+    except ValueError as e:
+        return f"⚠️ {e}"
+    except RuntimeError:
+        return "⚠️ Couldn't fetch prices right now. Please try again."
+
+    # Single-line HTML table, like format_crypto_table
+    body = "".join(
+        f"<tr><td>{p['name']}</td><td>{format_usd(p['amount'])}</td><td>${format_usd(p['price'])}</td>"
+        f"<td>${p['value']:,.2f}</td><td>{p['pnl_24h']:+,.2f}</td></tr>"
+        for p in result["positions"]
+    )
+    lines = [
+        "<table class='crypto-table'><tr><th>Coin</th><th>Amount</th><th>Price</th><th>Value</th><th>24h P&amp;L</th></tr>"
+        f"{body}</table>",
+        f"💼 Total value: **${result['total_value']:,.2f}**",
+        f"📊 24h P&L: **{result['pnl_24h']:+,.2f} USD** ({result['pnl_24h_pct']:+.2f}%)",
+    ]
+    if result["unpriced"]:
+        lines.append(f"⚠️ No price found for: {', '.join(result['unpriced'])}")
+    return "\n".join(lines)
 
 # Function to process user input and decide which API to call
-def process_user_input(user_input):
-    intent, asset, date, number = detect_intent_and_crypto(user_input)
+def process_user_input(user_input, session_id="default"):
+    fields = detect_intent_and_crypto(user_input)
+    return answer_query(user_input, fields, session_id=session_id)
+
+# Routes an already-classified query to the right fetcher.
+# With stream=True, general questions return a generator of answer pieces.
+def answer_query(user_input, fields, stream=False, session_id="default"):
+    set_intent(fields["intent"])
+    try:
+        reply = route_query(user_input, fields, stream, session_id)
+    except RateLimited:
+        # ✅ The upstream budget is spent and the queue didn't clear in time
+        reply = "⚠️ We're getting more questions than our market data plan allows right now. Please try again in a minute."
+
+    # ✅ Alerts that fired since the last message are shown ahead of the answer (news cards excepted)
+    if isinstance(reply, dict):
+        return reply
+    notices = alert_engine.take_notifications(session_id)
+    if not notices:
+        return reply
+    header = "\n".join(format_alert_notice(notice) for notice in notices) + "\n\n"
+    if isinstance(reply, str):
+        return header + reply
+    return prepend_piece(header, reply)
+
+def prepend_piece(first, pieces):
+    yield first
+    yield from pieces
+
+def route_query(user_input, fields, stream=False, session_id="default"):
+    intent, asset, date, number = fields["intent"], fields["asset"], fields["date"], fields["number"]
 
     try:
         number = int(number)
@@ -714,26 +1475,30 @@ def process_user_input(user_input):
     # ✅ Ensure number is within a valid range (1 to 100)
     number = max(1, min(number, 100)) 
 
+    news_intent, keyword = fields["news_intent"], fields["keyword"]
+
     if intent == "previous":
-        # Fetch the last stored message from memory
-        if memory.chat_memory.messages:
-            last_output = memory.chat_memory.messages[-1].content
-            last_values = last_output.split(",")
-            intent=last_values[0]
-            if asset == "unknown": asset = last_values[1]
-            if date == "unknown": date = last_values[2]
-            if number == "unknown": number = last_values[3]
-        else:
+        # Fetch the last stored entry for this session
+        last = session_memory.last(session_id)
+        if last is None:
             return "No previous data found in memory."
-        
-    memory.save_context({"input": user_input}, {
-        "output": f"{intent},{asset},{date},{number}"
-        })
-    
+        intent = last["intent"]
+        if asset == "unknown": asset = last["asset"]
+        if date == "unknown": date = last["date"]
+        if fields["number"] == "unknown" and last["number"].isdigit(): number = int(last["number"])
+        if news_intent == "none": news_intent = last["news_intent"]
+        if keyword == "none": keyword = last["keyword"]
+
     if intent == "news":
-        return news_related_query(user_input, asset, date, number)
+        # News entries are saved once the sub-intent is resolved
+        return news_related_query(user_input, asset, date, number,
+                                  news_intent, keyword, session_id=session_id)
+
+    session_memory.save(session_id, intent=intent, asset=asset, date=date, number=number)
 
     if intent in ["price", "market_cap", "supply", "volume"]:
+        if len(fields["assets"]) > 1:
+            return get_crypto_data(fields["assets"], intent)
         if asset != "unknown":
             return get_crypto_data(asset, intent)
         return "Please specify a cryptocurrency (e.g., Bitcoin, Ethereum)."
@@ -751,6 +1516,8 @@ def process_user_input(user_input):
         return get_exchange_details(asset)
 
     if intent == "history" and asset != "unknown" and date != "unknown":
+        if " to " in date:
+            return get_historical_range(asset, date, fields.get("weekday", "none"))
         return get_historical_data(asset, date)
 
     if intent == "market_chart" and asset != "unknown":
@@ -759,10 +1526,26 @@ def process_user_input(user_input):
     if intent == "ohlc" and asset != "unknown":
         return get_ohlc(asset)
 
+    if intent == "portfolio":
+        return get_portfolio_value(user_input)
+
+    if intent == "alert":
+        if asset == "unknown":
+            return list_price_alerts(session_id)
+        return create_price_alert(asset, user_input, fields["number"], session_id=session_id)
+
+    if intent == "compare":
+        if len(fields["assets"]) < 2:
+            return "Please name at least two cryptocurrencies to compare (e.g., SOL vs BTC)."
+        days = int(fields["number"]) if fields["number"].isdigit() else COMPARE_DEFAULT_DAYS
+        return get_comparison(fields["assets"], max(1, min(days, 365)))
+
     if intent == "categories":
         return get_crypto_categories()
 
     if intent == "general":
+        if stream:
+            return stream_gemini(user_input)
         return ask_gemini(user_input)
 
     return "I'm not sure how to answer that. Try asking about a cryptocurrency or its market data."
\ No newline at end of file
@@ -0,0 +1,226 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS, span
+from rate_limiter import scheduler_from_env
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json"
+}
+
+# (connect, read) timeout used when an endpoint has no entry of its own
+DEFAULT_TIMEOUT = (3.05, 10)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Never sleep longer than this between retries, whatever Retry-After says
+MAX_RETRY_DELAY = 10.0
+
+# Longest a 429's Retry-After may hold an upstream's whole request queue
+MAX_HOLD_SECONDS = 300.0
+
+
+def retry_after(response):
+    value = response.headers.get("Retry-After", "")
+    return float(value) if value.isdigit() else None
+
+
+class UpstreamClient:
+    """
+    Keep-alive HTTP client for one upstream API.
+    Owns a pooled requests.Session, applies per-endpoint (connect, read)
+    timeouts and retries 429/5xx and connection errors with jittered backoff.
+    With a rate limiter, every attempt first takes a slot from its budget.
+    """
+
+    def __init__(self, name, base_url, timeouts=None, headers=None, pool_size=20,
+                 max_in_flight=32, retries=2, backoff=0.5, limiter=None):
+        self.name = name
+        self.limiter = limiter
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = timeouts or {}
+        self.headers = headers or DEFAULT_HEADERS
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update(self.headers)
+                    self._session = session
+        return self._session
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _retry_delay(self, attempt, response=None):
+        # Honour Retry-After when the upstream sends one, else full-jitter exponential backoff
+        if response is not None:
+            seconds = retry_after(response)
+            if seconds is not None:
+                return min(seconds, MAX_RETRY_DELAY)
+        return random.uniform(0, min(self.backoff * (2 ** attempt), MAX_RETRY_DELAY))
+
+    def request(self, method, path, endpoint="default", timeout=None, retries=None, **kwargs):
+        # Retries included, this is one "upstream.<name>" stage of the current request trace
+        with span(f"upstream.{self.name}"):
+            return self._request(method, path, endpoint, timeout, retries, **kwargs)
+
+    def _request(self, method, path, endpoint, timeout, retries, **kwargs):
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        timeout = timeout or self.timeouts.get(endpoint, DEFAULT_TIMEOUT)
+        retries = self.retries if retries is None else retries
+
+        for attempt in range(retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            started = time.perf_counter()
+            self._slots.acquire()
+            waited = time.perf_counter() - started
+
+            with self._stats_lock:
+                self._stats["requests"] += 1
+                self._stats["in_flight"] += 1
+                self._stats["wait_seconds"] += waited
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+            sent = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                UPSTREAM_RESPONSES.inc(upstream=self.name, endpoint=endpoint, status=response.status_code)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count("errors")
+                UPSTREAM_RESPONSES.inc(upstream=self.name, endpoint=endpoint, status="error")
+                if attempt >= retries:
+                    raise
+                response = None
+            finally:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - sent, upstream=self.name, endpoint=endpoint)
+                self._count("in_flight", -1)
+                self._slots.release()
+
+            if response is None:
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            held = False
+            if response.status_code == 429 and self.limiter is not None:
+                # Every caller of this upstream waits out Retry-After in the limiter queue
+                seconds = retry_after(response)
+                self.limiter.penalize(min(seconds, MAX_HOLD_SECONDS) if seconds is not None
+                                      else self._retry_delay(attempt))
+                held = True
+
+            if response.status_code in RETRY_STATUSES and attempt < retries:
+                self._count("retries")
+                delay = 0 if held else self._retry_delay(attempt, response)
+                # Drain the body so the connection goes back to the pool instead of being dropped
+                response.content
+                response.close()
+                time.sleep(delay)
+                continue
+
+            return response
+
+    def get(self, path, params=None, endpoint="default", **kwargs):
+        return self.request("GET", path, endpoint=endpoint, params=params, **kwargs)
+
+    def post(self, path, json=None, endpoint="default", **kwargs):
+        return self.request("POST", path, endpoint=endpoint, json=json, **kwargs)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        # urllib3 counts, per connection pool, requests served and connections opened
+        opened = served = 0
+        if self._session is not None:
+            for adapter in self._session.adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is not None:
+                        opened += pool.num_connections
+                        served += pool.num_requests
+
+        stats["connections_opened"] = opened
+        stats["reuse_ratio"] = round(1 - opened / served, 4) if served else 0.0
+        sent = stats["requests"]
+        stats["avg_wait_seconds"] = round(stats["wait_seconds"] / sent, 6) if sent else 0.0
+        return stats
+
+
+coingecko = UpstreamClient(
+    "coingecko",
+    os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3"),
+    timeouts={
+        "simple_price": (3.05, 5),
+        "coins_markets": (3.05, 10),
+        "coin": (3.05, 10),
+        "history": (3.05, 10),
+        "market_chart": (3.05, 15),
+        "ohlc": (3.05, 10),
+        "categories": (3.05, 15),
+        "exchanges": (3.05, 10),
+        "exchange": (3.05, 10),
+        "nfts": (3.05, 10),
+        "coins_list": (3.05, 30),
+    },
+    # Public API tier: ~30 calls/minute
+    limiter=scheduler_from_env("coingecko", per_minute=30, burst=10),
+)
+
+cryptopanic = UpstreamClient(
+    "cryptopanic",
+    os.getenv("CRYPTOPANIC_BASE_URL", "https://cryptopanic.com/api/developer/v2"),
+    timeouts={"posts": (3.05, 10)},
+    limiter=scheduler_from_env("cryptopanic", per_minute=60, burst=5),
+)
+
+# Inference can legitimately take minutes; only the connect phase is kept short
+hf_space = UpstreamClient(
+    "hf_space",
+    os.getenv("HF_SPACE_URL", "https://Vaibhav7625-Crypto-Llama-3B-Instruct.hf.space"),
+    timeouts={"infer": (5, 300)},
+    pool_size=8,
+    retries=1,
+)
+
+UPSTREAMS = {client.name: client for client in (coingecko, cryptopanic, hf_space)}
+
+
+def get_pool_stats():
+    return {name: client.stats() for name, client in UPSTREAMS.items()}
+
+
+def get_rate_limit_stats():
+    return {name: client.limiter.stats() for name, client in UPSTREAMS.items() if client.limiter is not None}
@@ -0,0 +1,258 @@
+import os
+import re
+from threading import Lock
+
+from alert_engine import ALERT_WORDS, parse_alert
+from coin_index import coin_index
+from portfolio import parse_holdings
+
+# Minimum confidence for the local classifier to answer without asking Gemini
+LOCAL_INTENT_CONFIDENCE = float(os.getenv("LOCAL_INTENT_CONFIDENCE", "0.8"))
+
+# Tickers / names that are also everyday English words: only trusted when written in CAPS
+AMBIGUOUS_TICKERS = {
+    "dot", "link", "near", "uni", "atom", "op", "etc", "ton", "sol", "leo", "flow", "sand",
+    "mana", "gala", "ape", "comp", "cake", "dash", "neo", "hype", "sei", "wif", "maker",
+    "quant", "render", "stacks", "lido", "pol", "ena", "ondo", "jup", "algo", "rune", "tao",
+}
+
+INTENT_PATTERNS = {
+    "market_cap": re.compile(r"\bmarket\s*cap(italization|italisation)?\b|\bm(ar)?ke?t\s*cap\b|\bmcap\b"),
+    "supply": re.compile(r"\b(circulating\s+|total\s+|max(imum)?\s+)?supply\b|\bin circulation\b"),
+    "volume": re.compile(r"\b(24\s*h(ou)?r?\s+|trading\s+)?volume\b"),
+    "ohlc": re.compile(r"\bohlc\b|\bcandles?(ticks?)?\b|\bopen[\s,/]+high\b"),
+    "market_chart": re.compile(r"\bchart\b|\btrend\b"),
+    "categories": re.compile(r"\bcategor(y|ies)\b|\bsectors\b"),
+    "list_exchanges": re.compile(r"\bexchanges\b"),
+    "list_coins": re.compile(r"\b(coins|cryptos|cryptocurrencies|tokens)\b"),
+    "price": re.compile(r"\bprices?\b|\bworth\b|\bcost\b|\bhow much is\b|\btrading at\b|\bvalue of\b"),
+}
+
+LIST_WORDS = re.compile(r"\b(top|list|biggest|largest|best|supported|all|show)\b")
+
+# Anything that needs date maths, memory, news or open-ended reasoning goes to the LLM
+DEFER_PATTERN = re.compile(
+    r"\bago\b|\byesterday\b|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b|\b(19|20)\d{2}\b|"
+    r"\bnews\b|\bheadlines?\b|\bnfts?\b|\bexchange\b|"
+    r"\bwhy\b|\bshould\b|\bsafe\b|\bexplain\b|\bpredict|\bforecast|\brecommend|"
+    r"\b(buy|buying|sell|selling|invest\w*|dca)\b|\bcost.averag|\bhow (do|does|to|can|should)\b|"
+    r"\bwhat about\b|\band what\b|\bprevious\b|\bsame\b"
+)
+PORTFOLIO_PATTERN = re.compile(r"\bportfolio\b|\bholdings?\b|\bi (have|hold|own)\b|\bmy (bags?|coins)\b")
+VALUE_WORDS = re.compile(r"\bworth\b|\bvalue\b|\btotal\b")
+# "SOL vs BTC", "is SOL moving with BTC?", "correlation between ETH and BNB"
+COMPARE_PATTERN = re.compile(
+    r"\bcompare\b|\bcomparison\b|\bvs\.?\b|\bversus\b|\bcorrelat|\b(mov(e|es|ing)|track(s|ing)?)\s+with\b|"
+    r"\boutperform|\bperform(ed|ing)?\s+(better|worse)\b"
+)
+HISTORY_PATTERN = re.compile(r"\blast\s+(week|month|year)\b|\bhistor(y|ical)\b|\bon\s+\d")
+
+WINDOW_UNITS = {"d": 1, "day": 1, "days": 1, "w": 7, "week": 7, "weeks": 7,
+                "month": 30, "months": 30, "year": 365, "years": 365, "y": 365}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9$\-]+")
+
+ASSET_INTENTS = {"price", "market_cap", "supply", "volume", "ohlc", "market_chart"}
+# Intents that can be answered for several coins in one batched call
+MULTI_ASSET_INTENTS = {"price", "market_cap", "supply", "volume"}
+LIST_INTENTS = {"list_coins", "list_exchanges", "categories"}
+
+# Relative dates and years: a history question, which needs the LLM's date maths
+PAST_PATTERN = re.compile(r"\bago\b|\byesterday\b|\b(19|20)\d{2}\b|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b")
+
+NEWS_PATTERN = re.compile(r"\bnews\b|\bheadlines?\b|\bbreaking\b")
+NEWS_SENTIMENT = re.compile(r"\b(bullish|bearish|positive|negative|good|bad)\b")
+NEWS_EVENTS = re.compile(
+    r"\b(hacks?|hacked|exploits?|crash(es|ed)?|etfs?|lawsuits?|rug ?pulls?|scams?|bans?|banned|"
+    r"listings?|delisting|halving|upgrades?|forks?|sec|regulation)\b"
+)
+
+_path_lock = Lock()
+# "fallback": the LLM was unavailable and the local guess was used regardless of confidence
+INTENT_PATH_STATS = {"local": 0, "llm": 0, "fallback": 0}
+
+
+def extract_assets(user_input):
+    # Returns CoinGecko ids mentioned in the text, in order of appearance
+    text = user_input.lower()
+    caps = set(re.findall(r"\b[A-Z0-9]{2,6}\b", user_input))
+    tokens = [token.strip("$-") for token in TOKEN_PATTERN.findall(text)]
+
+    found = []
+    i = 0
+    while i < len(tokens):
+        # Longest match first: "first digital usd", "bitcoin cash", "btc"
+        for size in (3, 2, 1):
+            phrase = " ".join(tokens[i:i + size])
+            if size > 1 and i + size > len(tokens):
+                continue
+            coin_id = coin_index.resolve(phrase, known_only=True)
+            if not coin_id:
+                continue
+            if size == 1 and phrase in AMBIGUOUS_TICKERS and phrase.upper() not in caps:
+                coin_id = None
+            break
+        else:
+            size = 1
+
+        if coin_id and coin_id not in found:
+            found.append(coin_id)
+        i += size
+    return found
+
+
+def extract_number(text):
+    # "top 10", "7 days", "2 weeks", "last month" → count / number of days
+    match = re.search(r"\btop\s+(\d+)\b", text)
+    if match:
+        return match.group(1)
+
+    match = re.search(r"\b(\d+)\s*(d|days?|w|weeks?|months?|y|years?)\b", text)
+    if match:
+        return str(int(match.group(1)) * WINDOW_UNITS[match.group(2)])
+
+    match = re.search(r"\b(past|last)\s+(day|week|month|year)\b", text)
+    if match:
+        return str(WINDOW_UNITS[match.group(2)])
+
+    match = re.search(r"\b(\d+)\b", text)
+    if match:
+        return match.group(1)
+
+    return "unknown"
+
+
+def classify_intent_locally(user_input, defer=True):
+    """
+    Resolves the common, unambiguous intents without an LLM call.
+    Returns (intent, assets, date, number, confidence) where assets is a list
+    of CoinGecko ids; a confidence below LOCAL_INTENT_CONFIDENCE means the
+    caller should ask Gemini instead. defer=False also tries the queries
+    DEFER_PATTERN would normally hand to the LLM.
+    """
+    text = user_input.lower().strip()
+    unknown = ("unknown", [], "unknown", "unknown", 0.0)
+
+    if not text or (defer and DEFER_PATTERN.search(text)):
+        return unknown
+
+    assets = extract_assets(user_input)
+    matched = [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(text)]
+
+    # Lists (top 10 coins / exchanges, categories) don't name an asset
+    listing = [intent for intent in matched if intent in LIST_INTENTS]
+    if listing and not assets:
+        if len(listing) > 1:
+            return unknown
+        intent = listing[0]
+        if intent != "categories" and not LIST_WORDS.search(text):
+            return unknown
+        return intent, [], "unknown", extract_number(text), 0.95
+
+    # "what's my portfolio worth: 1.5 BTC, 10 ETH", "how much is 2 BTC worth?"
+    portfolio = PORTFOLIO_PATTERN.search(text)
+    if portfolio or VALUE_WORDS.search(text):
+        holdings = parse_holdings(text)
+        if holdings:
+            return "portfolio", assets, "unknown", "unknown", 0.9
+        if portfolio:
+            return unknown
+
+    # "tell me when BTC drops below 50k"
+    if ALERT_WORDS.search(text):
+        if len(assets) != 1 or parse_alert(text) is None:
+            return unknown
+        return "alert", assets, "unknown", "unknown", 0.9
+
+    metrics = [intent for intent in matched if intent in ASSET_INTENTS]
+
+    if COMPARE_PATTERN.search(text):
+        if len(assets) < 2 or len(metrics) > 1:
+            return unknown
+        # "BTC vs ETH market cap" is a side-by-side table; anything else compares the moves
+        if metrics and metrics[0] in MULTI_ASSET_INTENTS:
+            return metrics[0], assets, "unknown", "unknown", 0.9
+        return "compare", assets, "unknown", extract_number(text), 0.9
+
+    # A bare ticker ("btc?", "$eth") is a price lookup
+    if not metrics and len(assets) == 1 and len(TOKEN_PATTERN.findall(text)) == 1:
+        return "price", assets, "unknown", "unknown", 0.85
+
+    if len(metrics) != 1 or not assets:
+        return unknown
+
+    intent = metrics[0]
+    if len(assets) > 1 and intent not in MULTI_ASSET_INTENTS:
+        return unknown
+
+    if intent in ("market_chart", "ohlc"):
+        return intent, assets, "unknown", extract_number(text), 0.9
+
+    # "price of BTC last month" is a history question
+    if HISTORY_PATTERN.search(text):
+        return unknown
+
+    return intent, assets, "unknown", "unknown", 0.95
+
+
+def classify_news_locally(user_input):
+    """
+    Keyword guess at the news sub-intent, used when Gemini can't be asked.
+    Returns "<intent>,<keyword>" like classify_news_intent.
+    """
+    text = user_input.lower()
+    event = NEWS_EVENTS.search(text)
+    if event:
+        return f"event_related_news,{event.group(1)}"
+    if NEWS_SENTIMENT.search(text):
+        return "news_by_sentiment,none"
+    if "breaking" in text or "latest" in text:
+        return "breaking_news,none"
+    if extract_assets(user_input):
+        return "news_by_asset,none"
+    return "general_news,none"
+
+
+def fallback_intent(user_input):
+    """
+    Best-effort (intent, assets, date, number) while the LLM is unavailable:
+    news by keyword, the local classifier's guess at any confidence, and
+    "general" for whatever is left.
+    """
+    if NEWS_PATTERN.search(user_input.lower()):
+        return "news", extract_assets(user_input), "unknown", "unknown"
+    intent, assets, date, number, _ = classify_intent_locally(user_input, defer=False)
+    if intent == "unknown":
+        return "general", [], "unknown", "unknown"
+    return intent, assets, date, number
+
+
+def guess_intents(user_input):
+    """
+    Cheap guess at (intents, assets, number) for a message the LLM is still
+    classifying, so its likely per-coin fetches can start early. intents is
+    empty when the message doesn't look like a per-coin lookup at all.
+    """
+    text = user_input.lower()
+    if NEWS_PATTERN.search(text) or HISTORY_PATTERN.search(text) or PAST_PATTERN.search(text):
+        return [], [], "unknown"
+    assets = extract_assets(user_input)
+    if not assets:
+        return [], [], "unknown"
+    intents = [intent for intent, pattern in INTENT_PATTERNS.items()
+               if intent in ASSET_INTENTS and pattern.search(text)]
+    # A coin named with no metric ("what about ETH?", "is SOL pumping") is most often a price check
+    return intents or ["price"], assets, extract_number(text)
+
+
+def record_intent_path(path):
+    with _path_lock:
+        INTENT_PATH_STATS[path] += 1
+
+
+def get_intent_path_stats():
+    with _path_lock:
+        stats = dict(INTENT_PATH_STATS)
+    total = stats["local"] + stats["llm"] + stats["fallback"]
+    stats["local_ratio"] = round(stats["local"] / total, 4) if total else 0.0
+    return stats
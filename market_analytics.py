@@ -0,0 +1,195 @@
+import math
+from operator import itemgetter
+
+import numpy as np
+
+MS_PER_YEAR = 365 * 86_400_000
+
+RSI_PERIOD = 14
+SMA_PERIOD = 20
+EMA_PERIOD = 20
+
+
+def column(rows, index):
+    """
+    One column of [[t, a, b, …], …] JSON rows as a contiguous float64 array.
+    np.fromiter over itemgetter skips the intermediate list (and object array) np.array would build.
+    """
+    return np.fromiter(map(itemgetter(index), rows), dtype=np.float64, count=len(rows))
+
+
+def sample_step(rows):
+    # CoinGecko series are evenly spaced, so the endpoints give the sampling interval
+    return (rows[-1][0] - rows[0][0]) / (len(rows) - 1) if len(rows) > 1 else 0
+
+
+def pct_change(first, last):
+    return (last - first) / first * 100 if first else 0.0
+
+
+def realized_volatility(prices, step_ms):
+    """Annualised standard deviation of log returns, for samples step_ms apart."""
+    prices = prices[prices > 0]
+    if len(prices) < 3 or step_ms <= 0:
+        return 0.0
+    returns = np.diff(np.log(prices))
+    return float(returns.std(ddof=1) * math.sqrt(MS_PER_YEAR / step_ms) * 100)
+
+
+def max_drawdown(prices):
+    """Largest peak-to-trough fall, as a (negative) percentage."""
+    peaks = np.maximum.accumulate(prices)
+    return float(((prices - peaks) / peaks).min() * 100)
+
+
+def sma(prices, period=SMA_PERIOD):
+    return float(prices[-period:].mean())
+
+
+def ema_weights(length, alpha):
+    """
+    Newest-first weights alpha·(1-alpha)^k, normalised so a short series isn't biased low.
+    Cut off once a weight drops below 1e-12, which leaves the result unchanged.
+    """
+    length = min(length, math.ceil(math.log(1e-12) / math.log(1 - alpha)))
+    weights = (1 - alpha) ** np.arange(length, dtype=np.float64)
+    return weights / weights.sum()
+
+
+def ema(prices, period=EMA_PERIOD):
+    """Latest EMA value, as one dot product instead of a Python loop over the series."""
+    weights = ema_weights(len(prices), 2 / (period + 1))
+    return float(prices[::-1][:len(weights)] @ weights)
+
+
+def rsi(prices, period=RSI_PERIOD):
+    """Wilder's RSI (smoothing factor 1/period) on the latest point."""
+    if len(prices) <= period:
+        return None
+    weights = ema_weights(len(prices) - 1, 1 / period)
+    deltas = np.diff(prices[-len(weights) - 1:])[::-1]
+    gain = float(np.clip(deltas, 0, None) @ weights)
+    loss = float(np.clip(-deltas, 0, None) @ weights)
+    if loss == 0:
+        return 100.0
+    return 100 - 100 / (1 + gain / loss)
+
+
+def vwap(prices, volumes):
+    total = volumes.sum()
+    return float((prices * volumes).sum() / total) if total > 0 else None
+
+
+def analyze_market_chart(data):
+    """
+    Statistics for a /market_chart payload ({"prices": [[ms, price]], "total_volumes": …}).
+    Returns None when there are fewer than two price points.
+    """
+    points = data.get("prices") or []
+    if len(points) < 2:
+        return None
+
+    prices = column(points, 1)
+
+    volumes = data.get("total_volumes") or []
+    volume_weighted = None
+    if len(volumes) == len(points):
+        volume_weighted = vwap(prices, column(volumes, 1))
+
+    return {
+        "first": float(prices[0]),
+        "last": float(prices[-1]),
+        "low": float(prices.min()),
+        "high": float(prices.max()),
+        "change_pct": pct_change(float(prices[0]), float(prices[-1])),
+        "volatility_pct": realized_volatility(prices, sample_step(points)),
+        "max_drawdown_pct": max_drawdown(prices),
+        "sma": sma(prices),
+        "ema": ema(prices),
+        "rsi": rsi(prices),
+        "vwap": volume_weighted,
+        "points": len(prices),
+    }
+
+
+def analyze_ohlc(candles):
+    """Statistics for an /ohlc payload ([[ms, open, high, low, close], …])."""
+    if not candles:
+        return None
+
+    opens, highs, lows, closes = (column(candles, i) for i in range(1, 5))
+
+    # Average true range: the candle's range, widened by any gap from the previous close
+    previous = np.concatenate((opens[:1], closes[:-1]))
+    true_range = np.maximum(highs, previous) - np.minimum(lows, previous)
+
+    return {
+        "open": float(opens[0]),
+        "close": float(closes[-1]),
+        "high": float(highs.max()),
+        "low": float(lows.min()),
+        "change_pct": pct_change(float(opens[0]), float(closes[-1])),
+        "volatility_pct": realized_volatility(closes, sample_step(candles)),
+        "max_drawdown_pct": max_drawdown(closes),
+        "atr": float(true_range.mean()),
+        "up_candles": int((closes > opens).sum()),
+        "candles": len(closes),
+        "last": [float(values[-1]) for values in (opens, highs, lows, closes)],
+    }
+
+
+def series(data):
+    """(timestamps, prices) arrays from a /market_chart payload, without missing or zero prices."""
+    points = [point for point in data.get("prices") or [] if point[1]]
+    return column(points, 0), column(points, 1)
+
+
+def align(series_list):
+    """
+    Resamples several (timestamps, prices) series onto one evenly spaced grid over
+    the window they all cover. Returns (grid, matrix) with one row per series,
+    or None when the series don't overlap.
+    """
+    start = max(timestamps[0] for timestamps, _ in series_list)
+    end = min(timestamps[-1] for timestamps, _ in series_list)
+    # Grid as dense as the sparsest series inside the overlap, so no series is upsampled much
+    size = min(int(((timestamps >= start) & (timestamps <= end)).sum()) for timestamps, _ in series_list)
+    if end <= start or size < 3:
+        return None
+
+    grid = np.linspace(start, end, size)
+    matrix = np.empty((len(series_list), size), dtype=np.float64)
+    for row, (timestamps, prices) in zip(matrix, series_list):
+        row[:] = np.interp(grid, timestamps, prices)
+    return grid, matrix
+
+
+def compare(series_list):
+    """
+    Returns, correlation matrix and relative performance for aligned series, all
+    computed on the whole matrix at once. Returns None when they can't be aligned.
+    Correlations involving a series that never moved (a stablecoin) are None.
+    """
+    aligned = align(series_list)
+    if aligned is None:
+        return None
+    grid, matrix = aligned
+
+    returns = np.diff(np.log(matrix), axis=1)
+    step = (grid[-1] - grid[0]) / (len(grid) - 1)
+    volatility = returns.std(axis=1, ddof=1) * math.sqrt(MS_PER_YEAR / step) * 100
+    change = (matrix[:, -1] / matrix[:, 0] - 1) * 100
+
+    # Zero variance makes corrcoef divide by zero; those rows and columns are undefined
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = np.corrcoef(returns)
+    flat = returns.std(axis=1) == 0
+    correlation[flat, :] = np.nan
+    correlation[:, flat] = np.nan
+
+    return {
+        "change_pct": change.tolist(),
+        "volatility_pct": volatility.tolist(),
+        "correlation": [[None if math.isnan(value) else value for value in row] for row in correlation.tolist()],
+        "points": len(grid),
+    }
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+from http_client import coingecko
+from rate_limiter import background
+from response_cache import shared_get
+
+# /coins/markets caps per_page at 250
+MARKETS_PAGE_SIZE = 250
+
+MarketRow = namedtuple(
+    "MarketRow",
+    "id symbol name price market_cap circulating_supply total_volume change_24h rank",
+)
+
+
+class MarketSnapshot:
+    """
+    In-memory table of the top N coins by market cap, refreshed from
+    /coins/markets in bulk pages so the request path never has to.
+    """
+
+    def __init__(self, top_n=500, interval=60, max_age=300):
+        self.top_n = top_n
+        self.interval = interval
+        self.max_age = max_age
+        self.updated_at = None
+        self._rows = {}
+        self._ranked = ()
+        self._thread = None
+        self._listeners = []
+        self._stats = {"refreshes": 0, "failures": 0, "last_refresh_seconds": 0.0}
+
+    def refresh(self):
+        started = time.perf_counter()
+        rows = {}
+        data_age = 0.0
+        pages = -(-self.top_n // MARKETS_PAGE_SIZE)
+
+        for page in range(1, pages + 1):
+            # Workers refreshing within the same interval share one download of each page
+            response = shared_get(coingecko, "/coins/markets", {
+                "vs_currency": "usd",
+                "order": "market_cap_desc",
+                "per_page": min(MARKETS_PAGE_SIZE, self.top_n),
+                "page": page,
+                "price_change_percentage": "24h",
+            }, endpoint="coins_markets", ttl=self.interval)
+
+            if response.status_code != 200:
+                raise RuntimeError(f"/coins/markets page {page} returned {response.status_code}")
+            if response.max_age is not None:
+                data_age = max(data_age, self.interval - response.max_age)
+
+            for coin in response.json():
+                rows[coin["id"]] = MarketRow(
+                    coin["id"],
+                    (coin.get("symbol") or "").upper(),
+                    coin.get("name") or coin["id"],
+                    coin.get("current_price"),
+                    coin.get("market_cap"),
+                    coin.get("circulating_supply"),
+                    coin.get("total_volume"),
+                    coin.get("price_change_percentage_24h"),
+                    coin.get("market_cap_rank"),
+                )
+
+        # Swap whole tables so readers always see a consistent snapshot
+        self._rows = rows
+        self._ranked = tuple(sorted(rows.values(), key=lambda row: row.rank or float("inf")))
+        # A page another worker fetched is as old as that fetch
+        self.updated_at = time.time() - data_age
+        self._stats["refreshes"] += 1
+        self._stats["last_refresh_seconds"] = round(time.perf_counter() - started, 4)
+
+        for listener in self._listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print("Market snapshot listener failed:", e)
+        return rows
+
+    def add_listener(self, fn):
+        # fn(rows) runs on the refresh thread after every successful refresh
+        self._listeners.append(fn)
+
+    def age(self):
+        return time.time() - self.updated_at if self.updated_at else None
+
+    def is_fresh(self):
+        age = self.age()
+        return age is not None and age <= self.max_age
+
+    def get(self, coin_id):
+        # None when the coin is outside the table or the data is too old to trust
+        if not self.is_fresh():
+            return None
+        return self._rows.get(coin_id)
+
+    def top(self, limit):
+        return self._ranked[:limit] if self.is_fresh() else ()
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return None
+
+        def run():
+            while True:
+                try:
+                    with background():
+                        self.refresh()
+                except (requests.RequestException, RuntimeError, ValueError) as e:
+                    self._stats["failures"] += 1
+                    print("Market snapshot refresh failed:", e)
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=run, name="market-snapshot", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stats(self):
+        age = self.age()
+        return dict(
+            self._stats,
+            coins=len(self._rows),
+            age_seconds=round(age, 1) if age is not None else None,
+            fresh=self.is_fresh(),
+        )
+
+
+market_snapshot = MarketSnapshot(
+    top_n=int(os.getenv("MARKET_SNAPSHOT_TOP_N", "500")),
+    interval=int(os.getenv("MARKET_SNAPSHOT_INTERVAL", "60")),
+    max_age=int(os.getenv("MARKET_SNAPSHOT_MAX_AGE", "300")),
+)
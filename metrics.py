@@ -0,0 +1,278 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Share of chat requests that get a timing breakdown in their JSON response (0–1);
+# a request can also ask for one with "timing": true
+TIMING_SAMPLE_RATE = float(os.getenv("TIMING_SAMPLE_RATE", "0"))
+
+# Seconds; spans from the local classifier up to a slow LLM answer
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        with self._lock:
+            return [(tuple(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.samples():
+            lines.append(f"{self.name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [per-bucket counts (last one is +Inf), sum, count]
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return [(tuple(zip(self.labels, key)), [list(counts), total, count])
+                    for key, (counts, total, count) in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.samples():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = labels + (("le", format_value(float(bound))),)
+                lines.append(f"{self.name}_bucket{format_labels(le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text format. Besides its own metrics it
+    runs collectors at scrape time: functions returning (name, kind, help,
+    [(labels dict, value), ...]) tuples built from the subsystems' stats().
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Metrics collector {collector.__name__} failed:", e)
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{format_labels(sorted(labels.items()))} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "cryptora_request_seconds", "Chat request latency by route and intent.", ("route", "intent"))
+STAGE_SECONDS = registry.histogram(
+    "cryptora_stage_seconds", "Time spent in one pipeline stage, by intent.", ("stage", "intent"))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "cryptora_requests_in_flight", "Chat requests being processed.", ("route",))
+UPSTREAM_SECONDS = registry.histogram(
+    "cryptora_upstream_request_seconds", "One upstream HTTP attempt, by upstream and endpoint.",
+    ("upstream", "endpoint"))
+UPSTREAM_RESPONSES = registry.counter(
+    "cryptora_upstream_responses_total", "Upstream responses by status code (\"error\" for connection errors).",
+    ("upstream", "endpoint", "status"))
+
+
+# -------- Request traces --------
+
+class Trace:
+    """Stages of one chat request, in the order they finished."""
+
+    __slots__ = ("route", "intent", "stages", "started", "seconds")
+
+    def __init__(self, route):
+        self.route = route
+        self.intent = "unknown"
+        self.stages = []
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def breakdown(self):
+        total = self.seconds if self.seconds is not None else time.perf_counter() - self.started
+        return {
+            "intent": self.intent,
+            "total_ms": round(total * 1000, 2),
+            "stages": [{"stage": stage, "ms": round(seconds * 1000, 2)} for stage, seconds in self.stages],
+        }
+
+
+_current = contextvars.ContextVar("cryptora_trace", default=None)
+
+
+@contextmanager
+def trace(route):
+    """Times one chat request; spans inside it are labelled with its intent when it ends."""
+    current = Trace(route)
+    token = _current.set(current)
+    REQUESTS_IN_FLIGHT.inc(route=route)
+    try:
+        yield current
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Streaming: the generator finished in a different context than it started in
+            _current.set(None)
+        REQUESTS_IN_FLIGHT.dec(route=route)
+        current.seconds = time.perf_counter() - current.started
+        REQUEST_SECONDS.observe(current.seconds, route=route, intent=current.intent)
+        for stage, seconds in current.stages:
+            STAGE_SECONDS.observe(seconds, stage=stage, intent=current.intent)
+
+
+def set_intent(intent):
+    current = _current.get()
+    if current is not None:
+        current.intent = intent
+
+
+def record_span(stage, seconds):
+    current = _current.get()
+    if current is not None:
+        current.stages.append((stage, seconds))
+    else:
+        # Background work (refreshers, ingesters) has no request to belong to
+        STAGE_SECONDS.observe(seconds, stage=stage, intent="background")
+
+
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+
+def traced(stage):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def carry_context(fn):
+    # Runs fn (on a pool thread) in a copy of the caller's context, so its spans join the caller's trace
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def should_sample(requested=False):
+    return bool(requested) or (TIMING_SAMPLE_RATE > 0 and random.random() < TIMING_SAMPLE_RATE)
+
+
+def render_metrics():
+    return registry.render()
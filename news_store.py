@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from http_client import cryptopanic
+from rate_limiter import background
+from response_cache import shared_get
+
+NEWS_STORE_PATH = os.getenv(
+    "NEWS_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "news.sqlite3"),
+)
+
+# How stale the store may get before news questions go back to the live API
+NEWS_MAX_AGE = int(os.getenv("NEWS_MAX_AGE", "1800"))
+
+# CryptoPanic filter lists pulled on every ingest; "latest" is the unfiltered feed
+INGEST_FILTERS = ("latest", "hot", "bullish", "bearish", "important")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    rowid        INTEGER PRIMARY KEY,
+    slug         TEXT NOT NULL UNIQUE,
+    kind         TEXT,
+    published_at TEXT NOT NULL,          -- ISO 8601, UTC
+    day          TEXT NOT NULL,          -- YYYY-MM-DD, for date queries
+    data         TEXT NOT NULL           -- the CryptoPanic post as returned
+);
+CREATE INDEX IF NOT EXISTS posts_by_time ON posts (published_at);
+CREATE INDEX IF NOT EXISTS posts_by_day ON posts (day, published_at);
+
+CREATE TABLE IF NOT EXISTS post_currencies (
+    code TEXT NOT NULL,
+    post INTEGER NOT NULL,
+    PRIMARY KEY (code, post)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS post_filters (
+    filter TEXT NOT NULL,
+    post   INTEGER NOT NULL,
+    PRIMARY KEY (filter, post)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS post_text USING fts5(title, description);
+"""
+
+
+def fts_phrase(text):
+    # Keyword → one quoted FTS5 phrase, so operators in user text are taken literally
+    return '"' + text.replace('"', '""') + '"'
+
+
+class NewsStore:
+    """
+    Local copy of CryptoPanic posts, deduplicated by slug and indexed by
+    currency, filter (hot/bullish/bearish/important), day and full text.
+    """
+
+    def __init__(self, path, max_age=NEWS_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self.ingested_at = None
+        self._stats = {"ingests": 0, "failures": 0, "new_posts": 0, "last_ingest_seconds": 0.0}
+
+    @property
+    def db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def add(self, posts, filter_name):
+        """
+        Inserts posts not seen before and tags every post with filter_name.
+        Returns how many posts were new to that filter list.
+        """
+        new = tagged = 0
+        with self.db as conn:
+            for post in posts:
+                slug = post.get("slug")
+                published_at = post.get("published_at") or ""
+                if not slug or len(published_at) < 10:
+                    continue
+
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO posts (slug, kind, published_at, day, data) VALUES (?, ?, ?, ?, ?)",
+                    (slug, post.get("kind"), published_at, published_at[:10], json.dumps(post)),
+                )
+                if cursor.rowcount:
+                    new += 1
+                    rowid = cursor.lastrowid
+                    conn.execute("INSERT INTO post_text (rowid, title, description) VALUES (?, ?, ?)",
+                                 (rowid, post.get("title") or "", post.get("description") or ""))
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO post_currencies VALUES (?, ?)",
+                        [(c["code"].upper(), rowid) for c in post.get("currencies") or [] if c.get("code")],
+                    )
+                else:
+                    rowid = conn.execute("SELECT rowid FROM posts WHERE slug = ?", (slug,)).fetchone()[0]
+
+                tagged += conn.execute("INSERT OR IGNORE INTO post_filters VALUES (?, ?)",
+                                       (filter_name, rowid)).rowcount
+        self._stats["new_posts"] += new
+        return tagged
+
+    def search(self, currency=None, filter_name=None, keyword=None, day=None, kind=None, limit=5):
+        """Newest posts matching every given criterion, as CryptoPanic post dicts."""
+        query = "SELECT p.data FROM posts p"
+        where, params = [], []
+
+        if keyword:
+            query += " JOIN post_text t ON t.rowid = p.rowid"
+            where.append("post_text MATCH ?")
+            params.append(fts_phrase(keyword))
+        if currency:
+            where.append("p.rowid IN (SELECT post FROM post_currencies WHERE code = ?)")
+            params.append(currency.upper())
+        if filter_name:
+            where.append("p.rowid IN (SELECT post FROM post_filters WHERE filter = ?)")
+            params.append(filter_name)
+        if day:
+            where.append("p.day = ?")
+            params.append(day.isoformat())
+        if kind:
+            where.append("p.kind = ?")
+            params.append(kind)
+
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY p.published_at DESC LIMIT ?"
+        params.append(limit)
+        return [json.loads(row[0]) for row in self.db.execute(query, params)]
+
+    def covers(self, day=None):
+        """True when the ingester is current and (optionally) holds posts back to `day`."""
+        if self.ingested_at is None or time.time() - self.ingested_at > self.max_age:
+            return False
+        if day is None:
+            return True
+        oldest = self.db.execute("SELECT MIN(day) FROM posts").fetchone()[0]
+        return oldest is not None and oldest <= day.isoformat()
+
+    def prune(self, keep_days):
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).date().isoformat()
+        with self.db as conn:
+            old = [row[0] for row in conn.execute("SELECT rowid FROM posts WHERE day < ?", (cutoff,))]
+            for start in range(0, len(old), 500):
+                chunk = old[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM post_currencies WHERE post IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM post_filters WHERE post IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM post_text WHERE rowid IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM posts WHERE rowid IN ({marks})", chunk)
+        return len(old)
+
+    def ingest(self, auth_token, pages=3):
+        """Pages every filter list until a page brings nothing new."""
+        started = time.perf_counter()
+        for filter_name in INGEST_FILTERS:
+            for page in range(1, pages + 1):
+                params = {"auth_token": auth_token, "public": "true", "page": page}
+                if filter_name != "latest":
+                    params["filter"] = filter_name
+
+                response = shared_get(cryptopanic, "/posts/", params, endpoint="posts")
+                if response.status_code != 200:
+                    raise RuntimeError(f"/posts/ returned {response.status_code}")
+
+                data = response.json()
+                if not self.add(data.get("results", []), filter_name) or not data.get("next"):
+                    break
+
+        self.ingested_at = time.time()
+        self._stats["ingests"] += 1
+        self._stats["last_ingest_seconds"] = round(time.perf_counter() - started, 3)
+
+    def refresh(self, auth_token, pages=3, keep_days=90):
+        try:
+            self.ingest(auth_token, pages)
+            self.prune(keep_days)
+        except (requests.RequestException, RuntimeError, ValueError, sqlite3.Error) as e:
+            self._stats["failures"] += 1
+            print("News ingest failed:", e)
+
+    def stats(self):
+        posts, oldest, newest = self.db.execute(
+            "SELECT COUNT(*), MIN(day), MAX(day) FROM posts"
+        ).fetchone()
+        age = time.time() - self.ingested_at if self.ingested_at else None
+        return dict(self._stats, posts=posts, oldest_day=oldest, newest_day=newest,
+                    age_seconds=round(age, 1) if age is not None else None)
+
+
+news_store = NewsStore(NEWS_STORE_PATH)
+
+
+def start_news_ingester(auth_token, interval=None, keep_days=None):
+    # Pulls CryptoPanic into the local store (interval in seconds, 0 disables)
+    if interval is None:
+        interval = int(os.getenv("NEWS_INGEST_INTERVAL", "300"))
+    if keep_days is None:
+        keep_days = int(os.getenv("NEWS_RETENTION_DAYS", "90"))
+    if interval <= 0 or not auth_token:
+        return None
+
+    pages = int(os.getenv("NEWS_INGEST_PAGES", "3"))
+
+    def run():
+        while True:
+            with background():
+                news_store.refresh(auth_token, pages, keep_days)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="news-ingester", daemon=True)
+    thread.start()
+    return thread
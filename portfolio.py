@@ -0,0 +1,215 @@
+import os
+import re
+import threading
+import time
+
+import requests
+
+from alert_engine import alert_engine
+from coin_index import coin_index
+from http_client import coingecko
+from market_snapshot import market_snapshot
+
+# Positions accepted in one valuation request
+PORTFOLIO_MAX_POSITIONS = int(os.getenv("PORTFOLIO_MAX_POSITIONS", "1000"))
+
+# How long the first caller waits for others to join its batch, in seconds
+PORTFOLIO_BATCH_WINDOW = float(os.getenv("PORTFOLIO_BATCH_WINDOW", "0.025"))
+
+# /coins/markets accepts at most this many ids per page
+MARKETS_IDS_PER_CALL = 250
+
+AMOUNT_SUFFIXES = {"k": 1e3, "m": 1e6}
+HOLDING_TOKEN = re.compile(r"\d[\d,]*(?:\.\d+)?(?:[km]\b)?|[a-z0-9$\-]+")
+AMOUNT = re.compile(r"^(\d[\d,]*(?:\.\d+)?)([km])?$")
+
+
+def parse_amount(token):
+    match = AMOUNT.match(token)
+    if not match:
+        return None
+    return float(match.group(1).replace(",", "")) * AMOUNT_SUFFIXES.get(match.group(2) or "", 1)
+
+
+def parse_holdings(text):
+    """
+    "1.5 BTC, 10 eth and 2k ADA" → [("bitcoin", 1.5), ("ethereum", 10.0), ("cardano", 2000.0)].
+    Every coin must directly follow its amount.
+    """
+    tokens = [token.strip("$") for token in HOLDING_TOKEN.findall(text.lower())]
+    holdings = []
+    i = 0
+    while i < len(tokens):
+        amount = parse_amount(tokens[i])
+        if amount is None:
+            i += 1
+            continue
+
+        coin_id, size = None, 1
+        # Longest name first among well-known coins, then any exact id/ticker
+        for size in (3, 2, 1):
+            if i + 1 + size <= len(tokens):
+                coin_id = coin_index.resolve(" ".join(tokens[i + 1:i + 1 + size]), known_only=True)
+                if coin_id:
+                    break
+        if not coin_id and i + 1 < len(tokens):
+            size = 1
+            coin_id = coin_index.resolve(tokens[i + 1])
+
+        if coin_id:
+            holdings.append((coin_id, amount))
+            i += 1 + size
+        else:
+            i += 1
+    return holdings
+
+
+class _Batch:
+    __slots__ = ("ids", "done", "quotes", "error")
+
+    def __init__(self):
+        self.ids = set()
+        self.done = threading.Event()
+        self.quotes = {}
+        self.error = None
+
+
+class PriceBatcher:
+    """
+    Coalesces price lookups for coins outside the market snapshot.
+
+    The first caller opens a batch and waits `window` seconds; every caller that
+    arrives meanwhile adds its ids and waits on the same batch. The batch is then
+    priced with /coins/markets in pages of MARKETS_IDS_PER_CALL ids, so many
+    users' portfolios share a handful of upstream calls.
+    """
+
+    def __init__(self, window=PORTFOLIO_BATCH_WINDOW):
+        self.window = window
+        self._open = None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "callers": 0, "coins": 0, "upstream_calls": 0, "failures": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _fetch(self, coin_ids):
+        quotes = {}
+        coin_ids = sorted(coin_ids)
+        for start in range(0, len(coin_ids), MARKETS_IDS_PER_CALL):
+            response = coingecko.get("/coins/markets", params={
+                "vs_currency": "usd",
+                "ids": ",".join(coin_ids[start:start + MARKETS_IDS_PER_CALL]),
+                "per_page": MARKETS_IDS_PER_CALL,
+                "price_change_percentage": "24h",
+            }, endpoint="coins_markets")
+            self._count("upstream_calls")
+            if response.status_code != 200:
+                raise RuntimeError(f"/coins/markets returned {response.status_code}")
+            for coin in response.json():
+                quotes[coin["id"]] = (coin.get("name") or coin["id"], coin.get("current_price"),
+                                      coin.get("price_change_percentage_24h"))
+
+        alert_engine.evaluate({coin_id: quote[1] for coin_id, quote in quotes.items()})
+        return quotes
+
+    def get(self, coin_ids):
+        """{coin id: (name, price, change_24h) or None} for the given ids."""
+        if not coin_ids:
+            return {}
+
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            batch.ids.update(coin_ids)
+            self._stats["callers"] += 1
+
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                self._open = None
+                self._stats["batches"] += 1
+                self._stats["coins"] += len(batch.ids)
+            try:
+                batch.quotes = self._fetch(batch.ids)
+            except (requests.RequestException, RuntimeError, ValueError) as e:
+                self._count("failures")
+                # Every waiter gets the same error type, whatever went wrong upstream
+                batch.error = RuntimeError(f"Price lookup failed: {e}")
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return {coin_id: batch.quotes.get(coin_id) for coin_id in coin_ids}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_coins_per_batch"] = round(stats["coins"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+
+price_batcher = PriceBatcher()
+
+
+def value_portfolio(holdings):
+    """
+    Values [(coin id, amount), …]: snapshot prices first, every other coin in one
+    shared batch. Returns per-position values, the total and the 24h P&L.
+    """
+    if len(holdings) > PORTFOLIO_MAX_POSITIONS:
+        raise ValueError(f"A portfolio can have at most {PORTFOLIO_MAX_POSITIONS} positions.")
+
+    amounts = {}
+    for coin_id, amount in holdings:
+        if amount < 0:
+            raise ValueError(f"Negative amount for {coin_id}.")
+        amounts[coin_id] = amounts.get(coin_id, 0.0) + amount
+
+    quotes = {}
+    for coin_id in amounts:
+        row = market_snapshot.get(coin_id)
+        if row is not None and row.price is not None:
+            quotes[coin_id] = (row.name, row.price, row.change_24h)
+
+    missing = [coin_id for coin_id in amounts if coin_id not in quotes]
+    quotes.update(price_batcher.get(missing))
+
+    positions, unpriced = [], []
+    total = previous_total = 0.0
+    for coin_id, amount in amounts.items():
+        quote = quotes.get(coin_id)
+        if quote is None or quote[1] is None:
+            unpriced.append(coin_id)
+            continue
+
+        name, price, change = quote
+        value = amount * price
+        # Value 24h ago, backed out of the 24h % change
+        previous = value / (1 + change / 100) if change is not None and change > -100 else value
+        positions.append({
+            "coin_id": coin_id,
+            "name": name,
+            "amount": amount,
+            "price": price,
+            "value": round(value, 2),
+            "change_24h_pct": round(change, 2) if change is not None else None,
+            "pnl_24h": round(value - previous, 2),
+        })
+        total += value
+        previous_total += previous
+
+    positions.sort(key=lambda position: position["value"], reverse=True)
+    return {
+        "positions": positions,
+        "unpriced": unpriced,
+        "total_value": round(total, 2),
+        "pnl_24h": round(total - previous_total, 2),
+        "pnl_24h_pct": round((total / previous_total - 1) * 100, 2) if previous_total else 0.0,
+    }
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from response_cache import cached_get, client_cache_key, response_cache
+
+# Most speculative fetches started per message; 0 turns prefetching off
+PREFETCH_MAX_REQUESTS = int(os.getenv("PREFETCH_MAX_REQUESTS", "3"))
+# Budget tokens that must be left over before a guess may spend one
+PREFETCH_MIN_TOKENS = float(os.getenv("PREFETCH_MIN_TOKENS", "3"))
+
+prefetch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("PREFETCH_WORKERS", "8")),
+                                   thread_name_prefix="prefetch")
+
+
+class _Fetch:
+    __slots__ = ("started", "finished", "failed", "future")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.failed = False
+        self.future = None
+
+
+class Speculation:
+    """Fetches started for one message before its intent was confirmed, by cache key."""
+
+    __slots__ = ("fetches",)
+
+    def __init__(self):
+        self.fetches = {}
+
+
+class Prefetcher:
+    """
+    Starts the upstream GETs a message probably needs while the LLM is still
+    working out what it asks for.
+
+    Prefetches go through the shared response cache, so once the intent is
+    confirmed the real fetch for the same request either finds the result
+    cached or joins the request still in flight; nothing is fetched twice.
+    Guesses the confirmed intent didn't need are counted as wasted and simply
+    age out of the cache.
+    """
+
+    def __init__(self, client, max_requests=PREFETCH_MAX_REQUESTS, min_tokens=PREFETCH_MIN_TOKENS):
+        self.client = client
+        self.max_requests = max_requests
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._stats = {
+            "started": 0, "used": 0, "wasted": 0, "failed": 0,
+            "skipped_cached": 0, "skipped_budget": 0, "saved_seconds": 0.0,
+        }
+
+    @property
+    def enabled(self):
+        return self.max_requests > 0
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def start(self, calls):
+        """Starts up to max_requests of calls, [(path, params, endpoint)], in the background."""
+        speculation = Speculation()
+        if not self.enabled:
+            return speculation
+
+        for path, params, endpoint in calls:
+            if len(speculation.fetches) >= self.max_requests:
+                break
+            key = client_cache_key(self.client, path, params)
+            if key in speculation.fetches:
+                continue
+            if response_cache.get(key) is not None:
+                self._count("skipped_cached")
+                continue
+            # ✅ A guess never takes the slot a confirmed request would have queued for
+            limiter = self.client.limiter
+            if limiter is not None and not limiter.has_capacity(self.min_tokens):
+                self._count("skipped_budget")
+                break
+
+            fetch = _Fetch()
+            fetch.future = prefetch_pool.submit(self._fetch, fetch, path, params, endpoint)
+            speculation.fetches[key] = fetch
+            self._count("started")
+        return speculation
+
+    def _fetch(self, fetch, path, params, endpoint):
+        try:
+            cached_get(self.client, path, params, endpoint=endpoint)
+        except Exception as e:
+            # The confirmed fetch, if any, sees the same error and reports it; settle() counts it
+            print(f"Prefetch of {path} failed:", e)
+            fetch.failed = True
+        finally:
+            fetch.finished = time.perf_counter()
+
+    def settle(self, speculation, calls):
+        """
+        Called once the intent is confirmed with the GETs answering it will
+        make: prefetches among them are used, the rest wasted. A prefetch that
+        failed counts as failed either way (known once it finishes) and saves nothing.
+        """
+        if not speculation.fetches:
+            return
+        confirmed_at = time.perf_counter()
+        needed = {client_cache_key(self.client, path, params) for path, params, _ in calls}
+
+        for key, fetch in speculation.fetches.items():
+            fetch.future.add_done_callback(
+                lambda _, fetch=fetch, used=key in needed: self._settle_fetch(fetch, used, confirmed_at))
+
+    def _settle_fetch(self, fetch, used, confirmed_at):
+        with self._lock:
+            if fetch.failed:
+                self._stats["failed"] += 1
+            elif not used:
+                self._stats["wasted"] += 1
+            else:
+                self._stats["used"] += 1
+                # Saved: the head start, capped by how long the fetch actually took
+                self._stats["saved_seconds"] += min(fetch.finished - fetch.started, confirmed_at - fetch.started)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        settled = stats["used"] + stats["wasted"]
+        stats["wasted_ratio"] = round(stats["wasted"] / settled, 4) if settled else 0.0
+        stats["avg_saved_ms"] = round(stats["saved_seconds"] / stats["used"] * 1000, 1) if stats["used"] else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        stats["enabled"] = self.enabled
+        return stats
@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+import requests
+
+from http_client import coingecko
+from rate_limiter import background
+
+PRICE_STORE_PATH = os.getenv(
+    "PRICE_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prices.sqlite3"),
+)
+
+# Full-history backfills run here, never on a request thread
+backfill_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="price-backfill")
+
+DAY_MS = 86_400_000
+EPOCH = date(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_prices (
+    coin_id TEXT NOT NULL,
+    day     INTEGER NOT NULL,          -- days since 1970-01-01 (UTC)
+    price   REAL NOT NULL,
+    PRIMARY KEY (coin_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS coverage (
+    coin_id    TEXT PRIMARY KEY,
+    first_day  INTEGER NOT NULL,
+    last_day   INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def to_day(value):
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    return date.fromordinal(EPOCH.toordinal() + day)
+
+
+def today_day():
+    return to_day(datetime.now(timezone.utc).date())
+
+
+class PriceStore:
+    """
+    Append-only store of daily USD closes (CoinGecko's 00:00 UTC price) per coin.
+    A request for a new coin fetches only the days it asks about; the coin's
+    full history is backfilled from /market_chart in the background, and it is
+    then topped up with just the missing days, so history lookups are indexed
+    local reads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._fill_locks = {}
+        self._fill_locks_guard = threading.Lock()
+        self._backfills = {}     # coin id → backfill future, one per coin per process
+
+    @property
+    def db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def coverage(self, coin_id):
+        row = self.db.execute(
+            "SELECT first_day, last_day FROM coverage WHERE coin_id = ?", (coin_id,)
+        ).fetchone()
+        return (from_day(row[0]), from_day(row[1])) if row else None
+
+    def append(self, coin_id, prices):
+        """Stores [timestamp_ms, price] points that fall on a UTC midnight."""
+        rows = [
+            (coin_id, int(ms) // DAY_MS, float(price))
+            for ms, price in prices
+            if price is not None and int(ms) % DAY_MS < 3_600_000
+        ]
+        if not rows:
+            return 0
+
+        first_day = min(row[1] for row in rows)
+        last_day = max(row[1] for row in rows)
+        with self.db as conn:
+            conn.executemany("INSERT OR IGNORE INTO daily_prices VALUES (?, ?, ?)", rows)
+            conn.execute(
+                """
+                INSERT INTO coverage VALUES (?, ?, ?, ?)
+                ON CONFLICT(coin_id) DO UPDATE SET
+                    first_day = MIN(first_day, excluded.first_day),
+                    last_day = MAX(last_day, excluded.last_day),
+                    updated_at = excluded.updated_at
+                """,
+                (coin_id, first_day, last_day, time.time()),
+            )
+        return len(rows)
+
+    def _fetch_daily(self, coin_id, days):
+        response = coingecko.get(f"/coins/{coin_id}/market_chart", params={
+            "vs_currency": "usd",
+            "days": days,
+            "interval": "daily",
+        }, endpoint="market_chart")
+        if response.status_code != 200:
+            return None
+        return response.json().get("prices", [])
+
+    def _fetch_history(self, coin_id):
+        # Full history needs a paid plan; the public API stops at 365 days
+        return self._fetch_daily(coin_id, "max") or self._fetch_daily(coin_id, 365)
+
+    def _fill_lock(self, coin_id):
+        with self._fill_locks_guard:
+            return self._fill_locks.setdefault(coin_id, threading.Lock())
+
+    def sync(self, coin_id, since=None):
+        """
+        Appends the days missing since the last sync. A coin not in the store yet
+        gets its full history, or only the days from `since` on when given.
+        Returns True when the store covers the coin up to today.
+        """
+        with self._fill_lock(coin_id):
+            covered = self.coverage(coin_id)
+            today = today_day()
+
+            if covered and to_day(covered[1]) >= today:
+                return True
+
+            try:
+                if covered is not None:
+                    prices = self._fetch_daily(coin_id, today - to_day(covered[1]) + 1)
+                elif since is not None:
+                    prices = self._fetch_daily(coin_id, today - to_day(since) + 1)
+                else:
+                    prices = self._fetch_history(coin_id)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Price store sync failed for {coin_id}:", e)
+                return covered is not None
+
+            if prices:
+                self.append(coin_id, prices)
+            return self.coverage(coin_id) is not None
+
+    def backfill(self, coin_id):
+        """Fetches and stores the coin's whole history (slow: run it off the request path)."""
+        with self._fill_lock(coin_id):
+            try:
+                prices = self._fetch_history(coin_id)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Price store backfill failed for {coin_id}:", e)
+                return False
+            if prices:
+                self.append(coin_id, prices)
+            return bool(prices)
+
+    def schedule_backfill(self, coin_id):
+        # At most one backfill per coin per process; older days the API lacks stay missing
+        with self._fill_locks_guard:
+            if coin_id in self._backfills:
+                return
+            self._backfills[coin_id] = backfill_pool.submit(self._run_backfill, coin_id)
+
+    def _run_backfill(self, coin_id):
+        with background():
+            try:
+                self.backfill(coin_id)
+            except sqlite3.Error as e:
+                print("Price store error:", e)
+
+    def backfilling(self, coin_id):
+        with self._fill_locks_guard:
+            future = self._backfills.get(coin_id)
+        return future is not None and not future.done()
+
+    def get_price(self, coin_id, day):
+        row = self.db.execute(
+            "SELECT price FROM daily_prices WHERE coin_id = ? AND day = ?", (coin_id, to_day(day))
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_prices(self, coin_id, start, end, weekday=None):
+        """
+        Daily prices for start..end (inclusive) in one indexed range scan.
+        weekday follows date.weekday(): Monday = 0 … Sunday = 6.
+        """
+        query = "SELECT day, price FROM daily_prices WHERE coin_id = ? AND day BETWEEN ? AND ?"
+        params = [coin_id, to_day(start), to_day(end)]
+        if weekday is not None:
+            # 1970-01-01 was a Thursday (weekday 3)
+            query += " AND (day + 3) % 7 = ?"
+            params.append(weekday)
+        query += " ORDER BY day"
+        return [(from_day(day), price) for day, price in self.db.execute(query, params)]
+
+    def lookup(self, coin_id, day):
+        """
+        Price on a day. Days after the stored range are fetched now; days before
+        it (or a coin not stored yet) schedule a background backfill instead.
+        """
+        try:
+            covered = self.coverage(coin_id)
+            if not covered or day > covered[1]:
+                self.sync(coin_id, since=day)
+            if not covered or day < covered[0]:
+                self.schedule_backfill(coin_id)
+            return self.get_price(coin_id, day)
+        except sqlite3.Error as e:
+            print("Price store error:", e)
+            return None
+
+    def lookup_range(self, coin_id, start, end, weekday=None):
+        try:
+            covered = self.coverage(coin_id)
+            if not covered or end > covered[1]:
+                self.sync(coin_id, since=start)
+            if not covered or start < covered[0]:
+                self.schedule_backfill(coin_id)
+            return self.get_prices(coin_id, start, end, weekday)
+        except sqlite3.Error as e:
+            print("Price store error:", e)
+            return []
+
+    def tracked_coins(self):
+        return [row[0] for row in self.db.execute("SELECT coin_id FROM coverage")]
+
+    def stats(self):
+        coins, rows = self.db.execute(
+            "SELECT (SELECT COUNT(*) FROM coverage), (SELECT COUNT(*) FROM daily_prices)"
+        ).fetchone()
+        with self._fill_locks_guard:
+            backfilling = sum(1 for future in self._backfills.values() if not future.done())
+        return {"coins": coins, "rows": rows, "backfilling": backfilling, "path": self.path}
+
+
+price_store = PriceStore(PRICE_STORE_PATH)
+
+
+def start_price_store_updater(interval=None):
+    # Appends each new day for every coin already in the store (interval in seconds, 0 disables)
+    if interval is None:
+        interval = int(os.getenv("PRICE_STORE_UPDATE_SECONDS", "3600"))
+    if interval <= 0:
+        return None
+
+    seed = [coin for coin in os.getenv("PRICE_STORE_COINS", "bitcoin,ethereum").split(",") if coin]
+
+    def run():
+        while True:
+            with background():
+                for coin_id in dict.fromkeys(seed + price_store.tracked_coins()):
+                    price_store.sync(coin_id)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="price-store-updater", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,170 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+# Chat lookups are served before refreshers and ingesters
+INTERACTIVE, BACKGROUND = 0, 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# How long a request may wait for an upstream slot before giving up, in seconds
+QUEUE_TIMEOUTS = {
+    INTERACTIVE: float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10")),
+    BACKGROUND: float(os.getenv("UPSTREAM_BACKGROUND_QUEUE_TIMEOUT", "300")),
+}
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "500"))
+
+_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class RateLimited(requests.RequestException):
+    """An upstream request couldn't get a slot in its budget before its deadline."""
+
+
+@contextmanager
+def background():
+    # Upstream calls made inside this block queue behind interactive ones
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class RateScheduler:
+    """
+    Request budget of one upstream API: a token bucket of `burst` tokens
+    refilled at `per_minute`, shared by every caller in the process.
+
+    Callers queue in priority order (interactive first, then arrival order) and
+    give up with RateLimited at their deadline. A 429 empties the bucket and
+    holds the whole queue until its Retry-After has passed.
+    """
+
+    def __init__(self, name, per_minute, burst=None, max_queue=UPSTREAM_MAX_QUEUE):
+        self.name = name
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.burst = burst or max(1, per_minute // 6)
+        self.max_queue = max_queue
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = []                 # heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._granted = deque()            # grant times within the last minute
+        self._cond = threading.Condition()
+        self._stats = {
+            "granted": 0, "timeouts": 0, "rejected": 0, "throttled": 0,
+            "max_queue_depth": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            "granted_interactive": 0, "granted_background": 0,
+        }
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _grant(self, now, waited, priority):
+        self._tokens -= 1
+        heapq.heappop(self._waiting)
+        self._granted.append(now)
+        stats = self._stats
+        stats["granted"] += 1
+        stats["granted_" + PRIORITY_NAMES[priority]] += 1
+        stats["wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+    def acquire(self, priority=None, timeout=None):
+        """Blocks until this caller may send one request; returns the seconds waited."""
+        priority = current_priority() if priority is None else priority
+        timeout = QUEUE_TIMEOUTS[priority] if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise RateLimited(f"{self.name} request queue is full")
+
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(self._waiting, ticket)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._waiting))
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    ready_in = None
+                    # Only the head of the queue may take a token
+                    if self._waiting[0] == ticket:
+                        ready_in = max(self._blocked_until - now, (1 - self._tokens) / self.rate, 0.0)
+                        if ready_in <= 0:
+                            self._grant(now, now - started, priority)
+                            return now - started
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise RateLimited(f"No {self.name} request slot within {timeout:g}s")
+                    self._cond.wait(remaining if ready_in is None else min(ready_in, remaining))
+            finally:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                # The next head has to re-check the bucket
+                self._cond.notify_all()
+
+    def penalize(self, seconds):
+        """Upstream said 429: spend the bucket and hold everyone for `seconds`."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = 0.0
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._stats["throttled"] += 1
+            self._cond.notify_all()
+
+    def has_capacity(self, tokens=1):
+        # True when a request now would be granted at once and leave `tokens` - 1 spare
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return not self._waiting and self._blocked_until <= now and self._tokens >= tokens
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            while self._granted and self._granted[0] <= now - 60:
+                self._granted.popleft()
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._waiting)
+            stats["queue_interactive"] = sum(1 for priority, _ in self._waiting if priority == INTERACTIVE)
+            stats["tokens"] = round(self._tokens, 2)
+            stats["blocked_seconds"] = round(max(self._blocked_until - now, 0.0), 2)
+            stats["granted_last_minute"] = len(self._granted)
+        stats["per_minute"] = self.per_minute
+        stats["burst"] = self.burst
+        # Share of the per-minute budget used over the last minute
+        stats["utilisation"] = round(stats["granted_last_minute"] / self.per_minute, 3)
+        stats["avg_wait_seconds"] = round(stats["wait_seconds"] / stats["granted"], 4) if stats["granted"] else 0.0
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        return stats
+
+
+def scheduler_from_env(name, per_minute, burst):
+    # <NAME>_RATE_PER_MINUTE / <NAME>_BURST; a rate of 0 turns the budget off
+    per_minute = int(os.getenv(f"{name.upper()}_RATE_PER_MINUTE", str(per_minute)))
+    if per_minute <= 0:
+        return None
+    return RateScheduler(name, per_minute, int(os.getenv(f"{name.upper()}_BURST", str(burst))))
@@ -0,0 +1,242 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from shared_cache import shared_cache
+
+# Pass as ttl to keep an entry until it is evicted (e.g. history for past dates)
+CACHE_FOREVER = math.inf
+
+# Seconds each CoinGecko endpoint stays fresh; 0 means coalesce but don't keep
+ENDPOINT_TTLS = {
+    "simple_price": 15,
+    "coins_markets": 60,
+    "coin": 60,
+    "market_chart": 300,
+    "ohlc": 300,
+    "history": 300,
+    "nfts": 600,
+    "exchange": 3600,
+    "exchanges": 6 * 3600,
+    "categories": 6 * 3600,
+    "coins_list": 24 * 3600,
+    "posts": 60,
+}
+
+# Credentials don't change the response, and must not end up in shared cache keys
+SECRET_PARAMS = {"auth_token"}
+
+
+class CachedResponse:
+    """
+    Detached copy of an HTTP response that can be shared between callers.
+    Quacks like requests.Response for the bits the fetchers use.
+    """
+
+    __slots__ = ("status_code", "content", "headers", "max_age", "_json", "_derived")
+
+    def __init__(self, status_code, content, headers=None, max_age=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        # Seconds of freshness left when it came from the shared cache; None when just fetched
+        self.max_age = max_age
+        self._json = None
+        self._derived = {}
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(response.status_code, response.content, dict(response.headers))
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        # Parsed once per entry; callers must treat the result as read-only
+        if self._json is None:
+            self._json = json.loads(self.content)
+        return self._json
+
+    def derive(self, name, fn):
+        # Memoizes fn(self.json()) for as long as the entry lives, e.g. computed statistics
+        if name not in self._derived:
+            self._derived[name] = fn(self.json())
+        return self._derived[name]
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def make_cache_key(path, params=None):
+    # Same endpoint + same params in any order → same key
+    path = "/" + path.strip("/")
+    if not params:
+        return path
+    items = sorted((str(k), str(v).lower()) for k, v in params.items() if v is not None and k not in SECRET_PARAMS)
+    return f"{path}?{urlencode(items)}"
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache with per-entry TTLs.
+    Concurrent misses on the same key share a single loader call.
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key → (expires_at, value, size)
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def get(self, key, count=False):
+        # count=True for callers using the cache directly rather than through get_or_load;
+        # peeks (e.g. "is this already cached?") leave the hit ratio alone
+        with self._lock:
+            value = self._lookup(key)
+            if count:
+                self._stats["hits" if value is not None else "misses"] += 1
+            return value
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def set(self, key, value, ttl, size=0):
+        if not ttl or ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key, loader, ttl, cacheable=None, size_of=None):
+        # ttl may also be a function of the loaded value
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._stats["hits"] += 1
+                return value
+
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight()
+                leader = True
+                self._stats["misses"] += 1
+            else:
+                leader = False
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = loader()
+            flight.value = value
+            if cacheable is None or cacheable(value):
+                self.set(key, value, ttl(value) if callable(ttl) else ttl, size_of(value) if size_of else 0)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["in_flight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+
+def client_cache_key(client, path, params=None):
+    return f"{client.name}:{make_cache_key(path, params)}"
+
+
+def shared_get(client, path, params=None, endpoint="default", ttl=None):
+    """
+    GET through the cache shared by all worker processes only, for callers
+    that keep their own copy of the result (snapshot, coin list, news store).
+    ttl=None uses the endpoint's default from ENDPOINT_TTLS; only 200s are kept.
+    """
+    if ttl is None:
+        ttl = ENDPOINT_TTLS.get(endpoint, 0)
+    key = client_cache_key(client, path, params)
+
+    if ttl:
+        found = shared_cache.get_response(key)
+        if found is not None:
+            (status_code, headers, content), remaining = found
+            return CachedResponse(status_code, content, headers, max_age=remaining)
+
+    response = CachedResponse.from_response(client.get(path, params=params, endpoint=endpoint))
+    if ttl and response.status_code == 200:
+        shared_cache.set_response(key, response.status_code, response.headers, response.content, ttl)
+    return response
+
+
+def cached_get(client, path, params=None, endpoint="default", ttl=None):
+    """
+    GET through the in-process response cache, backed by the shared one.
+    ttl=None uses the endpoint's default from ENDPOINT_TTLS; only 200s are kept.
+    """
+    if ttl is None:
+        ttl = ENDPOINT_TTLS.get(endpoint, 0)
+    key = client_cache_key(client, path, params)
+
+    return response_cache.get_or_load(
+        key,
+        lambda: shared_get(client, path, params, endpoint, ttl),
+        # ✅ Another worker's entry is only kept for the freshness it has left
+        lambda r: ttl if r.max_age is None else min(ttl, r.max_age),
+        cacheable=lambda r: r.status_code == 200,
+        size_of=lambda r: len(r.content),
+    )
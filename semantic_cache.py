@@ -0,0 +1,321 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from shared_cache import shared_cache
+
+SEMANTIC_CACHE_PATH = os.getenv(
+    "SEMANTIC_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "semantic_cache.sqlite3"),
+)
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+# 0 disables the cache
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+# Minimum Jaccard similarity of the normalized word sets for a hit
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+
+# MinHash signature of NUM_PERM values, split into LSH_BANDS bands of LSH_ROWS rows.
+# Two questions share a bucket with probability 1 - (1 - J^4)^16: ~100% at J=0.8, ~1% at J=0.2.
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+MERSENNE_PRIME = (1 << 31) - 1
+
+_rng = np.random.RandomState(1)
+PERM_A = _rng.randint(1, MERSENNE_PRIME, NUM_PERM).astype(np.uint64)
+PERM_B = _rng.randint(0, MERSENNE_PRIME, NUM_PERM).astype(np.uint64)
+
+WORD = re.compile(r"[a-z0-9]+")
+# "don't" → "do not", so negations survive as a word of their own; "what's" → "what is"
+CONTRACTION = re.compile(r"n['’]t\b")
+APOSTROPHE_S = re.compile(r"['’]s\b")
+# Question words, modals and negations carry the meaning ("why" vs "when",
+# "should" vs "can", "safe" vs "not safe") and are never dropped
+STOPWORDS = frozenset("""
+a an the is are was were be been being am do does did doing have has had i me my we our you your
+it its this that these those there here of in on at to for from by with about as into over then
+so if or and but please tell explain know want like any some much many very really just also
+currently re ve ll d m
+""".split())
+# ...except where they ask nothing extra: "how safe is X" is "is X safe", "what is X" is "X".
+# "how" stays before these ("how do I", "how to", "how can"), "what" everywhere but before "be"
+HOW_KEPT_BEFORE = frozenset("do does did can could should would will shall may might must to i we you".split())
+BE = frozenset("is are was were be".split())
+# Words after these are the other side of a comparison, so "bitcoin better than
+# ethereum" and "ethereum better than bitcoin" get different word sets
+COMPARISON = frozenset(("than", "compared"))
+# Answers that depend on the moment they're asked are never cached
+TIME_SENSITIVE = re.compile(
+    r"\b(today|tonight|now|yesterday|tomorrow|latest|recent(ly)?|current(ly)?|this (week|month|year))\b"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id         INTEGER PRIMARY KEY,
+    query      TEXT NOT NULL,
+    answer     TEXT NOT NULL,
+    latency    REAL NOT NULL,          -- seconds the model took to produce the answer
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    used_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_by_use ON answers (used_at);
+"""
+
+
+def normalize(text):
+    """
+    "How safe is Binance?" → ("binance", "safe"): lower-cased words, stopwords
+    dropped, plural "s" trimmed, words after "than" marked ("than:ethereum"),
+    sorted and deduplicated.
+    """
+    tokens = WORD.findall(APOSTROPHE_S.sub(" is", CONTRACTION.sub(" not", text.lower())))
+    words = set()
+    compared = False
+    for i, word in enumerate(tokens):
+        if word in COMPARISON:
+            compared = True
+            continue
+        if word in STOPWORDS:
+            continue
+        following = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if (word == "how" and following not in HOW_KEPT_BEFORE) or (word == "what" and following in BE):
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add("than:" + word if compared else word)
+    return tuple(sorted(words))
+
+
+def minhash(words):
+    # One stable 32-bit hash per word, then NUM_PERM universal hashes (a·x + b) mod p
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "little") for word in words),
+        dtype=np.uint64, count=len(words),
+    )
+    return ((np.outer(hashes, PERM_A) + PERM_B) % MERSENNE_PRIME).min(axis=0)
+
+
+def band_keys(signature):
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+
+def shared_key(words):
+    # Other workers only see exact matches of the normalized words. Versioned: keys
+    # written by an older normalize() could match the wrong question
+    return "answer:v3:" + " ".join(words)
+
+
+def jaccard(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ("id", "words", "keys", "answer", "latency", "expires_at")
+
+    def __init__(self, entry_id, words, answer, latency, expires_at):
+        self.id = entry_id
+        self.words = words
+        self.keys = band_keys(minhash(words))
+        self.answer = answer
+        self.latency = latency
+        self.expires_at = expires_at
+
+
+class SemanticCache:
+    """
+    Answers to general questions, reused for near-duplicate questions.
+
+    Each question is reduced to its normalized word set and a MinHash signature;
+    LSH buckets on the signature bands find candidate questions without a scan,
+    and the best candidate is a hit when its word sets' Jaccard similarity
+    reaches the threshold. Entries expire after `ttl`, the least recently used
+    go first beyond `max_entries`, and everything is kept in SQLite so the cache
+    survives restarts.
+    """
+
+    def __init__(self, path, ttl=SEMANTIC_CACHE_TTL, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()    # entry id → _Entry, least recently used first
+        self._buckets = {}               # (band, band bytes) → set of entry ids
+        self._loaded = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "shared_hits": 0, "bypassed": 0, "stores": 0,
+                       "evictions": 0, "expired": 0, "saved_seconds": 0.0, "lookup_ms": 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    @property
+    def db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _load(self):
+        # Called with the lock held: the persisted answers, least recently used first
+        now = time.time()
+        with self.db as conn:
+            conn.execute("DELETE FROM answers WHERE expires_at <= ?", (now,))
+            rows = conn.execute(
+                "SELECT id, query, answer, latency, expires_at FROM answers ORDER BY used_at"
+            ).fetchall()
+        for entry_id, query, answer, latency, expires_at in rows:
+            words = normalize(query)
+            if words:
+                self._insert(_Entry(entry_id, words, answer, latency, expires_at))
+        self._loaded = True
+        self._evict()
+
+    def _insert(self, entry):
+        self._entries[entry.id] = entry
+        for key in entry.keys:
+            self._buckets.setdefault(key, set()).add(entry.id)
+
+    def _remove(self, entry):
+        # Called with the lock held; returns the id so the row can be deleted outside it
+        del self._entries[entry.id]
+        for key in entry.keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry.id)
+                if not bucket:
+                    del self._buckets[key]
+        return entry.id
+
+    def _evict(self):
+        removed = []
+        while len(self._entries) > self.max_entries:
+            removed.append(self._remove(next(iter(self._entries.values()))))
+            self._stats["evictions"] += 1
+        return removed
+
+    def _delete_rows(self, ids):
+        if ids:
+            with self.db as conn:
+                conn.executemany("DELETE FROM answers WHERE id = ?", [(entry_id,) for entry_id in ids])
+
+    def cacheable(self, query):
+        return self.enabled and not TIME_SENSITIVE.search(query.lower())
+
+    def get(self, query):
+        """The cached answer to a question close enough to `query`, or None."""
+        if not self.cacheable(query):
+            self._count("bypassed")
+            return None
+        words = normalize(query)
+        if not words:
+            self._count("bypassed")
+            return None
+
+        started = time.perf_counter()
+        keys = band_keys(minhash(words))
+        now = time.time()
+        best, best_score, expired = None, 0.0, []
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            candidates = set()
+            for key in keys:
+                candidates.update(self._buckets.get(key, ()))
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now:
+                    expired.append(self._remove(entry))
+                    continue
+                score = jaccard(words, entry.words)
+                if score > best_score:
+                    best, best_score = entry, score
+
+            stats = self._stats
+            stats["lookups"] += 1
+            stats["expired"] += len(expired)
+            stats["lookup_ms"] += (time.perf_counter() - started) * 1000
+            if best is None or best_score < self.threshold:
+                stats["misses"] += 1
+                best = None
+            else:
+                stats["hits"] += 1
+                stats["saved_seconds"] += best.latency
+                self._entries.move_to_end(best.id)
+
+        self._delete_rows(expired)
+        if best is None:
+            # ✅ Another worker process may have answered the same question already
+            shared = shared_cache.get_json(shared_key(words))
+            if shared is None:
+                return None
+            with self._lock:
+                self._stats["shared_hits"] += 1
+                self._stats["saved_seconds"] += shared["latency"]
+            return shared["answer"]
+        with self.db as conn:
+            conn.execute("UPDATE answers SET used_at = ? WHERE id = ?", (now, best.id))
+        return best.answer
+
+    def put(self, query, answer, latency):
+        """Stores the answer the model gave for `query` and how long it took (seconds)."""
+        if not answer or not self.cacheable(query):
+            return
+        words = normalize(query)
+        if not words:
+            return
+
+        now = time.time()
+        expires_at = now + self.ttl
+        with self.db as conn:
+            entry_id = conn.execute(
+                "INSERT INTO answers (query, answer, latency, created_at, expires_at, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (query, answer, latency, now, expires_at, now),
+            ).lastrowid
+
+        shared_cache.set_json(shared_key(words), {"answer": answer, "latency": latency}, self.ttl)
+
+        with self._lock:
+            if not self._loaded:
+                self._load()     # already includes the row just written
+            elif entry_id not in self._entries:
+                self._insert(_Entry(entry_id, words, answer, latency, expires_at))
+            self._stats["stores"] += 1
+            removed = self._evict()
+        self._delete_rows(removed)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["buckets"] = len(self._buckets)
+        # Shared hits follow a local miss, so they are part of "misses" too
+        stats["hit_ratio"] = round((stats["hits"] + stats["shared_hits"]) / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["avg_lookup_ms"] = round(stats["lookup_ms"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["lookup_ms"] = round(stats["lookup_ms"], 3)
+        stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+        stats["enabled"] = self.enabled
+        return stats
+
+
+semantic_cache = SemanticCache(SEMANTIC_CACHE_PATH)
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+MEMORY_FIELDS = ("intent", "asset", "date", "number", "news_intent", "keyword")
+
+# Values are short identifiers; anything longer is truncated so entries stay small
+MAX_FIELD_LENGTH = 100
+
+
+class SessionMemoryStore:
+    """
+    Per-session conversation memory.
+
+    Each session keeps a ring of its last `ring_size` structured entries.
+    Sessions idle for longer than `idle_ttl` seconds are dropped, and once the
+    whole store holds more than `max_entries` entries the least recently used
+    sessions are evicted.
+    """
+
+    def __init__(self, ring_size=10, idle_ttl=1800, max_entries=100_000):
+        self.ring_size = ring_size
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()  # session id → (ring, last_seen), least recent first
+        self._entries = 0
+        self._lock = threading.Lock()
+        self._stats = {"evicted_idle": 0, "evicted_ceiling": 0}
+
+    def _touch(self, session_id, create=False):
+        now = time.monotonic()
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            if not create:
+                return None
+            session = (deque(maxlen=self.ring_size), now)
+        self._sessions[session_id] = (session[0], now)
+        return session[0]
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, (ring, last_seen) = next(iter(self._sessions.items()))
+            if last_seen >= cutoff and self._entries <= self.max_entries:
+                break
+            del self._sessions[session_id]
+            self._entries -= len(ring)
+            self._stats["evicted_idle" if last_seen < cutoff else "evicted_ceiling"] += 1
+
+    def save(self, session_id, **fields):
+        entry = {key: str(fields.get(key, "unknown"))[:MAX_FIELD_LENGTH] for key in MEMORY_FIELDS}
+        entry["time"] = time.time()
+
+        with self._lock:
+            ring = self._touch(session_id, create=True)
+            if len(ring) < ring.maxlen:
+                self._entries += 1
+            ring.append(entry)
+            self._evict()
+        return entry
+
+    def update_last(self, session_id, **fields):
+        with self._lock:
+            ring = self._touch(session_id)
+            if not ring:
+                return None
+            for key in MEMORY_FIELDS:
+                if key in fields:
+                    ring[-1][key] = str(fields[key])[:MAX_FIELD_LENGTH]
+            return dict(ring[-1])
+
+    def last(self, session_id, intent=None):
+        """Most recent entry (optionally the most recent with a given intent), or None."""
+        with self._lock:
+            ring = self._touch(session_id)
+            if not ring:
+                return None
+            matches = [entry for entry in reversed(ring) if intent is None or entry["intent"] == intent]
+            return dict(matches[0]) if matches else None
+
+    def history(self, session_id):
+        with self._lock:
+            ring = self._touch(session_id)
+            return [dict(entry) for entry in ring] if ring else []
+
+    def clear(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session:
+                self._entries -= len(session[0])
+
+    def stats(self):
+        with self._lock:
+            self._evict()
+            return dict(self._stats, sessions=len(self._sessions), entries=self._entries)
+
+
+session_memory = SessionMemoryStore(
+    ring_size=int(os.getenv("SESSION_MEMORY_RING_SIZE", "10")),
+    idle_ttl=int(os.getenv("SESSION_MEMORY_IDLE_SECONDS", "1800")),
+    max_entries=int(os.getenv("SESSION_MEMORY_MAX_ENTRIES", "100000")),
+)
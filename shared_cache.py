@@ -0,0 +1,246 @@
+import json
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+from startup import lazy_import
+
+# "sqlite" (one file every worker on the host opens), "redis" (any Redis-compatible
+# server at SHARED_CACHE_URL) or "none"
+SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND", "sqlite")
+SHARED_CACHE_PATH = os.getenv(
+    "SHARED_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared_cache.sqlite3"),
+)
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "50000"))
+# Keys are namespaced so several apps can share one Redis
+SHARED_CACHE_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "cryptora:")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    value      BLOB NOT NULL,
+    expires_at REAL                    -- NULL: kept until evicted
+);
+CREATE INDEX IF NOT EXISTS entries_by_expiry ON entries (expires_at);
+"""
+
+# Response framing: status, headers length, headers JSON, then the body bytes as received
+RESPONSE_HEADER = struct.Struct("!HI")
+# Only the headers the fetchers read are kept
+KEPT_HEADERS = {"content-type", "retry-after"}
+
+
+def pack_response(status_code, headers, content):
+    kept = {name: value for name, value in headers.items() if name.lower() in KEPT_HEADERS}
+    meta = json.dumps(kept, separators=(",", ":")).encode("utf-8") if kept else b""
+    return b"".join((RESPONSE_HEADER.pack(status_code, len(meta)), meta, content))
+
+
+def unpack_response(blob):
+    # Sliced through a memoryview so the body is copied once, straight into its own bytes
+    view = memoryview(blob)
+    status_code, meta_length = RESPONSE_HEADER.unpack_from(view)
+    start = RESPONSE_HEADER.size
+    headers = json.loads(bytes(view[start:start + meta_length])) if meta_length else {}
+    return status_code, headers, bytes(view[start + meta_length:])
+
+
+class SQLiteBackend:
+    """
+    Entries in one SQLite file in WAL mode, so the worker processes on a host
+    read it concurrently. Expired rows are pruned, and beyond `max_entries`
+    the soonest-to-expire go first, every PRUNE_EVERY writes.
+    """
+
+    name = "sqlite"
+    PRUNE_EVERY = 500
+
+    def __init__(self, path, max_entries=SHARED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        # (value, seconds left) or None
+        row = self.db.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is None:
+            return value, math.inf
+        remaining = expires_at - time.time()
+        return (value, remaining) if remaining > 0 else None
+
+    def set(self, key, value, ttl):
+        expires_at = None if ttl == math.inf else time.time() + ttl
+        with self.db as conn:
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, value, expires_at))
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        with self.db as conn:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY expires_at IS NULL, expires_at LIMIT ?)",
+                    (excess,),
+                )
+
+    def stats(self):
+        return {"entries": self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0], "path": self.path}
+
+
+class RedisBackend:
+    """
+    Any server speaking the Redis protocol (Redis, Valkey, KeyDB, Dragonfly).
+    Needs the optional `redis` package; expiry is left to the server.
+    """
+
+    name = "redis"
+
+    def __init__(self, url):
+        redis = lazy_import("redis")
+        self.url = url
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        value, pttl = pipe.execute()
+        if value is None:
+            return None
+        # PTTL is -1 for a key without expiry
+        return value, math.inf if pttl < 0 else pttl / 1000
+
+    def set(self, key, value, ttl):
+        if ttl == math.inf:
+            self.client.set(key, value)
+        else:
+            self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def stats(self):
+        return {"entries": self.client.dbsize(), "url": self.url}
+
+
+class SharedCache:
+    """
+    Second-level cache shared by every worker process: one worker's upstream
+    fetch or model answer serves the others. Values are bytes; helpers pack
+    HTTP responses and JSON. A failing backend is logged and treated
+    as a miss, never as a failed request.
+    """
+
+    def __init__(self, backend, prefix=SHARED_CACHE_PREFIX):
+        self.backend = backend
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0, "bytes_read": 0, "bytes_written": 0}
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def get(self, key):
+        """(bytes, seconds left) or None."""
+        if self.backend is None:
+            return None
+        try:
+            found = self.backend.get(self.prefix + key)
+        except Exception as e:
+            print("Shared cache read failed:", e)
+            self._count("errors")
+            return None
+        if found is None:
+            self._count("misses")
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["bytes_read"] += len(found[0])
+        return found
+
+    def set(self, key, value, ttl):
+        if self.backend is None or not ttl or ttl <= 0:
+            return
+        try:
+            self.backend.set(self.prefix + key, value, ttl)
+        except Exception as e:
+            print("Shared cache write failed:", e)
+            self._count("errors")
+            return
+        with self._lock:
+            self._stats["writes"] += 1
+            self._stats["bytes_written"] += len(value)
+
+    def get_response(self, key):
+        # ((status_code, headers, content), seconds left) or None
+        found = self.get(key)
+        return (unpack_response(found[0]), found[1]) if found else None
+
+    def set_response(self, key, status_code, headers, content, ttl):
+        self.set(key, pack_response(status_code, headers, content), ttl)
+
+    def get_json(self, key):
+        found = self.get(key)
+        return json.loads(found[0]) if found else None
+
+    def set_json(self, key, value, ttl):
+        self.set(key, json.dumps(value, separators=(",", ":")).encode("utf-8"), ttl)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = self.backend.name if self.backend else "none"
+        stats["entries"] = 0
+        if self.backend is not None:
+            try:
+                stats.update(self.backend.stats())
+            except Exception as e:
+                stats["backend_error"] = str(e)
+        return stats
+
+
+def build_shared_cache():
+    if SHARED_CACHE_BACKEND == "redis":
+        try:
+            return SharedCache(RedisBackend(SHARED_CACHE_URL))
+        except ImportError:
+            print("SHARED_CACHE_BACKEND=redis needs the redis package; the shared cache is off")
+            return SharedCache(None)
+    if SHARED_CACHE_BACKEND == "sqlite" and SHARED_CACHE_MAX_ENTRIES > 0:
+        return SharedCache(SQLiteBackend(SHARED_CACHE_PATH))
+    return SharedCache(None)
+
+
+shared_cache = build_shared_cache()
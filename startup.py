@@ -0,0 +1,86 @@
+import importlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Reference point for the startup report: the first project module imports this one
+STARTED_AT = time.perf_counter()
+
+# Heavy dependencies that are only imported on first use (or by warm_up)
+LAZY_MODULES = ("google.generativeai", "newspaper")
+
+_timings = {}           # step → milliseconds, in the order the steps ran
+_modules = {}
+_warm_up_hooks = []
+_lock = threading.RLock()
+_ready_at = None
+
+
+def record(step, started):
+    _timings[step] = round((time.perf_counter() - started) * 1000, 1)
+
+
+@contextmanager
+def timed(step):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(step, started)
+
+
+def lazy_import(name):
+    """Imports a module on first call and times it; later calls return it straight away."""
+    module = _modules.get(name)
+    if module is None:
+        with _lock:
+            module = _modules.get(name)
+            if module is None:
+                with timed(f"import {name}"):
+                    module = importlib.import_module(name)
+                _modules[name] = module
+    return module
+
+
+def on_warm_up(fn):
+    # Extra preload step (e.g. building the Gemini model handle), run by warm_up()
+    _warm_up_hooks.append(fn)
+    return fn
+
+
+def warm_up():
+    """Preloads every lazy dependency now instead of on the first request that needs it."""
+    with timed("warm up"):
+        for name in LAZY_MODULES:
+            lazy_import(name)
+        for fn in _warm_up_hooks:
+            with timed(f"warm up {fn.__name__}"):
+                fn()
+
+
+def start_warm_up():
+    # WARM_UP_ON_START=1 preloads in the background so the first requests don't pay for it
+    if os.getenv("WARM_UP_ON_START", "0") != "1":
+        return None
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def mark_ready():
+    global _ready_at
+    _ready_at = time.perf_counter()
+    record("startup total", STARTED_AT)
+
+
+def startup_report():
+    return {
+        "steps_ms": dict(_timings),
+        "lazy_modules_loaded": sorted(_modules),
+        "ready": _ready_at is not None,
+    }
+
+
+def format_startup_report():
+    return "Startup timings (ms): " + ", ".join(f"{step}={ms}" for step, ms in _timings.items())
@@ -80,6 +80,7 @@ document.addEventListener('DOMContentLoaded', function () {
         chatContainer.scrollTop = chatContainer.scrollHeight;
 
         if (!isUser) createCoinBurst();
+        return messageElement;
     }
 
     function showTypingIndicator() {
@@ -91,20 +92,13 @@ document.addEventListener('DOMContentLoaded', function () {
         typingIndicator.style.display = 'none';
     }
 
-    async function sendMessage() {
-        const message = messageInput.value.trim();
-        if (!message) return;
-
-        addMessage(message, true);
-        messageInput.value = '';
-
-        messageInput.classList.add('searching');
-        setTimeout(() => {
-            messageInput.classList.remove('searching');
-        }, 1500);
-
-        showTypingIndicator();
+    function autoSpeak(text) {
+        if (speakerButton && speakerButton.dataset.autoSpeak === 'true') {
+            speakText(text);
+        }
+    }
 
+    async function fetchResponse(message) {
         try {
             const response = await fetch("/get-response", {
                 method: "POST",
@@ -117,15 +111,73 @@ document.addEventListener('DOMContentLoaded', function () {
             addMessage(data.response, false);
             
             // Auto-speak if speaker button is active
-            if (speakerButton && speakerButton.dataset.autoSpeak === 'true') {
-                speakText(data.response);
-            }
+            autoSpeak(data.response);
         } catch (err) {
             hideTypingIndicator();
             addMessage("⚠️ Error getting response. Try again.", false);
         }
     }
 
+    // Streams the answer over Server-Sent Events, falling back to a normal request
+    function streamResponse(message) {
+        const source = new EventSource(`/stream-response?message=${encodeURIComponent(message)}`);
+        let received = false;
+        let streamText = null;
+        let streamedHtml = '';
+
+        source.addEventListener('token', function (event) {
+            const piece = JSON.parse(event.data);
+            if (!received) {
+                received = true;
+                hideTypingIndicator();
+                const messageElement = addMessage("<div class='response-box'><p style='margin:0; line-height:1.5;'></p></div>", false);
+                streamText = messageElement.querySelector('.response-box p');
+            }
+            streamedHtml += piece;
+            streamText.innerHTML = streamedHtml;
+            chatContainer.scrollTop = chatContainer.scrollHeight;
+        });
+
+        source.addEventListener('message', function (event) {
+            received = true;
+            streamedHtml = JSON.parse(event.data);
+            hideTypingIndicator();
+            addMessage(streamedHtml, false);
+        });
+
+        source.addEventListener('done', function () {
+            source.close();
+            autoSpeak(streamedHtml);
+        });
+
+        source.onerror = function () {
+            // Never let EventSource reconnect: that would resend the question
+            source.close();
+            if (!received) fetchResponse(message);
+        };
+    }
+
+    async function sendMessage() {
+        const message = messageInput.value.trim();
+        if (!message) return;
+
+        addMessage(message, true);
+        messageInput.value = '';
+
+        messageInput.classList.add('searching');
+        setTimeout(() => {
+            messageInput.classList.remove('searching');
+        }, 1500);
+
+        showTypingIndicator();
+
+        if ('EventSource' in window) {
+            streamResponse(message);
+        } else {
+            await fetchResponse(message);
+        }
+    }
+
     function toggleRecording() {
         if (!recognition) {
             alert('Speech recognition is not supported in your browser.');
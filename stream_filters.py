@@ -0,0 +1,86 @@
+import re
+
+CAPITAL_WORD = re.compile(r"\b[A-Z][a-zA-Z]*\b")
+
+# End of a sentence followed by whitespace, i.e. the sentence is definitely complete
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+QUESTION_LINE = re.compile(r"^\s*[^.!?\n]*\?\s*$")
+
+BOLD = re.compile(r"\*\*(.*?)\*\*")
+
+
+class StreamCleaner:
+    """
+    Incremental version of the ask_gemini clean-up chain
+    (clean_incomplete_sentence → remove_until_capital → remove_trailing_questions
+    → format_bold_text) that works on a sliding buffer of streamed tokens.
+
+    feed() returns the text that is safe to show so far; finish() flushes the
+    rest. Concatenating every returned piece gives the same result as running
+    the batch filters on the full completion.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self._emitted_any = False
+        self._held_questions = []
+
+    def feed(self, token):
+        self._buffer += token
+
+        # Skip any preamble until the first capitalised word of a *complete* sentence
+        if not self._started:
+            ends = list(SENTENCE_END.finditer(self._buffer))
+            match = CAPITAL_WORD.search(self._buffer[:ends[-1].start()]) if ends else None
+            if not match:
+                return ""
+            self._buffer = self._buffer[match.start():]
+            self._started = True
+
+        # Whitespace at the head of the buffer only ever separates sentences
+        parts = SENTENCE_END.split(self._buffer.lstrip())
+        # The last part may still be growing; keep it in the buffer
+        self._buffer = parts.pop()
+        return self._release(parts)
+
+    def finish(self):
+        parts = SENTENCE_END.split(self._buffer.strip())
+        self._buffer = ""
+
+        # A trailing fragment without end punctuation is an incomplete sentence
+        if parts and not re.search(r"[.!?]$", parts[-1]):
+            parts.pop()
+
+        if not self._started:
+            # Cut at the first capitalised word; with none at all the text is kept as-is
+            self._started = True
+            text = "\n".join(parts)
+            match = CAPITAL_WORD.search(text)
+            parts = [text[match.start():] if match else text] if text else []
+
+        text = self._release(parts)
+        # Questions still held at the very end are trailing questions: drop them
+        self._held_questions = []
+        return text
+
+    def _release(self, sentences):
+        out = []
+        for line in (line for sentence in sentences for line in sentence.split("\n")):
+            if QUESTION_LINE.match(line):
+                # Only shown if a non-question line follows
+                self._held_questions.append(line)
+                continue
+            out.extend(self._held_questions)
+            self._held_questions = []
+            out.append(line)
+
+        if not out:
+            return ""
+
+        text = "\n".join(BOLD.sub(r"<strong>\1</strong>", sentence) for sentence in out)
+        if self._emitted_any:
+            text = "\n" + text
+        self._emitted_any = True
+        return text
@@ -0,0 +1,200 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from response_cache import ResponseCache
+from startup import lazy_import
+from summary_worker import parse_article, summarize_text
+
+# parse() and nlp() are CPU-bound, so they run in worker processes
+SUMMARIZER_PROCESSES = int(os.getenv("SUMMARIZER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Downloads only wait on the network
+SUMMARIZER_DOWNLOAD_THREADS = int(os.getenv("SUMMARIZER_DOWNLOAD_THREADS", "8"))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", str(24 * 3600)))
+SUMMARY_JOB_TIMEOUT = float(os.getenv("SUMMARY_JOB_TIMEOUT", "60"))
+
+# Finished jobs kept around for polling
+MAX_FINISHED_JOBS = 1000
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+")
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src)$")
+
+
+def extract_url(text):
+    match = URL_PATTERN.search(text or "")
+    return match.group(0).rstrip(".,;:!?)") if match else None
+
+
+def normalize_url(url):
+    """
+    Canonical form used for caching and job dedupe: lower-case scheme and host,
+    no fragment, no tracking parameters, sorted query, no trailing slash.
+    Raises ValueError for anything that isn't an http(s) URL.
+    """
+    parts = urlsplit(url.strip())
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+        raise ValueError("Please provide a full http(s) article URL.")
+
+    host = parts.hostname.lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAMS.match(key)
+    ))
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/") or "/", query, ""))
+
+
+class SummaryJob:
+    __slots__ = ("id", "url", "status", "result", "error", "created_at", "finished_at", "done")
+
+    def __init__(self, job_id, url):
+        self.id = job_id
+        self.url = url
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.status = "error" if error else "done"
+        self.finished_at = time.time()
+        self.done.set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class Summarizer:
+    """
+    Article summaries as background jobs.
+
+    Each URL is downloaded on a thread, parsed in a worker process, looked up by
+    the hash of its extracted text and only then summarised (again in a worker
+    process). Results are cached by normalised URL and by content hash, and
+    concurrent requests for the same article share one job.
+    """
+
+    def __init__(self, processes=SUMMARIZER_PROCESSES, download_threads=SUMMARIZER_DOWNLOAD_THREADS):
+        self.processes = processes
+        self._process_pool = None
+        self._download_pool = ThreadPoolExecutor(max_workers=download_threads, thread_name_prefix="summary-io")
+        self._cache = ResponseCache(max_entries=4096, max_bytes=16 * 1024 * 1024)
+        self._jobs = OrderedDict()   # job id → SummaryJob, oldest first
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "deduplicated": 0, "url_hits": 0, "content_hits": 0,
+                       "summarised": 0, "failures": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    @property
+    def process_pool(self):
+        # Created on first use. Never "fork": a copy of this threaded process can inherit
+        # a lock (an import, lazy_import, a logging handler) held mid-way by another thread.
+        # The forkserver is a fresh, single-threaded interpreter that preloads the worker
+        # module and newspaper, so each worker forks from it ready to parse. multiprocessing
+        # makes every worker import the main script too; preloading "__main__" does that once,
+        # in the forkserver, where `python flask_app.py` starts nothing (see SERVER_PROCESS).
+        with self._lock:
+            if self._process_pool is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["__main__", "summary_worker", "newspaper", "newspaper.nlp"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+            return self._process_pool
+
+    def submit(self, url):
+        """Returns the job for this article, starting one only if none is cached or running."""
+        key = normalize_url(url)
+        job_id = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in ("pending", "running"):
+                self._stats["deduplicated"] += 1
+                return job
+
+            job = SummaryJob(job_id, key)
+            cached = self._cache.get(f"url:{key}", count=True)
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            while len(self._jobs) > MAX_FINISHED_JOBS:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if not oldest.done.is_set():
+                    break
+                del self._jobs[oldest_id]
+
+            if cached is not None:
+                self._stats["url_hits"] += 1
+                job.finish(cached)
+                return job
+
+        self._download_pool.submit(self._run, job, url)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, url):
+        job.status = "running"
+        try:
+            article = lazy_import("newspaper").Article(url)
+            article.download()
+            if not article.html:
+                raise RuntimeError(article.download_exception_msg or "Couldn't download the article.")
+
+            title, text = self.process_pool.submit(parse_article, url, article.html).result(SUMMARY_JOB_TIMEOUT)
+            if not text:
+                raise RuntimeError("No article text found on that page.")
+
+            content_key = "content:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+            result = self._cache.get(content_key, count=True)
+            if result is not None:
+                self._count("content_hits")
+            else:
+                summary = self.process_pool.submit(summarize_text, title, text).result(SUMMARY_JOB_TIMEOUT)
+                result = {"title": title, "summary": summary}
+                self._count("summarised")
+                self._cache.set(content_key, result, SUMMARY_CACHE_TTL, len(summary))
+
+            self._cache.set(f"url:{job.url}", result, SUMMARY_CACHE_TTL, len(result["summary"]))
+            job.finish(result)
+        except Exception as e:
+            self._count("failures")
+            job.finish(error=str(e) or e.__class__.__name__)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["jobs_running"] = sum(1 for job in self._jobs.values() if not job.done.is_set())
+        stats["processes"] = self.processes
+        stats["cache"] = self._cache.stats()
+        return stats
+
+
+summarizer = Summarizer()
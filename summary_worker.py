@@ -0,0 +1,27 @@
+"""
+Code run inside the summarizer's worker processes.
+
+Workers are started from a clean forkserver (or spawned), not forked from the
+threaded app. This module must stay importable on its own: no imports of the
+app modules, and newspaper only inside the functions, so the app process can
+pickle references to them without loading it. (multiprocessing still imports
+the main script once in the forkserver; under `python flask_app.py` that starts
+no threads and prints nothing there.)
+"""
+SUMMARY_MAX_SENTENCES = 5
+
+
+def parse_article(url, html):
+    from newspaper import Article
+
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return article.title, article.text
+
+
+def summarize_text(title, text, language="en"):
+    from newspaper import nlp
+
+    nlp.load_stopwords(language)
+    return "\n".join(nlp.summarize(title=title, text=text, max_sents=SUMMARY_MAX_SENTENCES))